@@ -0,0 +1,490 @@
+"""
+A local stand-in for the Legistar web API, for benchmarking the scrapers.
+
+    python -m benchmarks.fake_legistar [--matters N] [--latency SECONDS]
+
+It serves a synthetic client of `--matters` matters, each with a history
+that ends in a roll call at a board meeting, a sponsor and a co-sponsor,
+a topic, an attachment, a text and a relation to an earlier matter, along
+with the bodies, office records and people of the board. Every response
+waits `--latency` seconds first.
+
+Not every Legistar client serves the flat collections behind the
+per-matter routes, like `/mattersponsors` and `/votes`, so they are only
+served with `--bulk`.
+
+With `--fixtures DIR`, a response recorded at `DIR/<path>.json`, e.g.
+`DIR/matters/5/histories.json`, is served in place of the synthetic one.
+
+`/_stats` reports how many requests each route has had.
+"""
+
+import argparse
+import collections
+import json
+import operator
+import os
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAGE_SIZE = 1000
+
+# how many matters are voted on at each board meeting
+MATTERS_PER_MEETING = 20
+
+ACTIONS = ("referred", "recommended for approval", "approved")
+
+BOARD_POSTS = (
+    "representing DuPage County",
+    "representing Kane/Kendall Counties",
+    "representing Lake County",
+    "representing McHenry County",
+    "representing Will County",
+    "representing suburban Cook County",
+    "representing northwest Cook County",
+    "representing west Cook County",
+    "represents Southwest Cook County",
+    "representing south suburban Cook County",
+    "representing City of Chicago",
+)
+
+BODY_TYPES = (
+    "Primary Legislative Body",
+    "Committees",
+    "Public Bodies",
+    "Policy",
+    "Advisory",
+)
+
+COMMITTEES = (
+    ("Coordinating Committee", "Committees"),
+    ("Transportation Committee", "Policy"),
+    ("Land Use Committee", "Policy"),
+    ("Economic Development Committee", "Advisory"),
+    ("Audit Committee", "Public Bodies"),
+)
+
+# the board's members, voting and not
+PEOPLE = ["Member {0}".format(i) for i in range(1, len(BOARD_POSTS) + 1)] + [
+    "Observer 1",
+    "Observer 2",
+]
+
+# (collection, the key naming the matter, the item's id) for each
+# per-matter route
+COLLECTIONS = {
+    "histories": ("matterhistories", "MatterHistoryMatterId", "MatterHistoryId"),
+    "sponsors": ("mattersponsors", "MatterSponsorMatterId", "MatterSponsorId"),
+    "indexes": ("matterindexes", "MatterIndexMatterId", "MatterIndexId"),
+    "attachments": (
+        "matterattachments",
+        "MatterAttachmentMatterId",
+        "MatterAttachmentId",
+    ),
+}
+
+
+class Dataset(object):
+    """A synthetic Legistar client, generated on demand."""
+
+    def __init__(self, matters, text_size=2000):
+        self.size = matters
+        self.text_size = text_size
+
+    def matter_ids(self):
+        return range(1, self.size + 1)
+
+    def matter(self, matter_id):
+        year = 22 + matter_id % 2
+        return {
+            "MatterId": matter_id,
+            "MatterGuid": "M{0}".format(matter_id),
+            "MatterFile": "{0}-{1:05d}".format(year, matter_id),
+            "MatterName": None,
+            "MatterTitle": "Matter {0}".format(matter_id),
+            "MatterTypeName": "Resolution",
+            "MatterStatusName": "Approved",
+            "MatterBodyName": "CMAP Board",
+            "MatterIntroDate": "20{0}-{1:02d}-01T00:00:00".format(
+                year, 1 + matter_id % 12
+            ),
+            "MatterLastModifiedUtc": "2023-{0:02d}-{1:02d}T00:00:{2:02d}.{3}".format(
+                1 + matter_id % 12, 1 + matter_id % 28, matter_id % 60, matter_id
+            ),
+        }
+
+    def meeting(self, matter_id, step):
+        return 1000 + (matter_id // MATTERS_PER_MEETING) * len(ACTIONS) + step
+
+    def histories(self, matter_id):
+        return [
+            {
+                "MatterHistoryId": matter_id * 10 + step,
+                "MatterHistoryMatterId": matter_id,
+                "MatterHistoryActionDate": "2023-{0:02d}-01T00:00:00".format(step + 1),
+                "MatterHistoryActionName": action,
+                "MatterHistoryActionText": None,
+                "MatterHistoryActionBodyName": "CMAP Board",
+                "MatterHistoryEventId": self.meeting(matter_id, step),
+                "MatterHistoryRollCallFlag": 1 if action == "approved" else None,
+                "MatterHistoryPassedFlag": 1 if action == "approved" else None,
+            }
+            for step, action in enumerate(ACTIONS)
+        ]
+
+    def sponsors(self, matter_id):
+        # the co-sponsor was added first, so the sponsors' ids and their
+        # sequence disagree on who comes first
+        return [
+            {
+                "MatterSponsorId": 2 * matter_id + 1,
+                "MatterSponsorMatterId": matter_id,
+                "MatterSponsorName": PEOPLE[matter_id % len(BOARD_POSTS)],
+                "MatterSponsorSequence": 0,
+                "MatterSponsorMatterVersion": "1",
+            },
+            {
+                "MatterSponsorId": 2 * matter_id,
+                "MatterSponsorMatterId": matter_id,
+                "MatterSponsorName": PEOPLE[(matter_id + 1) % len(BOARD_POSTS)],
+                "MatterSponsorSequence": 1,
+                "MatterSponsorMatterVersion": "1",
+            },
+        ]
+
+    def indexes(self, matter_id):
+        return [
+            {
+                "MatterIndexId": matter_id,
+                "MatterIndexMatterId": matter_id,
+                "MatterIndexName": "Topic {0}".format(matter_id % 10),
+            }
+        ]
+
+    def attachments(self, matter_id):
+        return [
+            {
+                "MatterAttachmentId": matter_id,
+                "MatterAttachmentMatterId": matter_id,
+                "MatterAttachmentName": "Memo",
+                "MatterAttachmentHyperlink": "https://example.com/{0}.pdf".format(
+                    matter_id
+                ),
+            }
+        ]
+
+    def relations(self, matter_id):
+        if matter_id <= 2:
+            return []
+        return [{"MatterRelationMatterId": matter_id - 2, "MatterRelationFlag": 0}]
+
+    def versions(self, matter_id):
+        return [{"Key": "1", "Value": "1"}]
+
+    def text(self, matter_id, version):
+        rtf = "{\\rtf1 " + "x" * self.text_size + "}"
+        return {
+            "MatterTextId": matter_id,
+            "MatterTextVersion": version,
+            "MatterTextLastModifiedUtc": "2023-01-01T00:00:00",
+            "MatterTextRtf": rtf,
+            "MatterTextPlain": "x" * self.text_size,
+        }
+
+    def event_items(self, event_id):
+        meeting, step = divmod(event_id - 1000, len(ACTIONS))
+        first = max(meeting * MATTERS_PER_MEETING, 1)
+        last = min((meeting + 1) * MATTERS_PER_MEETING, self.size + 1)
+        return [
+            {
+                "EventItemId": matter_id * 10 + step,
+                "EventItemMatterId": matter_id,
+                "EventItemRollCallFlag": 1 if ACTIONS[step] == "approved" else 0,
+            }
+            for matter_id in range(first, last)
+        ]
+
+    def votes(self, event_item_id):
+        return [
+            {
+                "VoteId": event_item_id * 100 + i,
+                "VoteEventItemId": event_item_id,
+                "VotePersonName": person,
+                "VoteValueName": "Aye" if i % 7 else "Nay",
+            }
+            for i, person in enumerate(PEOPLE[: len(BOARD_POSTS)])
+        ]
+
+    def body_types(self):
+        return [
+            {"BodyTypeId": i, "BodyTypeName": name} for i, name in enumerate(BODY_TYPES)
+        ]
+
+    def bodies(self):
+        bodies = [
+            {"BodyId": 1, "BodyGuid": "B1", "BodyName": "CMAP Board", "BodyTypeId": 0}
+        ]
+        for i, (name, body_type) in enumerate(COMMITTEES, 2):
+            bodies.append(
+                {
+                    "BodyId": i,
+                    "BodyGuid": "B{0}".format(i),
+                    "BodyName": name,
+                    "BodyTypeId": BODY_TYPES.index(body_type),
+                }
+            )
+        return bodies
+
+    def office_records(self, body_id):
+        if body_id == 1:
+            members = list(enumerate(PEOPLE))
+        else:
+            members = list(enumerate(PEOPLE))[body_id :: len(COMMITTEES)]
+        return [
+            {
+                "OfficeRecordId": body_id * 100 + i,
+                "OfficeRecordPersonId": i + 1,
+                "OfficeRecordFullName": person,
+                "OfficeRecordTitle": "Chairman" if i == body_id else "Member",
+                "OfficeRecordExtraText": (
+                    BOARD_POSTS[i] if i < len(BOARD_POSTS) else "non-voting member"
+                ),
+                "OfficeRecordStartDate": "2022-01-01T00:00:00",
+                "OfficeRecordEndDate": "2024-01-01T00:00:00",
+            }
+            for i, person in members
+        ]
+
+    def person(self, person_id):
+        return {"PersonId": person_id, "PersonGuid": "P{0}".format(person_id)}
+
+
+def matching(key, odata_filter):
+    """The ids an `$filter` of `key eq ...` clauses asks for."""
+    return [int(value) for value in re.findall(key + r" eq (\d+)", odata_filter)]
+
+
+def page(items, params):
+    skip = int(params.get("$skip", 0))
+    top = int(params.get("$top", PAGE_SIZE))
+    return items[skip : skip + min(top, PAGE_SIZE)]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # headers and body go out in separate writes, which Nagle's algorithm
+    # would otherwise hold up
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        path = url.path.rstrip("/")
+
+        if path == "/_stats":
+            return self.send_json(self.server.stats())
+
+        time.sleep(self.server.latency)
+        route = re.sub(r"/\d+", "/{id}", path.lower())
+        with self.server.lock:
+            self.server.requests[route] += 1
+
+        if path.lower() == "/gateway.aspx":
+            self.send_response(302)
+            self.send_header("Location", "/LegislationDetail.aspx?ID=" + params["id"])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        recorded = self.server.recorded(path)
+        if recorded is not None:
+            if isinstance(recorded, list):
+                recorded = page(recorded, params)
+            return self.send_json(recorded)
+
+        path = re.sub("^/v1/[^/]+", "", path, flags=re.IGNORECASE).lower()
+        try:
+            data = self.route(path, params)
+        except KeyError:
+            data = None
+        if data is None:
+            return self.send_json({"Message": "No HTTP resource " + path}, 404)
+        self.send_json(data)
+
+    def route(self, path, params):
+        dataset = self.server.dataset
+        odata_filter = params.get("$filter", "")
+
+        if path == "/matters":
+            ids = matching("MatterId", odata_filter) or dataset.matter_ids()
+            matters = [
+                dataset.matter(matter_id)
+                for matter_id in ids
+                if 0 < matter_id <= dataset.size
+            ]
+            since = re.search(
+                r"MatterLastModifiedUtc gt datetime'([^']+)'", odata_filter
+            )
+            if since:
+                matters = [
+                    matter
+                    for matter in matters
+                    if matter["MatterLastModifiedUtc"] > since.group(1)
+                ]
+            # every matter has an introduction date, so `eq null` is moot
+            for name, compare in (("ge", operator.ge), ("lt", operator.lt)):
+                bound = re.search(
+                    r"MatterIntroDate {0} datetime'([^']+)'".format(name),
+                    odata_filter,
+                )
+                if bound:
+                    matters = [
+                        matter
+                        for matter in matters
+                        if compare(matter["MatterIntroDate"], bound.group(1))
+                    ]
+            return page(matters, params)
+
+        match = re.fullmatch(r"/matters/(\d+)(?:/(\w+)(?:/(\d+))?)?", path)
+        if match:
+            matter_id, sub, key = match.groups()
+            matter_id = int(matter_id)
+            if not 0 < matter_id <= dataset.size:
+                return None
+            if sub is None:
+                return dataset.matter(matter_id)
+            if sub == "texts":
+                return dataset.text(matter_id, key)
+            if sub in COLLECTIONS or sub in {"relations", "versions"}:
+                return getattr(dataset, sub)(matter_id)
+            return None
+
+        for sub, (collection, matter_key, item_key) in COLLECTIONS.items():
+            if path == "/" + collection and self.server.bulk:
+                ids = matching(matter_key, odata_filter) or [1]
+                items = [
+                    item
+                    for matter_id in ids
+                    if 0 < matter_id <= dataset.size
+                    for item in getattr(dataset, sub)(matter_id)
+                ]
+                items.sort(key=lambda item: item[item_key])
+                return page(items, params)
+
+        match = re.fullmatch(r"/events/(\d+)/eventitems", path)
+        if match:
+            return dataset.event_items(int(match.group(1)))
+
+        if path == "/votes" and self.server.bulk:
+            ids = matching("VoteEventItemId", odata_filter) or [10]
+            votes = [vote for item_id in sorted(ids) for vote in dataset.votes(item_id)]
+            return page(votes, params)
+
+        match = re.fullmatch(r"/eventitems/(\d+)/votes", path)
+        if match:
+            return dataset.votes(int(match.group(1)))
+
+        if path == "/bodytypes":
+            return dataset.body_types()
+        if path == "/bodies":
+            return page(dataset.bodies(), params)
+
+        match = re.fullmatch(r"/bodies/(\d+)/officerecords", path)
+        if match:
+            return page(dataset.office_records(int(match.group(1))), params)
+
+        match = re.fullmatch(r"/persons/(\d+)", path)
+        if match:
+            return dataset.person(int(match.group(1)))
+
+        return None
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+
+class FakeLegistar(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, dataset, latency=0.0, bulk=False, fixtures=None):
+        super().__init__(address, Handler)
+        self.dataset = dataset
+        self.latency = latency
+        self.bulk = bulk
+        self.fixtures = fixtures
+
+        self.lock = threading.Lock()
+        self.requests = collections.Counter()
+
+    @property
+    def url(self):
+        return "http://{0}:{1}".format(*self.server_address)
+
+    def recorded(self, path):
+        if self.fixtures is None:
+            return None
+        fixture = os.path.join(self.fixtures, path.strip("/") + ".json")
+        try:
+            with open(fixture) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": sum(self.requests.values()),
+                "routes": dict(self.requests.most_common()),
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--matters", type=int, default=1000)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds to wait per request"
+    )
+    parser.add_argument(
+        "--text-size", type=int, default=2000, help="characters in each matter text"
+    )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="serve the flat /matterhistories, /votes, ... collections",
+    )
+    parser.add_argument("--fixtures", help="directory of recorded responses")
+    args = parser.parse_args()
+
+    server = FakeLegistar(
+        ("127.0.0.1", args.port),
+        Dataset(args.matters, args.text_size),
+        latency=args.latency,
+        bulk=args.bulk,
+        fixtures=args.fixtures,
+    )
+    print(server.url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Benchmark a scraper against the local stand-in for the Legistar API.
+
+    python -m benchmarks.run [bills|people] [--matters N] [--latency SECONDS] [key=value ...]
+
+Starts `benchmarks.fake_legistar` in a separate process, runs the scraper
+end to end against it, and reports wall time, the number of requests it
+made, the peak resident memory of the scraping process and the objects
+scraped per second. `key=value` arguments are passed to the scraper's
+`scrape()`, as with `pupa update`.
+
+One scraper is run per process, so peak memory is the scraper's alone.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from pupa import settings
+
+
+def start_server(args):
+    command = [
+        sys.executable,
+        "-m",
+        "benchmarks.fake_legistar",
+        "--port",
+        "0",
+        "--matters",
+        str(args.matters),
+        "--latency",
+        str(args.latency),
+        "--text-size",
+        str(args.text_size),
+    ]
+    if args.bulk:
+        command.append("--bulk")
+    if args.fixtures:
+        command.extend(["--fixtures", args.fixtures])
+
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    url = server.stdout.readline().strip()
+    if not url:
+        server.wait()
+        raise RuntimeError("the fake Legistar server didn't start")
+    return server, url
+
+
+def stats(url):
+    with urllib.request.urlopen(url + "/_stats") as response:
+        return json.load(response)
+
+
+def peak_rss():
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def benchmark(
+    scraper_name, url, kwargs, state_dir, rate_limit=None, async_concurrency=None
+):
+    # keep the scrapers' persistent state out of the way, and don't let
+    # their caches answer for the server
+    settings.CMAP_STATE_DIR = state_dir
+    settings.CMAP_METRICS_REPORT = os.path.join(state_dir, "metrics.jsonl")
+    settings.CMAP_HTTP_CACHE = None
+    settings.CACHE_DIR = None
+    settings.CMAP_RATE_LIMIT = rate_limit
+    settings.CMAP_ASYNC_CONCURRENCY = async_concurrency
+
+    from cmap import CMAP
+
+    jurisdiction = CMAP()
+    scraper_class = jurisdiction.scrapers[scraper_name]
+    scraper_class.BASE_URL = url + "/v1/cmap"
+    scraper_class.BASE_WEB_URL = scraper_class.WEB_URL = url
+
+    scraper = scraper_class(jurisdiction, state_dir)
+    scraper.requests_per_minute = 0
+
+    start = time.perf_counter()
+    objects = 0
+    for obj in scraper.scrape(**kwargs):
+        objects += 1
+        objects += len(obj._related)
+    elapsed = time.perf_counter() - start
+
+    return {"objects": objects, "seconds": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "scraper", nargs="?", default="bills", choices=["bills", "people"]
+    )
+    parser.add_argument("kwargs", nargs="*", metavar="key=value")
+    parser.add_argument("--matters", type=int, default=1000)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds to wait per request"
+    )
+    parser.add_argument(
+        "--text-size", type=int, default=2000, help="characters in each matter text"
+    )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="serve the flat /matterhistories, /votes, ... collections",
+    )
+    parser.add_argument("--fixtures", help="directory of recorded responses")
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        help="start the shared rate limit at this many requests a second",
+    )
+    parser.add_argument(
+        "--async",
+        dest="async_concurrency",
+        type=int,
+        metavar="N",
+        help="fetch with the async client, N requests at a time",
+    )
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    kwargs = dict(arg.split("=", 1) for arg in args.kwargs)
+
+    server, url = start_server(args)
+    try:
+        with tempfile.TemporaryDirectory() as state_dir:
+            result = benchmark(
+                args.scraper,
+                url,
+                kwargs,
+                state_dir,
+                args.rate_limit,
+                args.async_concurrency,
+            )
+        server_stats = stats(url)
+    finally:
+        server.terminate()
+        server.wait()
+
+    result.update(
+        {
+            "scraper": args.scraper,
+            "matters": args.matters,
+            "latency": args.latency,
+            "requests": server_stats["requests"],
+            "routes": server_stats["routes"],
+            "peak_rss": peak_rss(),
+            "objects_per_second": result["objects"] / result["seconds"],
+        }
+    )
+
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+        return
+
+    print(
+        "{scraper}: {matters} matters, {latency}s latency\n"
+        "  wall time    {seconds:.2f}s\n"
+        "  requests     {requests}\n"
+        "  peak RSS     {peak_rss_mb:.1f} MB\n"
+        "  objects      {objects} ({objects_per_second:.1f}/s)".format(
+            peak_rss_mb=result["peak_rss"] / 2**20, **result
+        )
+    )
+    for route, count in result["routes"].items():
+        print("    {0:>8}  {1}".format(count, route))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+An asyncio client for the Legistar web API.
+
+A scraper's own requests block the thread that makes them, so a matter's
+histories, sponsors, indexes, attachments, relations, versions, texts and
+votes take a thread apiece to fetch at once. `AsyncLegistarClient` runs
+one aiohttp session, with a pool of keep-alive connections, on an event
+loop in a background thread, and has at most `concurrency` requests in
+flight. Its requests go through the same response cache, shared rate
+limit, retries and metrics as the scraper's.
+
+`submit` is the way back from the loop: it schedules a coroutine there
+and hands back a `concurrent.futures.Future`, which the pupa `scrape()`
+generators wait on as they would on a thread pool's.
+
+Set `CMAP_ASYNC_CONCURRENCY` in pupa_settings.py to the number of
+requests in flight, or to None to fetch with threads.
+"""
+
+import asyncio
+import threading
+import time
+
+import aiohttp
+import requests
+import scrapelib
+
+from .cache import CHUNK_SIZE, full_url, shared_cache
+from .metrics import route_template
+from .ratelimit import RETRY_STATUSES, retry_after
+
+
+class AsyncLegistarClient(object):
+    def __init__(self, scraper, concurrency):
+        self.scraper = scraper
+        self.concurrency = concurrency
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+        self._session = None
+        self._semaphore = None
+        self._paced = None
+        self._last_request = 0.0
+        self.submit(self._open()).result()
+
+    async def _open(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            headers=dict(self.scraper.headers),
+            timeout=aiohttp.ClientTimeout(
+                sock_connect=self.scraper.timeout, sock_read=self.scraper.timeout
+            ),
+        )
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._paced = asyncio.Lock()
+
+    def submit(self, coroutine):
+        """Run a coroutine on the client's loop, returning a future of its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        self.submit(self._close()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def _close(self):
+        # what a scrape that stopped early left in flight
+        tasks = asyncio.all_tasks() - {asyncio.current_task()}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._session.close()
+
+    async def json(self, url, params=None):
+        response = await self.get(url, params=params)
+        return response.json()
+
+    async def pages(self, url, params=None, item_key=None):
+        """The items of a paged collection, as the scrapers' `pages` yields them."""
+        params = dict(params or {})
+        items = []
+        seen = set()
+        page = None
+        page_num = 0
+        while page_num == 0 or len(page) == 1000:
+            params["$skip"] = page_num * 1000
+            page = await self.json(url, params=params)
+            for item in page:
+                if item[item_key] not in seen:
+                    items.append(item)
+                    seen.add(item[item_key])
+            page_num += 1
+        return items
+
+    async def get(self, url, params=None, read=None):
+        """
+        GET a URL, returning a requests.Response, and raising
+        scrapelib.HTTPError for a response the scraper wouldn't accept,
+        as the scraper's `get` does. If `read` is given, the body of an
+        accepted response is passed to it a chunk at a time instead of
+        being kept.
+        """
+        request_url = full_url(url, params)
+        route = route_template(request_url, self.scraper.BASE_URL)
+        retries = self.scraper.retries(request_url)
+        metrics = getattr(self.scraper, "metrics", None)
+
+        start = time.perf_counter()
+        try:
+            async with self._semaphore:
+                response, nbytes = await self._get(request_url, retries, read)
+        except Exception:
+            if metrics is not None:
+                metrics.record(
+                    route,
+                    time.perf_counter() - start,
+                    ok=False,
+                    retries=min(retries.tries, retries.attempts),
+                )
+            raise
+        if metrics is not None:
+            metrics.record(
+                route,
+                time.perf_counter() - start,
+                ok=response.status_code < 400,
+                cached=response.fromcache,
+                retries=min(retries.tries, retries.attempts),
+                nbytes=nbytes,
+            )
+
+        if self.scraper.raise_errors and not self.scraper.accept_response(response):
+            raise scrapelib.HTTPError(response)
+        return response
+
+    async def _get(self, url, retries, read):
+        cache = shared_cache()
+        key = "GET " + url
+        entry = cache.lookup(key) if cache is not None else None
+        if entry is not None and cache.is_fresh(entry):
+            return self._cached(cache, entry, read)
+        headers = cache.validators(entry) if entry is not None else {}
+
+        while True:
+            await self._throttle(retries)
+            start = time.monotonic()
+            try:
+                response = await self._session.get(url, headers=headers)
+            except aiohttp.ClientSSLError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                wait = retries.failed(e)
+                if wait is None:
+                    raise requests.ConnectionError(e)
+            else:
+                if response.status not in RETRY_STATUSES:
+                    retries.answered(time.monotonic() - start)
+                    break
+                wait = retries.failed(response.status, retry_after(response))
+                if wait is None:
+                    break
+                response.release()
+            await asyncio.sleep(wait)
+
+        try:
+            if entry is not None and response.status == 304:
+                cache.refresh(key)
+                return self._cached(cache, entry, read)
+            return await self._read(cache, key, url, response, read)
+        finally:
+            response.release()
+
+    async def _throttle(self, retries):
+        if retries.limiter is not None:
+            await retries.limiter.acquire_async(retries.priority)
+        elif self.scraper.requests_per_minute:
+            # scrapelib's fixed pace, when there is no shared limiter
+            async with self._paced:
+                interval = 60.0 / self.scraper.requests_per_minute
+                wait = self._last_request + interval - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self._last_request = time.monotonic()
+
+    async def _read(self, cache, key, url, aiohttp_response, read):
+        response = build_response(aiohttp_response)
+        writer = None
+        if cache is not None and cache.should_store(url, response):
+            writer = cache.writer(key, url, response)
+        if read is not None and not self.scraper.accept_response(response):
+            read = None
+
+        body = []
+        nbytes = 0
+        try:
+            async for chunk in aiohttp_response.content.iter_chunked(CHUNK_SIZE):
+                nbytes += len(chunk)
+                if writer is not None:
+                    writer.write(chunk)
+                if read is not None:
+                    read(chunk)
+                else:
+                    body.append(chunk)
+        except BaseException:
+            if writer is not None:
+                writer.discard()
+            raise
+        if writer is not None:
+            writer.commit()
+
+        response._content = b"".join(body)
+        return response, nbytes
+
+    def _cached(self, cache, entry, read):
+        response = cache.response(entry, stream=True)
+        chunks = iter(response.raw.read, b"")
+        if read is not None and self.scraper.accept_response(response):
+            nbytes = 0
+            for chunk in chunks:
+                nbytes += len(chunk)
+                read(chunk)
+            response._content = b""
+        else:
+            response._content = b"".join(chunks)
+            nbytes = len(response._content)
+        response._content_consumed = True
+        return response, nbytes
+
+
+def build_response(aiohttp_response):
+    """Dress up an aiohttp response as the requests.Response scrapelib returns."""
+    response = requests.Response()
+    response.url = str(aiohttp_response.url)
+    response.status_code = aiohttp_response.status
+    response.reason = aiohttp_response.reason
+    response.headers = requests.structures.CaseInsensitiveDict(aiohttp_response.headers)
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response._content_consumed = True
+    response.fromcache = False
+    return response
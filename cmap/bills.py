@@ -1,12 +1,79 @@
+import asyncio
+import collections
+import concurrent.futures
 import datetime
 import itertools
+import json
+import os
+import re
+import threading
+import time
 
 import pytz
 import requests
+import requests.adapters
 import scrapelib
 from legistar.bills import LegistarAPIBillScraper, LegistarBillScraper
+from pupa import settings
 from pupa.scrape import Bill, Scraper, VoteEvent
-from pupa.utils import _make_pseudo_id
+from pupa.utils import JSONEncoderPlus
+
+from .aio import AsyncLegistarClient
+from .bulk import BulkPrefetcher, EventVotes, any_of
+from .cache import HTTPCacheMixin
+from .metrics import MetricsMixin, metered
+from .names import name_index
+from .ratelimit import RateLimitMixin, ThrottleLockMixin
+from .segments import SegmentOutputMixin
+from .texts import CHUNK_SIZE, TextReader, TextSink, TextStore, read_text
+from .utils import flag
+
+WATERMARK_FILE = os.path.join(settings.CMAP_STATE_DIR, "bills_watermark.json")
+
+# Legistar truncates timestamps in OData filters, so look back a little
+# further than the last modification we saw.
+WATERMARK_OVERLAP = datetime.timedelta(minutes=5)
+
+# what each finished matter needed is kept here until the scrape
+# completes, so that a scrape that dies can pick up where it left off,
+# as long as it is resumed within a day
+CHECKPOINT_FILE = os.path.join(settings.CMAP_STATE_DIR, "bills_checkpoint.jsonl")
+CHECKPOINT_MAX_AGE = 24 * 60 * 60
+
+# all the checkpoint keeps of a matter's details: the fields building its
+# bill reads. Texts are kept by their digest in the text store.
+CHECKPOINT_FIELDS = {
+    "topics": ("MatterIndexName",),
+    "attachments": ("MatterAttachmentName", "MatterAttachmentHyperlink"),
+    "related_matters": ("MatterFile", "MatterIntroDate"),
+    "texts": (
+        "MatterTextVersion",
+        "MatterTextRtfSha256",
+        "MatterTextRtfLength",
+        "url",
+    ),
+}
+CHECKPOINT_VOTE_FIELDS = ("VoteValueName", "VotePersonName")
+
+# number of threads fetching the sub-resources of upcoming matters
+DEFAULT_WORKERS = 4
+
+# how many matters to remember for resolving relations, and how many
+# missing ones to ask for in a single request
+MATTER_INDEX_SIZE = 10000
+MATTER_BATCH_SIZE = 50
+
+# how many meetings' votes to keep around
+EVENT_CACHE_SIZE = 100
+
+# matter texts are streamed to a content-addressed store, which keeps
+# identical texts once, and RTF of up to this many characters is read back
+# onto the bill; longer RTF is only linked, with its digest in the bill's
+# extras. A scrape of every matter drops the texts no bill refers to.
+TEXT_STORE = os.path.join(settings.CMAP_STATE_DIR, "texts")
+TEXT_INLINE_LIMIT = 256 * 1024
+TEXT_FIELDS = {"MatterTextId", "MatterTextVersion", "MatterTextLastModifiedUtc"}
+TEXT_ROUTE = re.compile(r"/matters/\d+/texts/")
 
 
 def sort_actions(actions):
@@ -24,7 +91,15 @@ def sort_actions(actions):
     return sorted_actions
 
 
-class CMAPBillScraper(LegistarAPIBillScraper, Scraper):
+class CMAPBillScraper(
+    SegmentOutputMixin,
+    MetricsMixin,
+    HTTPCacheMixin,
+    RateLimitMixin,
+    ThrottleLockMixin,
+    LegistarAPIBillScraper,
+    Scraper,
+):
     BASE_URL = "http://webapi.legistar.com/v1/cmap"
     BASE_WEB_URL = "https://cmap.legistar.com"
     TIMEZONE = "America/Chicago"
@@ -37,6 +112,57 @@ class CMAPBillScraper(LegistarAPIBillScraper, Scraper):
         "not present": "absent",
     }
 
+    text_store = TextStore(TEXT_STORE)
+
+    # an OData filter to narrow the matter listing by
+    listing_filter = None
+
+    # the AsyncLegistarClient of a scrape, if it uses one
+    aio = None
+
+    def key_for_request(self, method, url, params=None, data=None):
+        # scrapelib's cache reads whole responses into memory
+        if TEXT_ROUTE.search(url):
+            return None
+        return super().key_for_request(method, url, params, data)
+
+    def pages(self, url, params=None, item_key=None):
+        if self.listing_filter and url == self.BASE_URL + "/matters":
+            params = dict(params or {})
+            conditions = [params.get("$filter"), self.listing_filter]
+            params["$filter"] = " and ".join(
+                "({0})".format(condition) for condition in conditions if condition
+            )
+        return super().pages(url, params=params, item_key=item_key)
+
+    def endpoint(self, route, *args):
+        if args:
+            prefetched = self.bulk.get(route, args[0])
+            if prefetched is not None:
+                return prefetched
+        return super().endpoint(route, *args)
+
+    async def endpoint_async(self, route, matter_id):
+        prefetched = self.bulk.get(route, matter_id)
+        if prefetched is not None:
+            return prefetched
+        return await self.aio.json(self.BASE_URL + route.format(matter_id))
+
+    async def fetched(self, route, matter_id):
+        """
+        Fetch a matter's route on the event loop, and leave what it
+        returned for the blocking method that reads the route to find.
+        """
+        self.bulk.add(route, matter_id, await self.endpoint_async(route, matter_id))
+
+    async def votes_async(self, history_id):
+        response = await self.aio.get(
+            self.BASE_URL + "/eventitems/{0}/votes".format(history_id)
+        )
+        if response.status_code == 400:
+            return []
+        return response.json()
+
     def sponsorships(self, matter_id):
         for i, sponsor in enumerate(self.sponsors(matter_id)):
             sponsorship = {}
@@ -59,6 +185,31 @@ class CMAPBillScraper(LegistarAPIBillScraper, Scraper):
             yield sponsorship
 
     def actions(self, matter_id):
+        return self.bill_actions(matter_id, self.event_votes.get)
+
+    async def actions_async(self, matter_id):
+        await self.fetched("/matters/{0}/histories", matter_id)
+        # the votes each action wants, as the ids to look them up by
+        actions = list(self.bill_actions(matter_id, lambda *ids: ids))
+        wanted = [votes for _, (_, votes) in actions if isinstance(votes, tuple)]
+        found = dict(
+            zip(
+                wanted,
+                await asyncio.gather(
+                    *(self.event_votes.get_async(*ids) for ids in wanted)
+                ),
+            )
+        )
+        return [
+            (action, (result, found[votes] if isinstance(votes, tuple) else votes))
+            for action, (result, votes) in actions
+        ]
+
+    def bill_actions(self, matter_id, event_votes):
+        """
+        A matter's actions, each with its result and the votes on it,
+        which `event_votes(event_id, history_id)` looks up.
+        """
         old_action = None
         actions = self.history(matter_id)
         actions = sort_actions(actions)
@@ -117,15 +268,243 @@ class CMAPBillScraper(LegistarAPIBillScraper, Scraper):
                     )
                     votes = (result, [])
                 else:
-                    votes = (result, self.votes(matter_history_id))
+                    votes = (
+                        result,
+                        event_votes(action["MatterHistoryEventId"], matter_history_id),
+                    )
             else:
                 votes = (None, [])
 
             yield bill_action, votes
 
-    def scrape(self):
-        for matter in self.matters():
+    def related_matters(self, matter_id):
+        """
+        Look up the related matters in the index of matters we have
+        already seen, fetching any we haven't in batches.
+        """
+        relation_ids = [
+            relation["MatterRelationMatterId"] for relation in self.relations(matter_id)
+        ]
+
+        missing = [
+            relation_id
+            for relation_id in relation_ids
+            if self.matter_index.get(relation_id) is None
+        ]
+        for batch in chunks(missing, MATTER_BATCH_SIZE):
+            conditions = " or ".join(
+                "MatterId eq {0}".format(relation_id) for relation_id in batch
+            )
+            for matter in self.search("/matters/", "MatterId", conditions):
+                self.matter_index.add(matter)
+
+        related = []
+        for relation_id in relation_ids:
+            relation_matter = self.matter_index.get(relation_id)
+            if relation_matter is not None:
+                related.append(relation_matter)
+
+        return related
+
+    async def related_matters_async(self, matter_id):
+        route = "/matters/{0}/relations"
+        relations = await self.endpoint_async(route, matter_id)
+        missing = [
+            relation["MatterRelationMatterId"]
+            for relation in relations
+            if self.matter_index.get(relation["MatterRelationMatterId"]) is None
+        ]
+        batches = await asyncio.gather(
+            *(
+                self.aio.pages(
+                    self.BASE_URL + "/matters/",
+                    params={"$filter": any_of("MatterId", batch)},
+                    item_key="MatterId",
+                )
+                for batch in chunks(missing, MATTER_BATCH_SIZE)
+            )
+        )
+        for batch in batches:
+            for matter in batch:
+                self.matter_index.add(matter)
+        self.bulk.add(route, matter_id, relations)
+        return self.related_matters(matter_id)
+
+    def matter_details(self, executor, matter):
+        """
+        Start fetching everything scrape needs about a matter, besides the
+        matter itself, returning a future of a dictionary, or a dictionary
+        of futures.
+        """
+        matter_id = matter["MatterId"]
+        if self.aio is not None:
+            return self.aio.submit(self.fetch_details(matter_id))
+
+        fetchers = {
+            "actions": lambda: list(self.actions(matter_id)),
+            "sponsorships": lambda: list(self.sponsorships(matter_id)),
+            "topics": lambda: self.topics(matter_id),
+            "attachments": lambda: self.attachments(matter_id),
+            "related_matters": lambda: self.related_matters(matter_id),
+            "texts": lambda: list(self.texts(matter_id)),
+        }
+        return {
+            key: executor.submit(self.metrics.call, "fetch " + key, fetch)
+            for key, fetch in fetchers.items()
+        }
+
+    async def fetch_details(self, matter_id):
+        """
+        What `matter_details` fetches, gathered on the event loop of the
+        async client. What each route returns is read by the same methods
+        as when it is fetched with threads.
+        """
+
+        async def after(route, read):
+            await self.fetched(route, matter_id)
+            return read()
+
+        fetchers = {
+            "actions": self.actions_async(matter_id),
+            "sponsorships": after(
+                "/matters/{0}/sponsors", lambda: list(self.sponsorships(matter_id))
+            ),
+            "topics": after("/matters/{0}/indexes", lambda: self.topics(matter_id)),
+            "attachments": after(
+                "/matters/{0}/attachments", lambda: self.attachments(matter_id)
+            ),
+            "related_matters": self.related_matters_async(matter_id),
+            "texts": self.texts_async(matter_id),
+        }
+        return dict(zip(fetchers, await asyncio.gather(*fetchers.values())))
+
+    def restore(self, matter):
+        """
+        What a matter needed, as a dictionary of futures, from the
+        checkpoint of an earlier scrape that finished it.
+        """
+        details = self.checkpoint.get(matter)
+        if details is None:
+            return None
+        for text in details["texts"]:
+            # the store has to still have the texts the checkpoint names
+            if text["MatterTextRtfLength"] and (
+                text["MatterTextRtfSha256"] not in self.text_store
+            ):
+                return None
+        return {key: resolved(value) for key, value in details.items()}
+
+    @metered
+    def scrape(
+        self,
+        incremental=False,
+        watermark=WATERMARK_FILE,
+        workers=DEFAULT_WORKERS,
+        introduced_from=None,
+        introduced_before=None,
+        checkpoint=CHECKPOINT_FILE,
+        shard=False,
+    ):
+        """
+        By default, scrape every matter. With `incremental=true`, only
+        scrape matters modified since the high-water mark stored by the
+        last complete run. `introduced_from` and `introduced_before`
+        (YYYY-MM-DD) limit the scrape to the matters introduced in that
+        range; matters with no introduction date count as introduced
+        before any `introduced_before`. Such a scrape leaves the
+        high-water mark alone, unless it is one of the shards of
+        cmap.shard, marked with `shard=true`, which together scrape every
+        matter.
+
+        Histories, sponsors, topics and attachments are prefetched in
+        bulk for batches of matters, and votes for whole meetings at a
+        time, where the API allows it. The rest of what the next few
+        matters need is fetched by a pool of `workers` threads, or, with
+        `CMAP_ASYNC_CONCURRENCY` set, gathered for the next `workers`
+        matters on the event loop of an AsyncLegistarClient, while bills
+        are still yielded in listing order.
+
+        What each matter needed is appended to `checkpoint` once its bill
+        has been taken, so if the scrape dies, the next one only fetches
+        the matters it hadn't finished, or that have changed since.
+        """
+        workers = int(workers)
+        self.listing_filter = introduced_filter(introduced_from, introduced_before)
+        since = None
+        if flag(incremental):
+            since = read_watermark(watermark)
+            if since is None:
+                self.info(
+                    "No watermark found at {0}, scraping all matters".format(watermark)
+                )
+            else:
+                self.info("Scraping matters modified since {0}".format(since))
+                since = parse_utc(since) - WATERMARK_OVERLAP
+        if self.listing_filter and not flag(shard):
+            # a scrape of some of the matters doesn't bring the rest up to
+            # date
+            watermark = None
+
+        # one pooled connection per worker, plus one for the matter listing
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=workers + 1)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+        self.matter_index = MatterIndex(MATTER_INDEX_SIZE)
+        self.bulk = BulkPrefetcher(self, MATTER_BATCH_SIZE)
+        self.event_votes = EventVotes(self, MATTER_BATCH_SIZE, EVENT_CACHE_SIZE)
+        # the people and organizations a person scrape before this found.
+        # The index only lives in memory, so it is only filled when the
+        # people are scraped in this same process, as `pupa update cmap
+        # people bills` and cmap.load do; otherwise, and in the processes
+        # of a sharded scrape, every name gets a pseudo id
+        self.names = name_index(self.jurisdiction)
+
+        self.checkpoint = Checkpoint(checkpoint, CHECKPOINT_MAX_AGE)
+        if self.checkpoint:
+            self.info(
+                "Resuming from {0}, with {1} matters done".format(
+                    checkpoint, len(self.checkpoint)
+                )
+            )
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        if settings.CMAP_ASYNC_CONCURRENCY:
+            self.aio = AsyncLegistarClient(self, settings.CMAP_ASYNC_CONCURRENCY)
+        try:
+            if self.aio is not None:
+                # probe before the loop wants to know, rather than on it
+                self.event_votes.available
+            yield from self._scrape(executor, workers, since, watermark)
+        finally:
+            executor.shutdown(cancel_futures=True)
+            if self.aio is not None:
+                self.aio.close()
+                self.aio = None
+            self.checkpoint.close()
+
+    def _scrape(self, executor, workers, since, watermark):
+        high_water = None
+        # the texts the bills refer to, restored ones included
+        digests = set()
+        listing = self.metrics.timed("list matters", self.matters(since))
+        listing = self.bulk.fill(
+            self.matter_index.fill(listing), skip=self.checkpoint.__contains__
+        )
+        matters = (
+            (matter, self.restore(matter) or self.matter_details(executor, matter))
+            for matter in self.metrics.timed("bulk prefetch", listing)
+        )
+        for matter, details in self.metrics.timed(
+            "wait for details", prefetch(matters, workers)
+        ):
             matter_id = matter["MatterId"]
+            # before building the bill takes the details apart
+            entry = self.checkpoint.entry(matter, details)
+
+            last_modified = matter["MatterLastModifiedUtc"]
+            if last_modified and (high_water is None or last_modified > high_water):
+                high_water = last_modified
 
             date = matter["MatterIntroDate"]
             title = matter["MatterTitle"]
@@ -151,7 +530,7 @@ class CMAPBillScraper(LegistarAPIBillScraper, Scraper):
             bill.add_source(legistar_web, note="web")
             bill.add_source(legistar_api, note="api")
 
-            for current, subsequent in pairwise(self.actions(matter_id)):
+            for current, subsequent in pairwise(details["actions"]):
                 action, vote = current
                 motion_text = action.pop("motion_text") or action["description"]
                 act = bill.add_action(**action)
@@ -163,7 +542,7 @@ class CMAPBillScraper(LegistarAPIBillScraper, Scraper):
                             act.add_related_entity(
                                 body_name,
                                 "organization",
-                                entity_id=_make_pseudo_id(name=body_name),
+                                entity_id=self.names.resolve("organization", body_name),
                             )
                     else:
                         next_action, _ = subsequent
@@ -172,7 +551,9 @@ class CMAPBillScraper(LegistarAPIBillScraper, Scraper):
                             act.add_related_entity(
                                 next_body_name,
                                 "organization",
-                                entity_id=_make_pseudo_id(name=next_body_name),
+                                entity_id=self.names.resolve(
+                                    "organization", next_body_name
+                                ),
                             )
 
                 result, votes = vote
@@ -201,17 +582,27 @@ class CMAPBillScraper(LegistarAPIBillScraper, Scraper):
                             continue
                         raw_option = vote_value.lower()
                         clean_option = self.VOTE_OPTIONS.get(raw_option, raw_option)
-                        vote_event.vote(clean_option, vote["VotePersonName"].strip())
+                        voter = self.names.intern(vote["VotePersonName"].strip())
+                        vote_event.vote(clean_option, voter)
+                        # VoteEvent.vote takes no id for the voter
+                        vote_event.votes[-1]["voter_id"] = self.names.resolve(
+                            "person", voter
+                        )
 
                     yield vote_event
 
-            for sponsorship in self.sponsorships(matter_id):
-                bill.add_sponsorship(**sponsorship)
+            for sponsorship in details["sponsorships"]:
+                bill.add_sponsorship(
+                    entity_id=self.names.resolve(
+                        sponsorship["entity_type"], sponsorship["name"]
+                    ),
+                    **sponsorship,
+                )
 
-            for topic in self.topics(matter_id):
+            for topic in details["topics"]:
                 bill.add_subject(topic["MatterIndexName"].strip())
 
-            for attachment in self.attachments(matter_id):
+            for attachment in details["attachments"]:
                 if attachment["MatterAttachmentName"]:
                     bill.add_document_link(
                         attachment["MatterAttachmentName"],
@@ -219,14 +610,8 @@ class CMAPBillScraper(LegistarAPIBillScraper, Scraper):
                         media_type="application/pdf",
                     )
 
-            relations = self.relations(matter_id)
             identified_relations = []
-            for relation in relations:
-                relation_matter_id = relation["MatterRelationMatterId"]
-                try:
-                    relation_matter = self.matter(relation_matter_id)
-                except scrapelib.HTTPError:
-                    continue
+            for relation_matter in details["related_matters"]:
                 relation_identifier = relation_matter["MatterFile"]
                 try:
                     relation_date = self.toTime(relation_matter["MatterIntroDate"])
@@ -265,16 +650,45 @@ class CMAPBillScraper(LegistarAPIBillScraper, Scraper):
 
             bill.extras = {"local_classification": matter["MatterTypeName"]}
 
-            for text in self.texts(matter_id):
-                if text["MatterTextRtf"]:
+            rtfs = {}
+            for text in details["texts"]:
+                if not text["MatterTextRtfLength"]:
+                    continue
+                digest = text["MatterTextRtfSha256"]
+                digests.add(digest)
+                if text["MatterTextRtfLength"] <= TEXT_INLINE_LIMIT:
+                    if digest not in rtfs:
+                        with self.text_store.open(digest) as f:
+                            rtfs[digest] = f.read()
+                    bill.add_version_link(
+                        text["MatterTextVersion"],
+                        text["url"],
+                        media_type="text/rtf",
+                        text=rtfs[digest],
+                    )
+                else:
                     bill.add_version_link(
                         text["MatterTextVersion"],
                         text["url"],
                         media_type="text/rtf",
-                        text=text["MatterTextRtf"],
                     )
+                    bill.extras.setdefault("rtf_sha256", {})[
+                        text["MatterTextVersion"]
+                    ] = digest
             yield bill
 
+            self.checkpoint.save(matter, entry)
+
+        if watermark and high_water is not None:
+            write_watermark(watermark, high_water)
+        self.checkpoint.remove()
+
+        if since is None and not self.listing_filter:
+            # every matter was scraped, so no bill needs the other texts
+            removed = self.text_store.prune(digests)
+            if removed:
+                self.info("Removed {0} texts no bill refers to".format(removed))
+
     def texts(self, matter_id):
 
         version_route = "/matters/{0}/versions"
@@ -284,11 +698,257 @@ class CMAPBillScraper(LegistarAPIBillScraper, Scraper):
 
         for version in versions:
             text_url = self.BASE_URL + text_route.format(matter_id, version["Key"])
-            response = self.get(text_url, stream=True)
-            if int(response.headers["Content-Length"]) < 21052630:
-                text_details = response.json()
-                text_details["url"] = text_url
-                yield text_details
+            rtf = TextSink(self.text_store)
+            try:
+                with self.get(text_url, stream=True) as response:
+                    text_details = read_text(
+                        response.iter_content(CHUNK_SIZE),
+                        TEXT_FIELDS,
+                        {"MatterTextRtf": rtf},
+                    )
+            finally:
+                rtf.discard()
+            yield stored_text(text_details, rtf, text_url)
+
+    async def texts_async(self, matter_id):
+        versions = await self.endpoint_async("/matters/{0}/versions", matter_id)
+        return await asyncio.gather(
+            *(self.text_async(matter_id, version) for version in versions)
+        )
+
+    async def text_async(self, matter_id, version):
+        text_url = self.BASE_URL + "/matters/{0}/texts/{1}".format(
+            matter_id, version["Key"]
+        )
+        rtf = TextSink(self.text_store)
+        reader = TextReader(TEXT_FIELDS, {"MatterTextRtf": rtf})
+        try:
+            await self.aio.get(text_url, read=reader.feed)
+            text_details = reader.close()
+        finally:
+            rtf.discard()
+        return stored_text(text_details, rtf, text_url)
+
+
+def stored_text(text_details, rtf, text_url):
+    # a null MatterTextRtf comes back here instead of being streamed
+    text_details.pop("MatterTextRtf", None)
+    text_details["MatterTextRtfSha256"] = rtf.digest
+    text_details["MatterTextRtfLength"] = rtf.length
+    text_details["url"] = text_url
+    return text_details
+
+
+def introduced_filter(start=None, end=None):
+    conditions = []
+    if start:
+        start = datetime.date.fromisoformat(start)
+        conditions.append("MatterIntroDate ge datetime'{0}T00:00:00'".format(start))
+    if end:
+        end = datetime.date.fromisoformat(end)
+        conditions.append(
+            "(MatterIntroDate lt datetime'{0}T00:00:00'"
+            " or MatterIntroDate eq null)".format(end)
+        )
+    return " and ".join(conditions) or None
+
+
+def parse_utc(timestamp):
+    # MatterLastModifiedUtc has a variable number of fractional digits
+    timestamp = timestamp.split(".")[0]
+    return datetime.datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S")
+
+
+def read_watermark(path):
+    try:
+        with open(path) as f:
+            return json.load(f)["MatterLastModifiedUtc"]
+    except FileNotFoundError:
+        return None
+
+
+def write_watermark(path, last_modified):
+    previous = read_watermark(path)
+    if previous is not None and previous > last_modified:
+        return
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"MatterLastModifiedUtc": last_modified}, f)
+    os.replace(tmp_path, path)
+
+
+class MatterIndex(object):
+    """
+    A thread-safe map of MatterId to matter that forgets the least
+    recently used matters once it holds more than `maxsize`.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._matters = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, matter):
+        with self._lock:
+            self._matters[matter["MatterId"]] = matter
+            self._matters.move_to_end(matter["MatterId"])
+            if len(self._matters) > self.maxsize:
+                self._matters.popitem(last=False)
+
+    def get(self, matter_id):
+        with self._lock:
+            matter = self._matters.get(matter_id)
+            if matter is not None:
+                self._matters.move_to_end(matter_id)
+            return matter
+
+    def fill(self, matters):
+        for matter in matters:
+            self.add(matter)
+            yield matter
+
+
+class Checkpoint(object):
+    """
+    What building the bills of the matters a scrape has finished needed,
+    one JSON line each, in a file it appends to as it goes. Only the file
+    offsets of the lines are kept in memory.
+    """
+
+    def __init__(self, path, max_age):
+        self.path = path
+        self._done = {}
+        self._file = None
+
+        try:
+            if time.time() - os.path.getmtime(path) < max_age:
+                self._read()
+        except FileNotFoundError:
+            pass
+
+    def _read(self):
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # the last line, cut short by whatever killed the scrape
+                    break
+                self._done[entry["MatterId"]] = (
+                    entry["MatterLastModifiedUtc"],
+                    offset,
+                )
+                offset += len(line)
+
+        # drop anything after the last good line, which we append after
+        with open(self.path, "ab") as f:
+            f.truncate(offset)
+
+    def __len__(self):
+        return len(self._done)
+
+    def __contains__(self, matter):
+        """Whether a matter is done, and hasn't changed since."""
+        done = self._done.get(matter["MatterId"])
+        return done is not None and done[0] == matter["MatterLastModifiedUtc"]
+
+    def get(self, matter):
+        if matter not in self:
+            return None
+        with open(self.path, "rb") as f:
+            f.seek(self._done[matter["MatterId"]][1])
+            return json.loads(f.readline())["details"]
+
+    def entry(self, matter, details):
+        if matter in self:
+            return None
+        kept = dict(details)
+        for key, fields in CHECKPOINT_FIELDS.items():
+            kept[key] = [
+                {field: item[field] for field in fields} for item in details[key]
+            ]
+        kept["actions"] = [
+            (
+                action,
+                (
+                    result,
+                    [
+                        {field: vote[field] for field in CHECKPOINT_VOTE_FIELDS}
+                        for vote in votes
+                    ],
+                ),
+            )
+            for action, (result, votes) in details["actions"]
+        ]
+        return json.dumps(
+            {
+                "MatterId": matter["MatterId"],
+                "MatterLastModifiedUtc": matter["MatterLastModifiedUtc"],
+                "details": kept,
+            },
+            cls=JSONEncoderPlus,
+        )
+
+    def save(self, matter, entry):
+        if entry is None:
+            return
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, "ab")
+        offset = self._file.tell()
+        self._file.write(entry.encode() + b"\n")
+        # the scrape dying must not take the line with it
+        self._file.flush()
+        self._done[matter["MatterId"]] = (matter["MatterLastModifiedUtc"], offset)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """Forget the checkpoint, once the scrape it was for is complete."""
+        self.close()
+        self._done.clear()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def resolved(value):
+    future = concurrent.futures.Future()
+    future.set_result(value)
+    return future
+
+
+def chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def prefetch(matters, window):
+    """
+    Consume (matter, details) pairs up to `window` matters ahead of the
+    caller, yielding each matter with its resolved details in order.
+    """
+    pending = collections.deque()
+    for matter, futures in matters:
+        pending.append((matter, futures))
+        if len(pending) > window:
+            yield resolve(*pending.popleft())
+
+    while pending:
+        yield resolve(*pending.popleft())
+
+
+def resolve(matter, details):
+    if isinstance(details, dict):
+        return matter, {key: future.result() for key, future in details.items()}
+    return matter, details.result()
 
 
 def pairwise(iterable):
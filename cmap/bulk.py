@@ -0,0 +1,312 @@
+"""
+Bulk prefetching of matter sub-resources and votes.
+
+Rather than asking for `/matters/{id}/histories`, `/sponsors`, `/indexes`
+and `/attachments` once per matter, `BulkPrefetcher` asks the flat OData
+collections behind them for a whole batch of matters at a time, and holds
+the results grouped by MatterId until the per-matter lookup comes asking.
+
+Not every Legistar client exposes the flat collections, so each one is
+probed once before it is used. A collection that is missing, empty, or
+whose items don't say which matter they belong to, is left to the
+per-matter routes.
+
+`EventVotes` does the same for roll calls. Every item on a meeting's
+agenda is voted on at the same event, so the first time votes are wanted
+for an event, the votes on all of its roll-call items are fetched at
+once from the flat `/votes` collection.
+
+With the async client (see cmap/aio.py), what a matter's own routes
+return is handed over the same way, and `EventVotes.get_async` fetches
+on the client's event loop.
+"""
+
+import asyncio
+import collections
+import operator
+import threading
+
+import requests
+
+# per-matter route: (collection, the key naming the matter, the item's id,
+# the keys the per-matter route orders a matter's items by). The flat
+# collections are paged in order of the item's id, which is not always
+# the order a matter's own route gives -- sponsors come in the order of
+# their sequence, and the first is the primary sponsor.
+BULK_ROUTES = {
+    "/matters/{0}/histories": (
+        "/matterhistories",
+        "MatterHistoryMatterId",
+        "MatterHistoryId",
+        ("MatterHistoryId",),
+    ),
+    "/matters/{0}/sponsors": (
+        "/mattersponsors",
+        "MatterSponsorMatterId",
+        "MatterSponsorId",
+        ("MatterSponsorSequence", "MatterSponsorId"),
+    ),
+    "/matters/{0}/indexes": (
+        "/matterindexes",
+        "MatterIndexMatterId",
+        "MatterIndexId",
+        ("MatterIndexId",),
+    ),
+    "/matters/{0}/attachments": (
+        "/matterattachments",
+        "MatterAttachmentMatterId",
+        "MatterAttachmentId",
+        ("MatterAttachmentId",),
+    ),
+}
+
+
+def probe(scraper, collection, key):
+    """
+    Whether the API serves a flat collection whose items have `key`. An
+    empty one can't show that they do.
+    """
+    try:
+        response = scraper.get(scraper.BASE_URL + collection, params={"$top": 1})
+    except requests.HTTPError:
+        return False
+    if response.status_code != 200:
+        return False
+    try:
+        items = response.json()
+    except ValueError:
+        return False
+    if not isinstance(items, list) or not items:
+        return False
+    return all(key in item for item in items)
+
+
+def any_of(key, values):
+    return " or ".join("{0} eq {1}".format(key, value) for value in values)
+
+
+class BulkPrefetcher(object):
+    def __init__(self, scraper, batch_size):
+        self.scraper = scraper
+        self.batch_size = batch_size
+
+        self._available = None
+        self._groups = {route: {} for route in BULK_ROUTES}
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        """The per-matter routes whose collections passed their probe."""
+        if self._available is None:
+            self._available = [
+                route
+                for route in BULK_ROUTES
+                if probe(self.scraper, *BULK_ROUTES[route][:2])
+            ]
+            for route in BULK_ROUTES:
+                if route not in self._available:
+                    self.scraper.info(
+                        "{0} is not available in bulk, fetching it per matter".format(
+                            BULK_ROUTES[route][0]
+                        )
+                    )
+        return self._available
+
+    def fill(self, matters, skip=None):
+        """
+        Pass matters through, prefetching the sub-resources of each batch
+        before its first matter is yielded, except for the matters `skip`
+        says are not needed.
+        """
+        batch = []
+        for matter in matters:
+            batch.append(matter)
+            if len(batch) == self.batch_size:
+                yield from self._fill_batch(batch, skip)
+                batch = []
+        if batch:
+            yield from self._fill_batch(batch, skip)
+
+    def _fill_batch(self, batch, skip):
+        matter_ids = [
+            matter["MatterId"] for matter in batch if skip is None or not skip(matter)
+        ]
+        if matter_ids:
+            self.prefetch(matter_ids)
+        yield from batch
+
+    def prefetch(self, matter_ids):
+        for route in self.available:
+            collection, matter_key, item_key, order = BULK_ROUTES[route]
+            groups = {matter_id: [] for matter_id in matter_ids}
+            params = {
+                "$filter": any_of(matter_key, matter_ids),
+                "$orderby": item_key,
+            }
+            for item in self.scraper.pages(
+                self.scraper.BASE_URL + collection, params=params, item_key=item_key
+            ):
+                if item[matter_key] in groups:
+                    groups[item[matter_key]].append(item)
+            for items in groups.values():
+                items.sort(key=operator.itemgetter(*order))
+            with self._lock:
+                self._groups[route].update(groups)
+
+    def add(self, route, matter_id, items):
+        """Hold items fetched some other way for the per-matter lookup."""
+        with self._lock:
+            self._groups.setdefault(route, {})[matter_id] = items
+
+    def get(self, route, matter_id):
+        """
+        Hand over, once, the prefetched items for a matter, or None if
+        they weren't prefetched.
+        """
+        with self._lock:
+            if route not in self._groups:
+                return None
+            return self._groups[route].pop(matter_id, None)
+
+
+class EventVotes(object):
+    """
+    Votes on event items, fetched a whole event at a time and kept for
+    the `maxsize` most recently used events.
+    """
+
+    def __init__(self, scraper, batch_size, maxsize):
+        self.scraper = scraper
+        self.batch_size = batch_size
+        self.maxsize = maxsize
+
+        self._available = None
+        self._events = collections.OrderedDict()
+        self._locks = collections.defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+        # events being fetched on the async client's loop
+        self._pending = {}
+
+    @property
+    def available(self):
+        with self._lock:
+            if self._available is None:
+                self._available = probe(self.scraper, "/votes", "VoteEventItemId")
+                if not self._available:
+                    self.scraper.info(
+                        "/votes is not available in bulk, fetching votes per item"
+                    )
+            return self._available
+
+    def get(self, event_id, history_id):
+        """The votes on the event item that a matter history row records."""
+        if event_id is not None and self.available:
+            votes = self._event(event_id).get(history_id)
+            if votes is not None:
+                return votes
+        return self.scraper.votes(history_id)
+
+    def _event(self, event_id):
+        with self._lock:
+            event_lock = self._locks[event_id]
+
+        # the first thread to want an event fetches it, the rest wait
+        with event_lock:
+            with self._lock:
+                if event_id in self._events:
+                    self._events.move_to_end(event_id)
+                    return self._events[event_id]
+
+            votes = self._fetch(event_id)
+            self._remember(event_id, votes)
+            return votes
+
+    def _remember(self, event_id, votes):
+        with self._lock:
+            self._events[event_id] = votes
+            if len(self._events) > self.maxsize:
+                evicted, _ = self._events.popitem(last=False)
+                self._locks.pop(evicted, None)
+
+    def _fetch(self, event_id):
+        try:
+            items = self.scraper.endpoint("/events/{0}/eventitems", event_id)
+        except requests.HTTPError:
+            # leave the event's votes to be fetched item by item
+            return {}
+        item_ids = [
+            item["EventItemId"] for item in items if item["EventItemRollCallFlag"]
+        ]
+
+        votes = {item_id: [] for item_id in item_ids}
+        for i in range(0, len(item_ids), self.batch_size):
+            params = {
+                "$filter": any_of("VoteEventItemId", item_ids[i : i + self.batch_size]),
+                "$orderby": "VoteId",
+            }
+            for vote in self.scraper.pages(
+                self.scraper.BASE_URL + "/votes", params=params, item_key="VoteId"
+            ):
+                if vote["VoteEventItemId"] in votes:
+                    votes[vote["VoteEventItemId"]].append(vote)
+        return votes
+
+    async def get_async(self, event_id, history_id):
+        """`get`, on the async client's event loop."""
+        if event_id is not None and self.available:
+            votes = (await self._event_async(event_id)).get(history_id)
+            if votes is not None:
+                return votes
+        return await self.scraper.votes_async(history_id)
+
+    async def _event_async(self, event_id):
+        with self._lock:
+            if event_id in self._events:
+                self._events.move_to_end(event_id)
+                return self._events[event_id]
+
+        # the first coroutine to want an event fetches it, the rest wait
+        if event_id not in self._pending:
+            self._pending[event_id] = asyncio.ensure_future(self._fetch_async(event_id))
+        pending = self._pending[event_id]
+        try:
+            votes = await pending
+        finally:
+            if self._pending.get(event_id) is pending:
+                del self._pending[event_id]
+        self._remember(event_id, votes)
+        return votes
+
+    async def _fetch_async(self, event_id):
+        client = self.scraper.aio
+        try:
+            items = await client.json(
+                self.scraper.BASE_URL + "/events/{0}/eventitems".format(event_id)
+            )
+        except requests.HTTPError:
+            return {}
+        item_ids = [
+            item["EventItemId"] for item in items if item["EventItemRollCallFlag"]
+        ]
+
+        votes = {item_id: [] for item_id in item_ids}
+        batches = await asyncio.gather(
+            *(
+                client.pages(
+                    self.scraper.BASE_URL + "/votes",
+                    params={
+                        "$filter": any_of(
+                            "VoteEventItemId", item_ids[i : i + self.batch_size]
+                        ),
+                        "$orderby": "VoteId",
+                    },
+                    item_key="VoteId",
+                )
+                for i in range(0, len(item_ids), self.batch_size)
+            )
+        )
+        for batch in batches:
+            for vote in batch:
+                if vote["VoteEventItemId"] in votes:
+                    votes[vote["VoteEventItemId"]].append(vote)
+        return votes
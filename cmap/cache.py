@@ -0,0 +1,411 @@
+"""
+A persistent HTTP cache for the Legistar web API.
+
+Responses are kept in an SQLite database shared by every scraper in the
+jurisdiction. Each route has its own time to live; once an entry is
+older than that it is revalidated with If-None-Match/If-Modified-Since
+when the server gave us an ETag or Last-Modified header, and refetched
+otherwise. Bodies are stored in chunks, so large streamed responses like
+matter texts are cached without being read into memory, and the least
+recently used entries are evicted once the cache outgrows its size limit.
+
+Set `CMAP_HTTP_CACHE` in pupa_settings.py to the database path, or to
+None to turn the cache off.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+import requests
+from pupa import settings
+
+CHUNK_SIZE = 1024 * 1024
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# the first pattern that matches a URL sets how long its responses are
+# used without asking the server again. Roll calls are corrected after
+# the meeting, and with a TTL as long as the day between scheduled runs
+# each run could be served the votes the run before it saw, so they are
+# kept for about as long as a run takes, and asked for again by the next.
+ROUTE_TTLS = [
+    (re.compile(r"/matters/\d+/texts/\d+$"), 30 * DAY),
+    (re.compile(r"/gateway\.aspx\?"), 30 * DAY),
+    (re.compile(r"/eventitems/\d+/votes$"), HOUR),
+    (re.compile(r"/(bodytypes|bodies|persons)\b"), DAY),
+    (re.compile(r"/matters/\d+/\w+$"), HOUR),
+    (re.compile(r"/matters\b"), 0),
+]
+DEFAULT_TTL = 0
+
+CACHEABLE_STATUSES = {200, 301, 302}
+
+# headers describing the body on the wire, which no longer apply to the
+# decoded body we store
+WIRE_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    reason TEXT,
+    headers TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+CREATE TABLE IF NOT EXISTS chunks (
+    key TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (key, seq)
+);
+"""
+
+
+def route_ttl(url):
+    for pattern, ttl in ROUTE_TTLS:
+        if pattern.search(url):
+            return ttl
+    return DEFAULT_TTL
+
+
+def full_url(url, params=None):
+    return requests.Request(url=url, params=params).prepare().url
+
+
+class ResponseCache(object):
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+        (self._size,) = self._db.execute(
+            "SELECT coalesce(sum(size), 0) FROM responses"
+        ).fetchone()
+
+    def lookup(self, key):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, status, reason, headers, etag, last_modified, stored_at "
+                "FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+        if row is None:
+            return None
+
+        url, status, reason, headers, etag, last_modified, stored_at = row
+        return {
+            "key": key,
+            "url": url,
+            "status": status,
+            "reason": reason,
+            "headers": json.loads(headers),
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored_at": stored_at,
+        }
+
+    def is_fresh(self, entry):
+        return time.time() - entry["stored_at"] < route_ttl(entry["url"])
+
+    def validators(self, entry):
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def refresh(self, key):
+        """Mark an entry as just revalidated."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?",
+                (now, now, key),
+            )
+
+    def chunk(self, key, seq):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM chunks WHERE key = ? AND seq = ?", (key, seq)
+            ).fetchone()
+        return row[0] if row else b""
+
+    def response(self, entry, stream=False):
+        """Build a requests.Response from a cache entry."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                (now, entry["key"]),
+            )
+
+        response = requests.Response()
+        response.url = entry["url"]
+        response.status_code = entry["status"]
+        response.reason = entry["reason"]
+        response.headers = requests.structures.CaseInsensitiveDict(entry["headers"])
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        body = CachedBody(self, entry["key"])
+        if stream:
+            response.raw = body
+        else:
+            response._content = b"".join(iter(body.read, b""))
+            response._content_consumed = True
+        response.fromcache = True
+        return response
+
+    def should_store(self, url, response):
+        if response.status_code not in CACHEABLE_STATUSES:
+            return False
+        return route_ttl(url) > 0 or any(
+            header in response.headers for header in ("ETag", "Last-Modified")
+        )
+
+    def writer(self, key, url, response):
+        pending_key = "{0}#pending-{1}".format(key, uuid.uuid4().hex)
+        return EntryWriter(self, key, pending_key, url, response)
+
+    def store(self, writer, content):
+        for i in range(0, len(content), CHUNK_SIZE):
+            writer.write(content[i : i + CHUNK_SIZE])
+        writer.commit()
+
+    def _write_chunk(self, pending_key, seq, data):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO chunks (key, seq, data) VALUES (?, ?, ?)",
+                (pending_key, seq, data),
+            )
+
+    def _discard(self, pending_key):
+        with self._lock:
+            self._db.execute("DELETE FROM chunks WHERE key = ?", (pending_key,))
+
+    def _commit(self, key, pending_key, url, response, size):
+        headers = {
+            name: value
+            for name, value in response.headers.items()
+            if name.lower() not in WIRE_HEADERS
+        }
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            (old_size,) = self._db.execute(
+                "SELECT coalesce(sum(size), 0) FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._db.execute("DELETE FROM chunks WHERE key = ?", (key,))
+            self._db.execute(
+                "UPDATE chunks SET key = ? WHERE key = ?", (key, pending_key)
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, url, status, reason, headers, etag, last_modified, "
+                "stored_at, accessed_at, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    url,
+                    response.status_code,
+                    response.reason,
+                    json.dumps(headers),
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    now,
+                    now,
+                    size,
+                ),
+            )
+            self._db.execute("COMMIT")
+            self._size += size - old_size
+
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the cache is 90% full."""
+        target = self.max_bytes * 0.9
+        with self._lock:
+            self._db.execute("BEGIN")
+            rows = self._db.execute(
+                "SELECT key, size FROM responses ORDER BY accessed_at"
+            ).fetchall()
+            evicted = []
+            for key, size in rows:
+                if self._size <= target:
+                    break
+                evicted.append(key)
+                self._size -= size
+            for key in evicted:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.execute("DELETE FROM chunks WHERE key = ?", (key,))
+            self._db.execute("COMMIT")
+
+
+class CachedBody(object):
+    """A file-like view of a cached body, read a chunk at a time."""
+
+    def __init__(self, cache, key):
+        self._cache = cache
+        self._key = key
+        self._seq = 0
+
+    def read(self, size=-1):
+        data = self._cache.chunk(self._key, self._seq)
+        self._seq += 1
+        return data
+
+    def close(self):
+        pass
+
+
+class EntryWriter(object):
+    """Writes a response body to the cache as it is read."""
+
+    def __init__(self, cache, key, pending_key, url, response):
+        self._cache = cache
+        self._key = key
+        self._pending_key = pending_key
+        self._url = url
+        self._response = response
+        self._seq = 0
+        self._size = 0
+
+    def write(self, data):
+        if data:
+            self._cache._write_chunk(self._pending_key, self._seq, data)
+            self._seq += 1
+            self._size += len(data)
+
+    def commit(self):
+        self._cache._commit(
+            self._key, self._pending_key, self._url, self._response, self._size
+        )
+
+    def discard(self):
+        self._cache._discard(self._pending_key)
+
+
+class TeeBody(object):
+    """
+    Wraps a streamed response body so everything read from it is also
+    written to the cache, committing the entry once the body is exhausted.
+    """
+
+    def __init__(self, raw, writer):
+        self._writer = writer
+        self._done = False
+        if hasattr(raw, "stream"):
+            # a urllib3 response, which we want decoded
+            self._chunks = raw.stream(CHUNK_SIZE, decode_content=True)
+        else:
+            self._chunks = iter(lambda: raw.read(CHUNK_SIZE), b"")
+        self._raw = raw
+
+    def read(self, size=-1):
+        if self._done:
+            return b""
+        data = next(self._chunks, b"")
+        if data:
+            self._writer.write(data)
+        else:
+            self._done = True
+            self._writer.commit()
+        return data
+
+    def close(self):
+        if not self._done:
+            self._done = True
+            self._writer.discard()
+        self._raw.close()
+
+    def release_conn(self):
+        release_conn = getattr(self._raw, "release_conn", None)
+        if release_conn is not None:
+            release_conn()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def shared_cache():
+    """The cache named in the settings, opened once per process."""
+    path = settings.CMAP_HTTP_CACHE
+    if not path:
+        return None
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = ResponseCache(path, settings.CMAP_HTTP_CACHE_MAX_BYTES)
+        return _caches[path]
+
+
+class HTTPCacheMixin(object):
+    """
+    Answer GET and HEAD requests from the shared ResponseCache when we
+    can, and revalidate or refetch them when we can't.
+    """
+
+    def key_for_request(self, method, url, params=None, data=None):
+        # leave caching to us rather than scrapelib
+        if settings.CMAP_HTTP_CACHE:
+            return None
+        return super().key_for_request(method, url, params, data)
+
+    def request(self, method, url, params=None, headers=None, **kwargs):
+        cache = shared_cache()
+        if (
+            cache is None
+            or method.upper() not in {"GET", "HEAD"}
+            or kwargs.get("data") is not None
+            or kwargs.get("json") is not None
+        ):
+            return super().request(
+                method, url, params=params, headers=headers, **kwargs
+            )
+
+        stream = kwargs.get("stream") or False
+        request_url = full_url(url, params)
+        key = "{0} {1}".format(method.upper(), request_url)
+
+        entry = cache.lookup(key)
+        if entry is not None:
+            if cache.is_fresh(entry):
+                return cache.response(entry, stream)
+            headers = dict(headers or {}, **cache.validators(entry))
+
+        response = super().request(
+            method, url, params=params, headers=headers, **kwargs
+        )
+
+        if entry is not None and response.status_code == 304:
+            response.close()
+            cache.refresh(key)
+            return cache.response(entry, stream)
+
+        if cache.should_store(request_url, response):
+            writer = cache.writer(key, request_url, response)
+            if stream:
+                response.raw = TeeBody(response.raw, writer)
+            else:
+                cache.store(writer, response.content)
+
+        return response
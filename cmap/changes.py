@@ -0,0 +1,131 @@
+"""
+A feed of what changed in cmap.db from one run to the next.
+
+As `cmap.load` writes each organization, person, bill and vote event, it
+hashes the object's content, related rows included. The hashes are kept
+in the `contenthash` table of the database, and compared with the ones
+the last run left there, so each run can write a JSON line for every
+object it created or changed:
+
+    {"change": "updated", "type": "bill", "id": "ocd-bill/...", "hash": "..."}
+
+Objects of a kind that was scraped in full -- organizations and people
+when the person scraper runs, bills and vote events when every matter is
+scraped -- that a run no longer finds are listed as deleted, and dropped
+from the index. Their rows are left in the database, as `--update` leaves
+everything it isn't given alone.
+
+A bill that is scraped again replaces its vote events, so those of its
+vote events the run doesn't find again are deleted, from the database
+and the index, and listed as deleted even when bills are only scraped in
+part.
+
+An empty feed means nothing changed.
+"""
+
+import hashlib
+import json
+import os
+
+from .utils import flag
+
+TRACKED = ("organization", "person", "bill", "vote_event")
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS contenthash (
+        id varchar(53) NOT NULL PRIMARY KEY,
+        type varchar(20) NOT NULL,
+        hash char(64) NOT NULL
+    )
+"""
+
+
+def content_hash(data):
+    content = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def complete_kinds(scrapers):
+    """The kinds of object the scrapers will find every one of."""
+    kinds = set()
+    for name, kwargs in scrapers:
+        if name == "people":
+            kinds.update(("organization", "person"))
+        elif name == "bills":
+            partial = flag(kwargs.get("incremental", False)) or any(
+                kwargs.get(bound) for bound in ("introduced_from", "introduced_before")
+            )
+            if not partial:
+                kinds.update(("bill", "vote_event"))
+    return kinds
+
+
+class ChangeIndex(object):
+    def __init__(self):
+        # id: (kind, hash), as the last run left them and as this run
+        # found them
+        self.previous = {}
+        self.current = {}
+        # ids an update deleted along with what they belong to
+        self.replaced = set()
+
+    def read(self, con):
+        con.execute(SCHEMA)
+        self.previous = {
+            object_id: (kind, digest)
+            for object_id, kind, digest in con.execute(
+                "SELECT id, type, hash FROM contenthash"
+            )
+        }
+
+    def add(self, kind, data):
+        if kind in TRACKED:
+            self.current[data["id"]] = (kind, content_hash(data))
+
+    def replace(self, object_ids):
+        """
+        Note objects an update deleted along with what they belong to,
+        which are gone unless they are written again.
+        """
+        self.replaced.update(object_ids)
+
+    def changes(self, complete):
+        for object_id, (kind, digest) in self.current.items():
+            previous = self.previous.get(object_id)
+            if previous is None:
+                change = "created"
+            elif previous[1] != digest:
+                change = "updated"
+            else:
+                continue
+            yield {"change": change, "type": kind, "id": object_id, "hash": digest}
+
+        for object_id, (kind, _) in sorted(self.previous.items()):
+            if object_id in self.current:
+                continue
+            if kind in complete or object_id in self.replaced:
+                yield {"change": "deleted", "type": kind, "id": object_id}
+
+    def save(self, con, changes):
+        """Bring the index in the database up to date with `changes`."""
+        con.executemany(
+            "INSERT INTO contenthash (id, type, hash) VALUES (?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET type = excluded.type, hash = excluded.hash",
+            (
+                (change["id"], change["type"], change["hash"])
+                for change in changes
+                if change["change"] != "deleted"
+            ),
+        )
+        con.executemany(
+            "DELETE FROM contenthash WHERE id = ?",
+            ((change["id"],) for change in changes if change["change"] == "deleted"),
+        )
+
+
+def write_feed(path, changes):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        for change in changes:
+            f.write(json.dumps(change) + "\n")
+    os.replace(tmp_path, path)
@@ -0,0 +1,281 @@
+"""
+Publish cmap.db as a delta against the last release.
+
+    python -m cmap.delta diff previous.db cmap.db cmap.delta.sql.gz
+    python -m cmap.delta apply cmap.db cmap.delta.sql.gz
+
+`diff` compares two databases row by row, keyed by each table's primary
+key, and writes a gzipped SQL script of the deletes and upserts that
+turn the first into the second, along with any tables and indexes that
+came or went. Tables without a primary key -- the FTS index -- are
+compared by whole rows.
+
+`apply` runs such a script against a local copy, in one transaction,
+and only commits if the result has the digest the script was made for.
+The digest is of the databases' contents, not their files, so a copy
+that was patched and one that was downloaded whole compare the same. A
+copy that isn't the one the delta was made from is left untouched; get
+the whole `cmap.db.zip` then.
+
+This module only needs the standard library, so it can be downloaded and
+run on its own.
+"""
+
+import argparse
+import gzip
+import hashlib
+import os
+import sqlite3
+import sys
+
+HEADER = "-- cmap.db delta from {0} to {1}\n"
+
+
+def quote(name):
+    return '"{0}"'.format(name.replace('"', '""'))
+
+
+def literal(value):
+    if value is None:
+        return "NULL"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, bytes):
+        return "X'{0}'".format(value.hex())
+    return "'{0}'".format(value.replace("'", "''"))
+
+
+def objects(con, schema="main"):
+    """
+    The tables and indexes the delta covers, as {name: (type, table,
+    sql)}, leaving out SQLite's own and the ones FTS keeps for itself.
+    """
+    rows = con.execute(
+        "SELECT type, name, tbl_name, sql FROM {0}.sqlite_master "
+        "WHERE type IN ('table', 'index') AND sql IS NOT NULL "
+        "AND name NOT LIKE 'sqlite_%'".format(schema)
+    ).fetchall()
+    virtual = [
+        name
+        for kind, name, _, sql in rows
+        if kind == "table" and sql.upper().startswith("CREATE VIRTUAL TABLE")
+    ]
+    return {
+        name: (kind, table, sql)
+        for kind, name, table, sql in rows
+        if not any(table.startswith(v + "_") for v in virtual)
+    }
+
+
+def primary_key(con, table, schema="main"):
+    columns = con.execute(
+        "PRAGMA {0}.table_info({1})".format(schema, quote(table))
+    ).fetchall()
+    key = sorted((pk, name) for _, name, _, _, _, pk in columns if pk)
+    return [name for _, name in key], [name for _, name, *_ in columns]
+
+
+def digest(con):
+    """A SHA-256 of the tables' and indexes' definitions and contents."""
+    h = hashlib.sha256()
+    for name, (kind, table, sql) in sorted(objects(con).items()):
+        h.update("{0} {1}\n".format(name, sql).encode())
+        if kind != "table":
+            continue
+        key, columns = primary_key(con, name)
+        order = ", ".join(quote(column) for column in key or columns)
+        for row in con.execute(
+            "SELECT * FROM {0} ORDER BY {1}".format(quote(name), order)
+        ):
+            h.update(repr(row).encode())
+    return h.hexdigest()
+
+
+def insert(table, columns, row, replace=False):
+    return "INSERT {0}INTO {1} ({2}) VALUES ({3});\n".format(
+        "OR REPLACE " if replace else "",
+        quote(table),
+        ", ".join(quote(column) for column in columns),
+        ", ".join(literal(value) for value in row),
+    )
+
+
+def diff_rows(con, table):
+    """Statements turning old's rows of a table into main's."""
+    key, columns = primary_key(con, table)
+    name = quote(table)
+    if key:
+        key_list = ", ".join(quote(column) for column in key)
+        deleted = con.execute(
+            "SELECT {0} FROM old.{1} EXCEPT SELECT {0} FROM main.{1}".format(
+                key_list, name
+            )
+        )
+        for row in deleted:
+            yield "DELETE FROM {0} WHERE {1};\n".format(
+                name,
+                " AND ".join(
+                    "{0} = {1}".format(quote(column), literal(value))
+                    for column, value in zip(key, row)
+                ),
+            )
+        for row in con.execute(
+            "SELECT * FROM main.{0} EXCEPT SELECT * FROM old.{0}".format(name)
+        ):
+            yield insert(table, columns, row, replace=True)
+        return
+
+    # without a key, a row is its own key: any row whose number of copies
+    # changed is deleted and inserted again as many times as there are now
+    column_list = ", ".join(quote(column) for column in columns)
+    counted = "SELECT {0}, count(*) FROM {{0}}.{1} GROUP BY {0}".format(
+        column_list, name
+    )
+    changed = set()
+    for left, right in (("main", "old"), ("old", "main")):
+        for row in con.execute(
+            counted.format(left) + " EXCEPT " + counted.format(right)
+        ):
+            changed.add(row[:-1])
+    if not changed:
+        return
+
+    yield "CREATE TEMP TABLE _delta AS SELECT {0} FROM {1} WHERE 0;\n".format(
+        column_list, name
+    )
+    for row in sorted(changed, key=repr):
+        yield insert("_delta", columns, row)
+    yield (
+        "DELETE FROM {0} WHERE rowid IN (SELECT {0}.rowid FROM {0} "
+        "JOIN temp._delta ON {1});\n"
+    ).format(
+        name,
+        " AND ".join(
+            "{0}.{1} IS temp._delta.{1}".format(name, quote(column))
+            for column in columns
+        ),
+    )
+    yield "DROP TABLE temp._delta;\n"
+    for row in con.execute(counted.format("main")):
+        if row[:-1] in changed:
+            for _ in range(row[-1]):
+                yield insert(table, columns, row[:-1])
+
+
+def diff(old_path, new_path, delta_path):
+    con = sqlite3.connect("file:{0}?mode=ro".format(new_path), uri=True)
+    con.execute("ATTACH ? AS old", ("file:{0}?mode=ro".format(old_path),))
+    try:
+        old, new = objects(con, "old"), objects(con)
+        tables = [name for name, (kind, _, _) in new.items() if kind == "table"]
+        # tables that are new, or whose definitions changed, are written
+        # out whole
+        rebuilt = {name for name in tables if old.get(name) != new[name]}
+
+        tmp_path = delta_path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            f.write(HEADER.format(digest_of(old_path), digest(con)))
+            for name, (kind, table, _) in sorted(old.items()):
+                if kind == "index" and (table in rebuilt or old[name] != new.get(name)):
+                    f.write("DROP INDEX IF EXISTS {0};\n".format(quote(name)))
+            for name, (kind, _, _) in sorted(old.items()):
+                if kind == "table" and (name in rebuilt or name not in new):
+                    f.write("DROP TABLE IF EXISTS {0};\n".format(quote(name)))
+
+            for name in sorted(tables):
+                if name in rebuilt:
+                    f.write(new[name][2] + ";\n")
+                    _, columns = primary_key(con, name)
+                    for row in con.execute(
+                        "SELECT * FROM main.{0}".format(quote(name))
+                    ):
+                        f.write(insert(name, columns, row))
+                else:
+                    f.writelines(diff_rows(con, name))
+
+            for name, (kind, table, sql) in sorted(new.items()):
+                if kind == "index" and (table in rebuilt or old.get(name) != new[name]):
+                    f.write(sql + ";\n")
+        os.replace(tmp_path, delta_path)
+    finally:
+        con.close()
+
+
+def digest_of(path):
+    con = sqlite3.connect("file:{0}?mode=ro".format(path), uri=True)
+    try:
+        return digest(con)
+    finally:
+        con.close()
+
+
+class DeltaError(Exception):
+    pass
+
+
+def statements(f):
+    statement = ""
+    for line in f:
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement
+            statement = ""
+
+
+def apply(path, delta_path):
+    con = sqlite3.connect(path, isolation_level=None)
+    try:
+        with gzip.open(delta_path, "rt", encoding="utf-8") as f:
+            words = f.readline().split()
+            if words[:4] != HEADER.split()[:4] or len(words) != 7:
+                raise DeltaError("{0} isn't a cmap.db delta".format(delta_path))
+            base, target = words[4], words[6]
+
+            if digest(con) != base:
+                raise DeltaError(
+                    "{0} isn't the database {1} was made from".format(path, delta_path)
+                )
+
+            con.execute("BEGIN")
+            for statement in statements(f):
+                con.execute(statement)
+            if digest(con) != target:
+                con.execute("ROLLBACK")
+                raise DeltaError(
+                    "{0} didn't come out as it should have; left it as it was".format(
+                        path
+                    )
+                )
+            con.execute("ANALYZE")
+            con.execute("COMMIT")
+    except BaseException:
+        if con.in_transaction:
+            con.execute("ROLLBACK")
+        raise
+    finally:
+        con.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    diff_parser = commands.add_parser("diff", help="write a delta")
+    diff_parser.add_argument("old")
+    diff_parser.add_argument("new")
+    diff_parser.add_argument("delta")
+    apply_parser = commands.add_parser("apply", help="apply a delta")
+    apply_parser.add_argument("database")
+    apply_parser.add_argument("delta")
+    args = parser.parse_args()
+
+    if args.command == "diff":
+        diff(args.old, args.new, args.delta)
+    else:
+        try:
+            apply(args.database, args.delta)
+        except DeltaError as e:
+            sys.exit(str(e))
+
+
+if __name__ == "__main__":
+    main()
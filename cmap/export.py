@@ -0,0 +1,177 @@
+"""
+Export the final tables of cmap.db to Parquet.
+
+    python -m cmap.export cmap.db parquet
+
+Each table analysts scan -- bills, actions, vote events, person votes,
+vote counts, memberships and people -- is written to its own
+zstd-compressed Parquet file, typed from the columns' declared types:
+timestamps as timestamps, integers as integers, and pupa's JSON arrays
+as lists of strings. Vote options, results, roles and the names of the
+organizations and sessions rows belong to, which are joined in beside
+their ids, are dictionary encoded.
+
+Rows are read and written in batches, so the export runs in constant
+memory however big the tables get.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+
+import pyarrow
+import pyarrow.parquet
+
+logger = logging.getLogger("cmap.export")
+
+TABLES = (
+    "bill",
+    "billaction",
+    "voteevent",
+    "personvote",
+    "votecount",
+    "membership",
+    "person",
+)
+
+# names exported beside the ids they stand for: id column: (table, the
+# name's column, what to call it)
+LOOKUPS = {
+    "organization_id": ("organization", "name", "organization_name"),
+    "from_organization_id": ("organization", "name", "from_organization_name"),
+    "legislative_session_id": (
+        "legislativesession",
+        "identifier",
+        "legislative_session",
+    ),
+}
+
+# columns with few distinct values
+DICTIONARY_COLUMNS = {
+    "option",
+    "result",
+    "role",
+    "organization_name",
+    "from_organization_name",
+    "legislative_session",
+}
+
+BATCH_SIZE = 100000
+
+COMPRESSION = "zstd"
+
+
+def column_type(name, declared_type):
+    declared_type = declared_type.lower()
+    if declared_type.endswith("[]"):
+        return pyarrow.list_(pyarrow.string())
+    if declared_type == "datetime":
+        return pyarrow.timestamp("us", tz="UTC")
+    if declared_type == "bool":
+        return pyarrow.bool_()
+    if "int" in declared_type:
+        return pyarrow.int64()
+    if name in DICTIONARY_COLUMNS:
+        return pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+    return pyarrow.string()
+
+
+def to_array(values, arrow_type):
+    if pyarrow.types.is_list(arrow_type):
+        values = [None if value is None else json.loads(value) for value in values]
+    elif pyarrow.types.is_timestamp(arrow_type):
+        # Django keeps UTC timestamps in SQLite without an offset
+        naive = pyarrow.array(values, pyarrow.string())
+        return naive.cast(pyarrow.timestamp("us")).cast(arrow_type)
+    elif pyarrow.types.is_dictionary(arrow_type):
+        return pyarrow.array(values, pyarrow.string()).dictionary_encode()
+    return pyarrow.array(values, arrow_type)
+
+
+def table_exists(con, table):
+    row = con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    return row is not None
+
+
+def export_table(con, table, path):
+    """Write a table to a Parquet file at `path`, returning its row count."""
+    columns = [
+        (name, declared_type)
+        for _, name, declared_type, *_ in con.execute(
+            'PRAGMA table_info("{0}")'.format(table)
+        )
+    ]
+
+    selects = ['"{0}"."{1}"'.format(table, name) for name, _ in columns]
+    joins = []
+    for name, _ in columns:
+        if name not in LOOKUPS or not table_exists(con, LOOKUPS[name][0]):
+            continue
+        lookup_table, lookup_column, alias = LOOKUPS[name]
+        selects.append('"{0}"."{1}"'.format(name, lookup_column))
+        joins.append(
+            'LEFT JOIN "{0}" AS "{1}" ON "{1}".id = "{2}"."{1}"'.format(
+                lookup_table, name, table
+            )
+        )
+        columns.append((alias, "varchar"))
+
+    schema = pyarrow.schema(
+        [(name, column_type(name, declared_type)) for name, declared_type in columns]
+    )
+
+    cursor = con.execute(
+        'SELECT {0} FROM "{1}" {2}'.format(", ".join(selects), table, " ".join(joins))
+    )
+
+    rows = 0
+    tmp_path = path + ".tmp"
+    with pyarrow.parquet.ParquetWriter(
+        tmp_path, schema, compression=COMPRESSION
+    ) as writer:
+        while True:
+            batch = cursor.fetchmany(BATCH_SIZE)
+            if not batch:
+                break
+            arrays = [
+                to_array(values, field.type)
+                for values, field in zip(zip(*batch), schema)
+            ]
+            writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+            rows += len(batch)
+    os.replace(tmp_path, path)
+    return rows
+
+
+def export(database, directory, tables=TABLES):
+    os.makedirs(directory, exist_ok=True)
+    con = sqlite3.connect("file:{0}?mode=ro".format(database), uri=True)
+    try:
+        for table in tables:
+            if not table_exists(con, table):
+                # cmap.postprocess and cmap.load drop empty tables
+                logger.info("skipping %s, which isn't in %s", table, database)
+                continue
+            path = os.path.join(directory, table + ".parquet")
+            rows = export_table(con, table, path)
+            logger.info("wrote %d rows to %s", rows, path)
+    finally:
+        con.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("database")
+    parser.add_argument("directory")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    export(args.database, args.directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,961 @@
+"""
+Load scraped objects straight into cmap.db.
+
+    python -m cmap.load cmap.db [--fastmode] [--update] [people|bills [key=value ...]] ...
+
+This does the job of `pupa dbinit`, `pupa update` and cmap.postprocess in
+one step, without Django: the organizations, people, bills and vote events
+the scrapers yield are written to the final, unprefixed tables with
+batched `executemany` calls inside one transaction. Ids are derived from
+each object's natural key, so the same data always gets the same ids.
+
+Pseudo ids are resolved the way pupa's importers resolve them, against
+the objects already loaded in this run.
+
+With `--update`, the objects are upserted into the database an earlier
+run left behind instead, so that, with `bills incremental=true`, only the
+bills that changed are rewritten. Whatever a bill or person restates --
+its actions, sponsorships, vote events and their votes and counts, or its
+memberships -- replaces what was stored for it before; everything else is
+left alone.
+
+    python -m cmap.load cmap.db --update --fastmode people bills incremental=true
+
+A new database is written without a journal worth the name, as there is
+nothing to lose if the load dies part way. An update is written through
+a write-ahead log, so that a load that dies leaves the database as it
+was.
+
+With `--changes FILE`, a JSON line for each organization, person, bill
+and vote event created, updated or deleted since the last run is written
+to FILE; see cmap/changes.py.
+
+With `--processes N`, bills are scraped by N worker processes, each
+taking a range of introduction dates; see cmap/shard.py.
+
+With `--from DIR`, the named scrapers' objects are read from the NDJSON
+segments a `pupa update --scrape` left in DIR, instead of being scraped;
+see cmap/segments.py.
+
+    python -m cmap.load cmap.db --from _data/cmap people bills
+
+The bill scraper's high-water mark is kept in the database's `watermark`
+table, rather than in `_state`, and written in the same transaction as
+the bills, so an incremental run always starts from what the database it
+updates actually has -- not from a scrape that was never loaded, or a
+database that was never published. Passing the scraper a `watermark`
+file of its own leaves the table alone.
+"""
+
+import argparse
+import collections
+import datetime
+import itertools
+import json
+import logging
+import logging.config
+import os
+import re
+import sqlite3
+import tempfile
+import uuid
+
+from pupa import settings
+from pupa.scrape import JurisdictionScraper
+from pupa.utils import JSONEncoderPlus, get_pseudo_id
+
+from . import CMAP
+from .bills import read_watermark, write_watermark
+from .changes import ChangeIndex, complete_kinds, write_feed
+from .postprocess import PRAGMAS
+from .segments import read_segments
+
+logger = logging.getLogger("cmap.load")
+
+SCHEMA = os.path.join(os.path.dirname(__file__), "schema.sql")
+SCHEMA_TABLE = re.compile(r'CREATE TABLE (?:IF NOT EXISTS )?"(\w+)"')
+
+BATCH_SIZE = 1000
+
+# for a database that is already there, which a load that dies must not
+# leave corrupt
+UPDATE_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA temp_store = MEMORY",
+)
+
+WATERMARK_TABLE = """
+    CREATE TABLE IF NOT EXISTS watermark (
+        scraper varchar(50) NOT NULL PRIMARY KEY,
+        last_modified varchar(30) NOT NULL
+    )
+"""
+
+# the related objects pupa's importers store in their own tables: field on
+# the scraped object: (table, foreign key to the parent, related of related)
+RELATED = {
+    "organization": {
+        "identifiers": ("organizationidentifier", "organization_id", {}),
+        "other_names": ("organizationname", "organization_id", {}),
+        "contact_details": ("organizationcontactdetail", "organization_id", {}),
+        "links": ("organizationlink", "organization_id", {}),
+        "sources": ("organizationsource", "organization_id", {}),
+    },
+    "person": {
+        "identifiers": ("personidentifier", "person_id", {}),
+        "other_names": ("personname", "person_id", {}),
+        "contact_details": ("personcontactdetail", "person_id", {}),
+        "links": ("personlink", "person_id", {}),
+        "sources": ("personsource", "person_id", {}),
+    },
+    "post": {
+        "contact_details": ("postcontactdetail", "post_id", {}),
+        "links": ("postlink", "post_id", {}),
+    },
+    "membership": {
+        "contact_details": ("membershipcontactdetail", "membership_id", {}),
+        "links": ("membershiplink", "membership_id", {}),
+    },
+    "bill": {
+        "abstracts": ("billabstract", "bill_id", {}),
+        "other_titles": ("billtitle", "bill_id", {}),
+        "other_identifiers": ("billidentifier", "bill_id", {}),
+        "actions": (
+            "billaction",
+            "bill_id",
+            {"related_entities": ("billactionrelatedentity", "action_id", {})},
+        ),
+        "related_bills": ("relatedbill", "bill_id", {}),
+        "sponsorships": ("billsponsorship", "bill_id", {}),
+        "sources": ("billsource", "bill_id", {}),
+        "documents": (
+            "billdocument",
+            "bill_id",
+            {"links": ("billdocumentlink", "document_id", {})},
+        ),
+        "versions": (
+            "billversion",
+            "bill_id",
+            {"links": ("billversionlink", "version_id", {})},
+        ),
+    },
+    "vote_event": {
+        "counts": ("votecount", "vote_event_id", {}),
+        "votes": ("personvote", "vote_event_id", {}),
+        "sources": ("votesource", "vote_event_id", {}),
+    },
+}
+
+# what a scraper restates in full whenever it yields a bill or a person,
+# and so replaces when an existing database is updated
+REPLACED = {
+    "bill": dict(
+        RELATED["bill"],
+        vote_events=("voteevent", "bill_id", RELATED["vote_event"]),
+    ),
+    "person": dict(
+        RELATED["person"],
+        memberships=("membership", "person_id", RELATED["membership"]),
+    ),
+}
+
+# related tables whose rows record their position
+PRESERVE_ORDER = {"billaction"}
+
+# the types of object each scraper yields
+SCRAPED_TYPES = {
+    "people": ("organization", "person", "post", "membership"),
+    "bills": ("bill", "vote_event"),
+}
+
+# the names the Open Civic Data division list gives the divisions our
+# posts are in
+DIVISION_NAMES = {
+    "ocd-division/country:us/state:il/county:cook": "Cook County",
+    "ocd-division/country:us/state:il/county:dupage": "DuPage County",
+    "ocd-division/country:us/state:il/county:kane": "Kane County",
+    "ocd-division/country:us/state:il/county:lake": "Lake County",
+    "ocd-division/country:us/state:il/county:mchenry": "McHenry County",
+    "ocd-division/country:us/state:il/county:will": "Will County",
+    "ocd-division/country:us/state:il/place:chicago": "Chicago",
+}
+
+
+def as_json(obj):
+    """An object as pupa would write it out and read it back for import."""
+    return json.loads(json.dumps(obj.as_dict(), cls=JSONEncoderPlus))
+
+
+def division_row(division_id):
+    row = {"id": division_id, "name": DIVISION_NAMES.get(division_id, "")}
+    parts = [part.split(":", 1) for part in division_id.split("/")[1:]]
+    row["country"] = parts[0][1]
+    for i, (subtype, subid) in enumerate(parts[1:], 1):
+        row["subtype{0}".format(i)] = subtype
+        row["subid{0}".format(i)] = subid
+    return row
+
+
+def now():
+    # how Django stores a timezone aware datetime in SQLite
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+class Loader(object):
+    """
+    Writes scraped objects to a new database or, with `update`, upserts
+    them into one an earlier run built.
+    """
+
+    def __init__(self, con, jurisdiction, update=False):
+        self.con = con
+        self.update = update
+        self.jurisdiction = jurisdiction
+        self.jurisdiction_id = jurisdiction.jurisdiction_id
+        self.namespace = uuid.uuid5(uuid.NAMESPACE_URL, self.jurisdiction_id)
+        self.timestamp = now()
+
+        self.columns = {}
+        self._rows = collections.defaultdict(list)
+
+        # scraped _id: database id
+        self.json_ids = {}
+        # what pseudo ids are resolved against
+        self.organizations = {}
+        self.people = {}
+        self.posts = {}
+        self.sessions = {}
+        self.bills = {}
+
+        self._resolved = {}
+        self._memberships = set()
+        # the bill actions vote events have been matched to, and the ids
+        # given to vote events
+        self._matched_actions = set()
+        self._vote_events = set()
+        self._actions = {}
+        self._pending_votes = collections.defaultdict(list)
+
+        self.index = ChangeIndex()
+
+    def create_tables(self):
+        # executescript would commit, and the tables belong in the same
+        # transaction as their rows
+        with open(SCHEMA) as f:
+            schema = f.read()
+        if self.update:
+            # empty tables were dropped at the end of the last run
+            schema = schema.replace(
+                "CREATE TABLE ", "CREATE TABLE IF NOT EXISTS "
+            ).replace("CREATE INDEX ", "CREATE INDEX IF NOT EXISTS ")
+        for statement in schema.split(";\n"):
+            if statement.strip():
+                self.con.execute(statement)
+        # only pupa's tables: cmap.search keeps its own in the database
+        for table in SCHEMA_TABLE.findall(schema):
+            self.columns[table] = [
+                (name, declared_type, notnull)
+                for _, name, declared_type, notnull, _, _ in self.con.execute(
+                    'PRAGMA table_info("{0}")'.format(table)
+                )
+            ]
+
+    def read_existing(self):
+        """
+        Pick up what an earlier run loaded, so pseudo ids can be resolved
+        against objects that aren't scraped again.
+        """
+        other_names = collections.defaultdict(list)
+        for table, foreign_key in (
+            ("organizationname", "organization_id"),
+            ("personname", "person_id"),
+        ):
+            for name, owner in self.con.execute(
+                'SELECT name, "{0}" FROM "{1}"'.format(foreign_key, table)
+            ):
+                other_names[owner].append({"name": name})
+
+        for organization_id, name, classification, parent_id in self.con.execute(
+            "SELECT id, name, classification, parent_id FROM organization"
+        ):
+            self.organizations[organization_id] = {
+                "name": name,
+                "classification": classification,
+                "parent_id": parent_id,
+                "other_names": other_names[organization_id],
+            }
+        for person_id, name, family_name in self.con.execute(
+            "SELECT id, name, family_name FROM person"
+        ):
+            self.people[person_id] = {
+                "name": name,
+                "family_name": family_name,
+                "other_names": other_names[person_id],
+            }
+        for post_id, label, role, organization_id, division_id in self.con.execute(
+            "SELECT id, label, role, organization_id, division_id FROM post"
+        ):
+            self.posts[post_id] = {
+                "label": label,
+                "role": role,
+                "organization_id": organization_id,
+                "division_id": division_id,
+            }
+        for bill_id, identifier, session in self.con.execute("""
+            SELECT bill.id, bill.identifier, legislativesession.identifier
+            FROM bill JOIN legislativesession
+            ON bill.legislative_session_id = legislativesession.id
+            """):
+            self.bills[bill_id] = {
+                "identifier": identifier,
+                "legislative_session": session,
+            }
+
+    # ids
+
+    def ocd_id(self, kind, *key):
+        return "ocd-{0}/{1}".format(kind, self.uuid(kind, *key))
+
+    def uuid(self, *key):
+        return uuid.uuid5(self.namespace, json.dumps(key))
+
+    # writing rows
+
+    def default(self, column, declared_type):
+        if column in {"created_at", "updated_at", "last_seen"}:
+            return self.timestamp
+        if column == "extras":
+            return "{}"
+        if declared_type.endswith("[]"):
+            return "[]"
+        return ""
+
+    def insert(self, table, row):
+        values = []
+        for column, declared_type, notnull in self.columns[table]:
+            value = row.pop(column, None)
+            if value is None and notnull:
+                value = self.default(column, declared_type)
+            elif isinstance(value, (list, dict)):
+                value = json.dumps(value)
+            values.append(value)
+        if row:
+            raise ValueError(
+                "{0} has no columns for {1}".format(table, ", ".join(sorted(row)))
+            )
+
+        self._rows[table].append(values)
+        if len(self._rows[table]) >= BATCH_SIZE:
+            self.flush(table)
+
+    def flush(self, table=None):
+        tables = [table] if table else list(self._rows)
+        for table in tables:
+            rows = self._rows.pop(table, None)
+            if not rows:
+                continue
+            columns = [column for column, _, _ in self.columns[table]]
+            sql = 'INSERT INTO "{0}" ({1}) VALUES ({2})'.format(
+                table,
+                ", ".join('"{0}"'.format(column) for column in columns),
+                ", ".join("?" for _ in columns),
+            )
+            if self.update:
+                sql += " ON CONFLICT (id) DO UPDATE SET {0}".format(
+                    ", ".join(
+                        '"{0}" = excluded."{0}"'.format(column)
+                        for column in columns
+                        if column not in {"id", "created_at"}
+                    )
+                )
+            self.con.executemany(sql, rows)
+
+    def insert_related(self, parent_id, related, fields):
+        for field, items in related.items():
+            table, foreign_key, subfields = fields[field]
+            for order, item in enumerate(items):
+                subrelated = {subfield: item.pop(subfield) for subfield in subfields}
+                item_id = self.uuid(parent_id, table, order).hex
+                if table in PRESERVE_ORDER:
+                    item["order"] = order
+                item["id"] = item_id
+                item[foreign_key] = parent_id
+                self.insert(table, item)
+                self.insert_related(item_id, subrelated, subfields)
+
+    def write(self, kind, data):
+        object_id = data["id"]
+        self.index.add(kind, data)
+        related = {field: data.pop(field, []) for field in RELATED[kind]}
+        if self.update:
+            if kind == "bill":
+                # the vote events the bill no longer has go with it
+                self.index.replace(
+                    vote_event_id
+                    for (vote_event_id,) in self.con.execute(
+                        "SELECT id FROM voteevent WHERE bill_id = ?", (object_id,)
+                    )
+                )
+            self.delete_related([object_id], REPLACED.get(kind, RELATED[kind]))
+        self.insert(kind.replace("_", ""), data)
+        self.insert_related(object_id, related, RELATED[kind])
+
+    def delete_related(self, parent_ids, fields):
+        """Delete what a previous run stored under `parent_ids`, all the way down."""
+        parent_ids = json.dumps(parent_ids)
+        for table, foreign_key, subfields in fields.values():
+            condition = '"{0}" IN (SELECT value FROM json_each(?))'.format(foreign_key)
+            if subfields:
+                ids = [
+                    row_id
+                    for (row_id,) in self.con.execute(
+                        'SELECT id FROM "{0}" WHERE {1}'.format(table, condition),
+                        (parent_ids,),
+                    )
+                ]
+                if ids:
+                    self.delete_related(ids, subfields)
+            self.con.execute(
+                'DELETE FROM "{0}" WHERE {1}'.format(table, condition), (parent_ids,)
+            )
+
+    # resolving ids
+
+    def resolve(self, kind, json_id):
+        """
+        Resolve an id found in scraped data to a database id, or None if it
+        can't be.
+        """
+        if not json_id:
+            return None
+        if not json_id.startswith("~"):
+            return self.json_ids.get(json_id)
+
+        key = (kind, json_id)
+        if key not in self._resolved:
+            spec = get_pseudo_id(json_id)
+            candidates = getattr(self, kind)
+            ids = {
+                db_id
+                for db_id, record in candidates.items()
+                if self.matches(kind, record, spec)
+            }
+            if len(ids) == 1:
+                self._resolved[key] = ids.pop()
+            else:
+                logger.warning(
+                    "%s pseudo id %s for %s",
+                    "ambiguous" if ids else "cannot resolve",
+                    json_id,
+                    kind,
+                )
+                self._resolved[key] = None
+        return self._resolved[key]
+
+    def matches(self, kind, record, spec):
+        for field, value in spec.items():
+            if "__" in field:
+                relation, field = field.split("__", 1)
+                related = self.organizations.get(record.get(relation + "_id"))
+                if related is None or related.get(field) != value:
+                    return False
+            elif field == "name":
+                names = {record["name"]} | {
+                    other["name"] for other in record.get("other_names", [])
+                }
+                if kind == "people" and record.get("family_name"):
+                    names.add(record["family_name"])
+                if value not in names:
+                    return False
+            elif record.get(field) != value:
+                return False
+        return True
+
+    # loading
+
+    def load_jurisdiction(self):
+        data = as_json(self.jurisdiction)
+        data.pop("_id")
+        sessions = data.pop("legislative_sessions")
+        self.insert("jurisdiction", data)
+
+        for session in sessions:
+            session.pop("_scraped_name", None)
+            session_id = self.uuid("legislativesession", session["identifier"]).hex
+            session["id"] = session_id
+            session["jurisdiction_id"] = self.jurisdiction_id
+            self.sessions[session["identifier"]] = session_id
+            self.insert("legislativesession", session)
+
+    def load_people_and_organizations(self, objects):
+        """
+        Load organizations, then people, then posts, then memberships, so
+        each can be resolved against the ones before it.
+        """
+        by_type = collections.defaultdict(list)
+        for obj in objects:
+            by_type[obj._type].append(obj)
+
+        self.load_organizations(by_type["organization"])
+        names = collections.Counter(person.name for person in by_type["person"])
+        for person in by_type["person"]:
+            self.load_person(person, shared_name=names[person.name] > 1)
+        for post in by_type["post"]:
+            self.load_post(post)
+        for membership in by_type["membership"]:
+            self.load_membership(membership)
+
+    def load_organizations(self, organizations):
+        pending = [as_json(organization) for organization in organizations]
+        while pending:
+            deferred = []
+            for data in pending:
+                parent_id = data["parent_id"]
+                if parent_id and self.resolve("organizations", parent_id) is None:
+                    deferred.append(data)
+                else:
+                    self.load_organization(data)
+            if len(deferred) == len(pending):
+                # the rest have parents we'll never see
+                for data in deferred:
+                    self.load_organization(data)
+                break
+            pending = deferred
+            self._resolved.clear()
+
+    def load_organization(self, data):
+        json_id = data.pop("_id")
+        data["parent_id"] = self.resolve("organizations", data["parent_id"])
+        if data["classification"] != "party":
+            data["jurisdiction_id"] = self.jurisdiction_id
+
+        organization_id = self.ocd_id(
+            "organization", data["name"], data["classification"], data["parent_id"]
+        )
+        data["id"] = organization_id
+        self.json_ids[json_id] = organization_id
+        self.organizations[organization_id] = {
+            "name": data["name"],
+            "classification": data["classification"],
+            "parent_id": data["parent_id"],
+            "other_names": list(data["other_names"]),
+        }
+
+        self.write("organization", data)
+
+    def load_person(self, person, shared_name=False):
+        data = as_json(person)
+        json_id = data.pop("_id")
+
+        if shared_name:
+            # people who share a name are told apart by their Legistar
+            # records, which don't change the way their memberships do
+            sources = sorted(source["url"] for source in data["sources"])
+            person_id = self.ocd_id("person", data["name"], *sources)
+        else:
+            person_id = self.ocd_id("person", data["name"])
+        data["id"] = person_id
+        self.json_ids[json_id] = person_id
+        self.people[person_id] = {
+            "name": data["name"],
+            "family_name": data.get("family_name"),
+            "other_names": list(data["other_names"]),
+        }
+
+        self.write("person", data)
+
+    def load_post(self, post):
+        data = as_json(post)
+        json_id = data.pop("_id")
+        data["organization_id"] = self.resolve("organizations", data["organization_id"])
+
+        post_id = self.ocd_id(
+            "post", data["organization_id"], data["label"], data["role"]
+        )
+        data["id"] = post_id
+        self.json_ids[json_id] = post_id
+        self.posts[post_id] = {
+            "label": data["label"],
+            "role": data["role"],
+            "organization_id": data["organization_id"],
+            "division_id": data["division_id"],
+        }
+
+        self.write("post", data)
+
+    def load_membership(self, membership):
+        data = as_json(membership)
+        data.pop("_id")
+        data["organization_id"] = self.resolve("organizations", data["organization_id"])
+        data["person_id"] = self.resolve("people", data["person_id"])
+        data["post_id"] = self.resolve("posts", data["post_id"])
+        data["on_behalf_of_id"] = self.resolve("organizations", data["on_behalf_of_id"])
+
+        key = (
+            data["organization_id"],
+            data["person_id"],
+            data["post_id"],
+            data["label"],
+            data["role"],
+            data["start_date"],
+            data["end_date"],
+        )
+        if key in self._memberships:
+            return
+        self._memberships.add(key)
+
+        membership_id = self.ocd_id("membership", *key)
+        data["id"] = membership_id
+
+        self.write("membership", data)
+
+    def load_bills_and_vote_events(self, objects):
+        for obj in objects:
+            if obj._type == "bill":
+                self.load_bill(obj)
+            elif obj._type == "vote_event":
+                self.load_vote_event(as_json(obj))
+            else:
+                raise ValueError("unexpected {0} from a bill scraper".format(obj._type))
+
+        for bill, vote_events in self._pending_votes.items():
+            logger.warning(
+                "%d vote events for %s, which was never scraped", len(vote_events), bill
+            )
+
+    def load_bill(self, bill):
+        data = as_json(bill)
+        json_id = data.pop("_id")
+
+        session = data.pop("legislative_session")
+        data["legislative_session_id"] = self.sessions[session]
+        data["from_organization_id"] = self.resolve(
+            "organizations", data.pop("from_organization")
+        )
+
+        for action in data["actions"]:
+            action["organization_id"] = self.resolve(
+                "organizations", action["organization_id"]
+            )
+            for entity in action["related_entities"]:
+                if "organization_id" in entity:
+                    entity["organization_id"] = self.resolve(
+                        "organizations", entity["organization_id"]
+                    )
+                elif "person_id" in entity:
+                    entity["person_id"] = self.resolve("people", entity["person_id"])
+
+        for sponsorship in data["sponsorships"]:
+            sponsorship["person_id"] = self.resolve("people", sponsorship["person_id"])
+            sponsorship["organization_id"] = self.resolve(
+                "organizations", sponsorship["organization_id"]
+            )
+
+        bill_id = self.ocd_id("bill", session, data["identifier"])
+        data["id"] = bill_id
+        self.json_ids[json_id] = bill_id
+        self.bills[bill_id] = {
+            "identifier": data["identifier"],
+            "legislative_session": session,
+        }
+
+        # what vote events are matched to
+        actions = collections.defaultdict(list)
+        for order, action in enumerate(data["actions"]):
+            key = (action["description"], action["date"], action["organization_id"])
+            actions[key].append(self.uuid(bill_id, "billaction", order).hex)
+        self._actions[bill_id] = actions
+
+        self.write("bill", data)
+
+        for vote_event in self._pending_votes.pop(json_id, []):
+            self.load_vote_event(vote_event)
+
+    def load_vote_event(self, data):
+        bill = data["bill"]
+        if bill and not bill.startswith("~") and bill not in self.json_ids:
+            # bill scrapers yield a bill's vote events before the bill
+            self._pending_votes[bill].append(data)
+            return
+
+        data.pop("_id")
+        data.pop("bill")
+        data["bill_id"] = self.resolve_bill(bill)
+        data["legislative_session_id"] = self.sessions[data.pop("legislative_session")]
+        data["organization_id"] = self.resolve(
+            "organizations", data.pop("organization")
+        )
+
+        bill_action = data.pop("bill_action")
+        if bill_action and data["bill_id"]:
+            candidates = self._actions[data["bill_id"]].get(
+                (bill_action, data["start_date"], data["organization_id"]), []
+            )
+            if len(candidates) == 1 and candidates[0] not in self._matched_actions:
+                data["bill_action_id"] = candidates[0]
+                self._matched_actions.add(candidates[0])
+            else:
+                logger.warning(
+                    "could not match vote event to %s %s %s",
+                    bill,
+                    bill_action,
+                    data["start_date"],
+                )
+
+        for vote in data["votes"]:
+            vote["voter_id"] = self.resolve("people", vote["voter_id"])
+
+        # the counts are tallied from the votes, as cmap.postprocess does
+        counts = collections.Counter(vote["option"] for vote in data["votes"])
+        data["counts"] = [
+            {"option": option, "value": value}
+            for option, value in sorted(counts.items())
+        ]
+
+        key = [
+            data["bill_id"],
+            data["identifier"],
+            data["motion_text"],
+            data["start_date"],
+            data["organization_id"],
+        ]
+        vote_event_id = self.ocd_id("vote", *key)
+        while vote_event_id in self._vote_events:
+            key.append(len(key))
+            vote_event_id = self.ocd_id("vote", *key)
+        self._vote_events.add(vote_event_id)
+        data["id"] = vote_event_id
+
+        self.write("vote_event", data)
+
+    def resolve_bill(self, bill):
+        if bill and bill.startswith("~"):
+            spec = get_pseudo_id(bill)
+            for bill_id, record in self.bills.items():
+                if record["identifier"] == spec.get("identifier") and record[
+                    "legislative_session"
+                ] == spec.get("legislative_session__identifier"):
+                    return bill_id
+            return None
+        return self.json_ids.get(bill)
+
+    def finish(self, complete=()):
+        """
+        Fill in what can only be known once everything is loaded, and
+        return what changed since the last run, with deletions among the
+        `complete` kinds.
+        """
+        divisions = {post["division_id"] for post in self.posts.values()}
+        for division_id in sorted(division for division in divisions if division):
+            self.insert("division", division_row(division_id))
+        self.flush()
+
+        self.con.execute("""
+            UPDATE relatedbill SET related_bill_id = (
+                SELECT bill.id FROM bill
+                JOIN legislativesession
+                ON bill.legislative_session_id = legislativesession.id
+                WHERE bill.identifier = relatedbill.identifier
+                AND legislativesession.identifier = relatedbill.legislative_session
+            )
+            WHERE related_bill_id IS NULL
+            """)
+
+        changes = list(self.index.changes(complete))
+        self.index.save(self.con, changes)
+
+        # pupa's tables that are empty are dropped by cmap.postprocess
+        for table in self.columns:
+            if self.con.execute('SELECT 1 FROM "{0}" LIMIT 1'.format(table)).fetchone():
+                continue
+            self.con.execute('DROP TABLE "{0}"'.format(table))
+
+        return changes
+
+
+def scrape(scraper_class, jurisdiction, datadir, fastmode, kwargs):
+    scraper = scraper_class(jurisdiction, datadir, fastmode=fastmode)
+    logger.info("scraping %s %s", scraper_class.__name__, kwargs or "")
+    for obj in scraper.scrape(**kwargs):
+        for each in obj if hasattr(obj, "__iter__") else [obj]:
+            each.pre_save(jurisdiction.jurisdiction_id)
+            each.validate()
+            yield each
+            yield from related(each)
+
+
+def related(obj):
+    for each in obj._related:
+        yield each
+        yield from related(each)
+
+
+def restore_watermark(con, scraper, path):
+    """Start a scraper's watermark file from the one in the database."""
+    con.execute(WATERMARK_TABLE)
+    row = con.execute(
+        "SELECT last_modified FROM watermark WHERE scraper = ?", (scraper,)
+    ).fetchone()
+    if row is not None:
+        write_watermark(path, row[0])
+
+
+def save_watermark(con, scraper, path):
+    """Keep where a scraper's watermark file got to in the database."""
+    last_modified = read_watermark(path)
+    if last_modified is None:
+        return
+    con.execute(
+        "INSERT INTO watermark (scraper, last_modified) VALUES (?, ?) "
+        "ON CONFLICT (scraper) DO UPDATE SET "
+        "last_modified = max(last_modified, excluded.last_modified)",
+        (scraper, last_modified),
+    )
+
+
+def load(
+    path,
+    scrapers,
+    fastmode=False,
+    update=False,
+    processes=1,
+    feed=None,
+    segments=None,
+):
+    jurisdiction = CMAP()
+
+    con = sqlite3.connect(path, isolation_level=None)
+    for pragma in UPDATE_PRAGMAS if update else PRAGMAS:
+        con.execute(pragma)
+
+    loader = Loader(con, jurisdiction, update)
+    try:
+        con.execute("BEGIN")
+        loader.create_tables()
+        loader.index.read(con)
+        if update:
+            loader.read_existing()
+        loader.load_jurisdiction()
+
+        with tempfile.TemporaryDirectory() as datadir:
+            loader.load_people_and_organizations(
+                scrape(JurisdictionScraper, jurisdiction, datadir, fastmode, {})
+            )
+            for name, kwargs in scrapers:
+                scraper_class = jurisdiction.scrapers[name]
+                watermark = None
+                if name == "bills" and not segments and "watermark" not in kwargs:
+                    watermark = os.path.join(datadir, "bills_watermark.json")
+                    kwargs = dict(kwargs, watermark=watermark)
+                    restore_watermark(con, name, watermark)
+                if segments:
+                    objects = itertools.chain.from_iterable(
+                        read_segments(segments, _type) for _type in SCRAPED_TYPES[name]
+                    )
+                elif name == "bills" and processes > 1:
+                    from .shard import scrape_sharded
+
+                    objects = scrape_sharded(
+                        jurisdiction, kwargs, fastmode, processes, datadir
+                    )
+                else:
+                    objects = scrape(
+                        scraper_class, jurisdiction, datadir, fastmode, kwargs
+                    )
+                if name == "people":
+                    loader.load_people_and_organizations(objects)
+                else:
+                    loader.load_bills_and_vote_events(objects)
+                # a scrape of some of the matters doesn't bring the rest
+                # up to date
+                if watermark and not any(
+                    kwargs.get(bound)
+                    for bound in ("introduced_from", "introduced_before")
+                ):
+                    save_watermark(con, name, watermark)
+
+        changes = loader.finish(complete_kinds(scrapers))
+        con.execute("COMMIT")
+        if update:
+            # checkpoint the log, so the database is one file again
+            con.execute("PRAGMA journal_mode = DELETE")
+    except BaseException:
+        if con.in_transaction:
+            con.execute("ROLLBACK")
+        raise
+    finally:
+        con.close()
+
+    logger.info("%d objects changed", len(changes))
+    if feed:
+        write_feed(feed, changes)
+
+
+def parse_scrapers(args, available):
+    """Parse pupa-style `scraper key=value ...` arguments."""
+    scrapers = []
+    for arg in args:
+        if "=" in arg:
+            if not scrapers:
+                raise ValueError("{0} given before any scraper".format(arg))
+            key, value = arg.split("=", 1)
+            scrapers[-1][1][key] = value
+        elif arg in available:
+            scrapers.append((arg, {}))
+        else:
+            raise ValueError("no scraper named {0}".format(arg))
+    return scrapers or [(name, {}) for name in available]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("database")
+    parser.add_argument("scrapers", nargs="*", metavar="scraper [key=value ...]")
+    parser.add_argument(
+        "--fastmode", action="store_true", help="use the cache and skip throttling"
+    )
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="upsert into an existing database instead of creating one",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="scrape bills in this many processes, sharded by date (see cmap/shard.py)",
+    )
+    parser.add_argument(
+        "--changes",
+        metavar="FILE",
+        help="write what changed since the last run to FILE (see cmap/changes.py)",
+    )
+    parser.add_argument(
+        "--from",
+        dest="segments",
+        metavar="DIR",
+        help="read what was scraped from NDJSON segments in DIR (see cmap/segments.py)",
+    )
+    args = parser.parse_args()
+
+    logging.config.dictConfig(settings.LOGGING)
+
+    try:
+        scrapers = parse_scrapers(args.scrapers, CMAP.scrapers)
+    except ValueError as e:
+        parser.error(str(e))
+    load(
+        args.database,
+        scrapers,
+        args.fastmode,
+        args.update,
+        args.processes,
+        args.changes,
+        args.segments,
+    )
+
+
+if __name__ == "__main__":
+    main()
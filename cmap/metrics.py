@@ -0,0 +1,286 @@
+"""
+Per-route request metrics and stage timings for the scrapers.
+
+`MetricsMixin` records every request a scraper makes against its route
+template, e.g. `/matters/{id}/histories`: how many there were, the bytes
+they brought back, a histogram of their latency, how many the response
+cache answered, how many were retried and how many failed. Scrapers can
+also time the stages of their work with `metrics.stage()` and
+`metrics.timed()`.
+
+When a `metered` scrape finishes, a JSON report of all of it is appended,
+one line per run, to `CMAP_METRICS_REPORT` in pupa_settings.py; set it to
+None to turn that off.
+"""
+
+import collections
+import contextlib
+import datetime
+import functools
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+
+from pupa import settings
+
+from .cache import CHUNK_SIZE
+
+# upper bounds of the latency histogram's buckets, in milliseconds
+LATENCY_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+_attempts = threading.local()
+
+
+def count_attempt():
+    """Note that a request is going out on the wire, retries included."""
+    _attempts.count = getattr(_attempts, "count", 0) + 1
+
+
+def route_template(url, base_url=""):
+    if base_url and url.startswith(base_url):
+        path = url[len(base_url) :]
+    else:
+        path = urllib.parse.urlsplit(url).path
+    path = urllib.parse.urlsplit(path).path.rstrip("/") or "/"
+    return ID_SEGMENT.sub("/{id}", path)
+
+
+class RouteStats(object):
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def as_dict(self):
+        histogram = {
+            str(bound): count for bound, count in zip(LATENCY_BUCKETS, self.latency)
+        }
+        histogram["+Inf"] = self.latency[-1]
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "cache_hits": self.cache_hits,
+            "cache_hit_rate": self.cache_hits / self.requests if self.requests else 0,
+            "bytes": self.bytes,
+            "seconds": self.seconds,
+            "latency_ms": histogram,
+        }
+
+
+class Metrics(object):
+    """What one scrape has done, safe to update from many threads."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.routes = collections.defaultdict(RouteStats)
+        self.stages = collections.defaultdict(lambda: [0.0, 0])
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def record(self, route, seconds, ok=True, cached=False, retries=0, nbytes=0):
+        bucket = 0
+        while (
+            bucket < len(LATENCY_BUCKETS) and seconds * 1000 > LATENCY_BUCKETS[bucket]
+        ):
+            bucket += 1
+        with self._lock:
+            stats = self.routes[route]
+            stats.requests += 1
+            stats.errors += not ok
+            stats.retries += retries
+            stats.cache_hits += cached
+            stats.bytes += nbytes
+            stats.seconds += seconds
+            stats.latency[bucket] += 1
+
+    def add_bytes(self, route, nbytes):
+        with self._lock:
+            self.routes[route].bytes += nbytes
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Time a stage of the work. Stages on the same thread nest, and a
+        stage's time doesn't include that of the stages inside it.
+        """
+        stack = self._local.__dict__.setdefault("stack", [])
+        now = time.perf_counter()
+        if stack:
+            self._add_stage(stack[-1][0], now - stack[-1][1], 0)
+        stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            name, started = stack.pop()
+            self._add_stage(name, now - started, 1)
+            if stack:
+                stack[-1][1] = now
+
+    def timed(self, name, iterable):
+        """Pass through an iterable, timing each step as the stage `name`."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def call(self, name, function, *args):
+        """Call a function, timing it as the stage `name`."""
+        with self.stage(name):
+            return function(*args)
+
+    def _add_stage(self, name, seconds, count):
+        with self._lock:
+            stage = self.stages[name]
+            stage[0] += seconds
+            stage[1] += count
+
+    def report(self, **extra):
+        with self._lock:
+            report = {
+                "started": datetime.datetime.fromtimestamp(
+                    self.started, datetime.timezone.utc
+                ).isoformat(),
+                "seconds": time.time() - self.started,
+                "requests": sum(stats.requests for stats in self.routes.values()),
+                "bytes": sum(stats.bytes for stats in self.routes.values()),
+                "routes": {
+                    route: stats.as_dict()
+                    for route, stats in sorted(self.routes.items())
+                },
+                "stages": {
+                    name: {"seconds": seconds, "count": count}
+                    for name, (seconds, count) in self.stages.items()
+                },
+            }
+        report.update(extra)
+        return report
+
+    def write(self, path, **extra):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as f:
+            f.write(json.dumps(self.report(**extra)) + "\n")
+
+
+class CountingBody(object):
+    """Wraps a streamed response body, counting the bytes read from it."""
+
+    def __init__(self, raw, count):
+        self._count = count
+        if hasattr(raw, "stream"):
+            # a urllib3 response, which we want decoded
+            self._chunks = raw.stream(CHUNK_SIZE, decode_content=True)
+        else:
+            self._chunks = iter(lambda: raw.read(CHUNK_SIZE), b"")
+        self._raw = raw
+
+    def read(self, size=-1):
+        data = next(self._chunks, b"")
+        self._count(len(data))
+        return data
+
+    def close(self):
+        self._raw.close()
+
+    def release_conn(self):
+        release_conn = getattr(self._raw, "release_conn", None)
+        if release_conn is not None:
+            release_conn()
+
+
+def metered(scrape):
+    """
+    Give each run of a scraper's `scrape()` fresh metrics, and report them
+    when it is done. The time spent producing objects is the stage
+    "scrape", and the time the caller spends with them, "consumer".
+    """
+
+    @functools.wraps(scrape)
+    def wrapper(self, **kwargs):
+        self.metrics = Metrics()
+        objects = 0
+        status = "error"
+        try:
+            for obj in self.metrics.timed("scrape", scrape(self, **kwargs)):
+                objects += 1
+                with self.metrics.stage("consumer"):
+                    yield obj
+            status = "ok"
+        finally:
+            if settings.CMAP_METRICS_REPORT:
+                self.metrics.write(
+                    settings.CMAP_METRICS_REPORT,
+                    scraper=type(self).__name__,
+                    arguments=kwargs,
+                    objects=objects,
+                    status=status,
+                )
+
+    return wrapper
+
+
+class MetricsMixin(object):
+    """Record the metrics of every request the scraper makes."""
+
+    metrics = None
+
+    def send(self, request, **kwargs):
+        count_attempt()
+        return super().send(request, **kwargs)
+
+    def request(self, method, url, params=None, headers=None, **kwargs):
+        if self.metrics is None:
+            return super().request(
+                method, url, params=params, headers=headers, **kwargs
+            )
+
+        route = route_template(url, self.BASE_URL)
+        _attempts.count = 0
+        start = time.perf_counter()
+        try:
+            response = super().request(
+                method, url, params=params, headers=headers, **kwargs
+            )
+        except Exception:
+            self.metrics.record(
+                route,
+                time.perf_counter() - start,
+                ok=False,
+                retries=max(_attempts.count - 1, 0),
+            )
+            raise
+        seconds = time.perf_counter() - start
+
+        nbytes = 0
+        if kwargs.get("stream"):
+            response.raw = CountingBody(
+                response.raw, lambda n: self.metrics.add_bytes(route, n)
+            )
+        else:
+            nbytes = len(response.content or b"")
+
+        # requests follows redirects with a send apiece
+        retries = _attempts.count - 1 - len(response.history)
+        self.metrics.record(
+            route,
+            seconds,
+            ok=response.status_code < 400,
+            cached=getattr(response, "fromcache", False),
+            retries=max(retries, 0),
+            nbytes=nbytes,
+        )
+        return response
@@ -0,0 +1,72 @@
+"""
+People and organizations by name, for the bill scraper to refer to them
+by id.
+
+Legistar names sponsors and voters, and pupa's importers -- and
+cmap.load -- find who each name belongs to by looking through everyone
+they know, once for every name they're given. The person scraper adds
+the people and organizations it yields to the `NameIndex` of the
+jurisdiction it scrapes, and the bill scraper, when it runs after it,
+gives votes, sponsorships and related entities the `_id` of the one
+person or organization whose name matches instead, which the importer
+only has to look up. Names the index doesn't know, or that belong to
+more than one of them, get pseudo ids, as before.
+
+A name matches the way it does in pupa's importers and in
+`cmap.load`: exactly, against a person's or organization's name, other
+names and, for people, family name, with no folding of case or
+spacing.
+
+The index also interns names, so the many votes cast by each member
+share one copy of their name.
+"""
+
+import threading
+import weakref
+
+from pupa.utils import _make_pseudo_id
+
+# jurisdiction: its index, for as long as the jurisdiction is in use
+_indexes = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+class NameIndex(object):
+    def __init__(self):
+        # (type, name): _id, or None if more than one has it
+        self._ids = {}
+        self._names = {}
+        self._pseudo_ids = {}
+
+    def intern(self, name):
+        return self._names.setdefault(name, name)
+
+    def add(self, obj):
+        """Index a scraped person or organization by all its names."""
+        names = {obj.name} | {other["name"] for other in obj.other_names}
+        # pupa matches people by their family names too
+        if getattr(obj, "family_name", None):
+            names.add(obj.family_name)
+        for name in names:
+            key = (obj._type, name)
+            self._ids[key] = obj._id if self._ids.get(key, obj._id) == obj._id else None
+
+    def resolve(self, _type, name):
+        """
+        The `_id` of the one person or organization with this name, or
+        else a pseudo id for the importer to resolve.
+        """
+        _id = self._ids.get((_type, name))
+        if _id is not None:
+            return _id
+        if name not in self._pseudo_ids:
+            self._pseudo_ids[name] = _make_pseudo_id(name=name)
+        return self._pseudo_ids[name]
+
+
+def name_index(jurisdiction):
+    """The index of what has been scraped for a jurisdiction so far."""
+    with _lock:
+        if jurisdiction not in _indexes:
+            _indexes[jurisdiction] = NameIndex()
+        return _indexes[jurisdiction]
@@ -0,0 +1,231 @@
+"""
+Make the published cmap.db quick to read.
+
+    python -m cmap.optimize cmap.db
+
+Adds covering indexes for the lookups people run most, rebuilds summary
+tables that save them the joins, and runs ANALYZE so SQLite's planner
+knows how big everything is. The summary tables are keyed the way they
+are read, so each lookup is a range of one table:
+
+`personvoterecord`: how each person voted, by person and date, with the
+vote event's motion, body, result and bill. A person listed twice on a
+vote, under two names that resolve to them, gets one row, with the
+first of their options in alphabetical order.
+
+    SELECT * FROM personvoterecord WHERE person_id = ? ORDER BY date
+
+`billtimeline`: each bill's actions in order, with the body that took
+them and the tally of the vote on each, if there was one. If there were
+several, the last of them, by date and then id, is the one shown.
+
+    SELECT * FROM billtimeline WHERE bill_id = ? ORDER BY "order"
+
+`meeting`: for each body and each day it voted, how many votes it took
+on how many bills, and how many passed and failed.
+
+    SELECT * FROM meeting WHERE organization_id = ? ORDER BY date DESC
+
+Run it after each build; the summary tables are rebuilt every time.
+"""
+
+import argparse
+import logging
+import sqlite3
+
+from .postprocess import PRAGMAS, tables
+
+logger = logging.getLogger("cmap.optimize")
+
+# name: (table, columns); the leading columns are what's looked up, the
+# rest what's read
+INDEXES = {
+    "personvote_voter_covering": (
+        "personvote",
+        ("voter_id", "vote_event_id", "option"),
+    ),
+    "votecount_vote_event_covering": (
+        "votecount",
+        ("vote_event_id", "option", "value"),
+    ),
+    "voteevent_organization_date": (
+        "voteevent",
+        ("organization_id", "start_date", "result", "bill_id"),
+    ),
+    "voteevent_bill_date": ("voteevent", ("bill_id", "start_date", "result")),
+    "billaction_bill_order": (
+        "billaction",
+        ("bill_id", "order", "date", "organization_id"),
+    ),
+    "membership_person_dates": (
+        "membership",
+        ("person_id", "start_date", "end_date", "organization_id", "role"),
+    ),
+}
+
+# name: (the tables it's built from, definition, query)
+SUMMARIES = {
+    "personvoterecord": (
+        ("personvote", "voteevent", "organization", "bill"),
+        """
+        CREATE TABLE personvoterecord (
+            person_id varchar(47) NOT NULL,
+            date varchar(25) NOT NULL,
+            vote_event_id varchar(45) NOT NULL,
+            option varchar(50) NOT NULL,
+            motion_text text NOT NULL,
+            result varchar(50) NOT NULL,
+            organization_id varchar(53) NOT NULL,
+            organization_name text,
+            bill_id varchar(45),
+            bill_identifier varchar(100),
+            PRIMARY KEY (person_id, date, vote_event_id)
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT INTO personvoterecord
+        SELECT personvote.voter_id, voteevent.start_date, voteevent.id,
+               min(personvote.option), voteevent.motion_text, voteevent.result,
+               voteevent.organization_id, organization.name,
+               voteevent.bill_id, bill.identifier
+        FROM personvote
+        JOIN voteevent ON voteevent.id = personvote.vote_event_id
+        LEFT JOIN organization ON organization.id = voteevent.organization_id
+        LEFT JOIN bill ON bill.id = voteevent.bill_id
+        WHERE personvote.voter_id IS NOT NULL
+        GROUP BY personvote.voter_id, voteevent.id
+        """,
+    ),
+    "billtimeline": (
+        ("billaction", "organization", "voteevent", "votecount"),
+        """
+        CREATE TABLE billtimeline (
+            bill_id varchar(45) NOT NULL,
+            "order" integer NOT NULL,
+            date varchar(25) NOT NULL,
+            description text NOT NULL,
+            classification text[] NOT NULL,
+            organization_id varchar(53) NOT NULL,
+            organization_name text,
+            vote_event_id varchar(45),
+            result varchar(50),
+            yes_count integer,
+            no_count integer,
+            other_count integer,
+            PRIMARY KEY (bill_id, "order")
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT INTO billtimeline
+        SELECT billaction.bill_id, billaction."order", billaction.date,
+               billaction.description, billaction.classification,
+               billaction.organization_id, organization.name,
+               voteevent.id, voteevent.result,
+               tally.yes_count, tally.no_count, tally.other_count
+        FROM billaction
+        LEFT JOIN organization ON organization.id = billaction.organization_id
+        LEFT JOIN (
+            SELECT id, bill_action_id, result,
+                   row_number() OVER (
+                       PARTITION BY bill_action_id ORDER BY start_date DESC, id DESC
+                   ) AS latest
+            FROM voteevent
+            WHERE bill_action_id IS NOT NULL
+        ) AS voteevent
+            ON voteevent.bill_action_id = billaction.id AND voteevent.latest = 1
+        LEFT JOIN (
+            SELECT vote_event_id,
+                   sum(CASE WHEN option = 'yes' THEN value ELSE 0 END) AS yes_count,
+                   sum(CASE WHEN option = 'no' THEN value ELSE 0 END) AS no_count,
+                   sum(CASE WHEN option NOT IN ('yes', 'no') THEN value ELSE 0 END)
+                       AS other_count
+            FROM votecount
+            GROUP BY vote_event_id
+        ) AS tally ON tally.vote_event_id = voteevent.id
+        """,
+    ),
+    "meeting": (
+        ("voteevent", "organization"),
+        """
+        CREATE TABLE meeting (
+            organization_id varchar(53) NOT NULL,
+            date varchar(10) NOT NULL,
+            organization_name text,
+            vote_events integer NOT NULL,
+            bills integer NOT NULL,
+            passed integer NOT NULL,
+            failed integer NOT NULL,
+            PRIMARY KEY (organization_id, date)
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT INTO meeting
+        SELECT voteevent.organization_id, substr(voteevent.start_date, 1, 10),
+               organization.name, count(*), count(DISTINCT voteevent.bill_id),
+               sum(voteevent.result = 'pass'), sum(voteevent.result = 'fail')
+        FROM voteevent
+        LEFT JOIN organization ON organization.id = voteevent.organization_id
+        GROUP BY voteevent.organization_id, substr(voteevent.start_date, 1, 10)
+        """,
+    ),
+}
+
+
+def create_indexes(con, existing):
+    for name, (table, columns) in INDEXES.items():
+        if table not in existing:
+            continue
+        con.execute(
+            'CREATE INDEX IF NOT EXISTS "{0}" ON "{1}" ({2})'.format(
+                name, table, ", ".join('"{0}"'.format(column) for column in columns)
+            )
+        )
+
+
+def build_summaries(con, existing):
+    for name, (sources, definition, query) in SUMMARIES.items():
+        con.execute('DROP TABLE IF EXISTS "{0}"'.format(name))
+        missing = set(sources) - existing
+        if missing:
+            # cmap.load and cmap.postprocess drop empty tables
+            logger.info(
+                "skipping %s, as %s aren't there", name, ", ".join(sorted(missing))
+            )
+            continue
+        con.execute(definition)
+        con.execute(query)
+        (rows,) = con.execute('SELECT count(*) FROM "{0}"'.format(name)).fetchone()
+        logger.info("built %s, %d rows", name, rows)
+
+
+def optimize(path):
+    con = sqlite3.connect(path, isolation_level=None)
+    for pragma in PRAGMAS:
+        con.execute(pragma)
+
+    try:
+        con.execute("BEGIN")
+        existing = set(tables(con, "%"))
+        create_indexes(con, existing)
+        build_summaries(con, existing)
+        con.execute("ANALYZE")
+        con.execute("COMMIT")
+    except BaseException:
+        if con.in_transaction:
+            con.execute("ROLLBACK")
+        raise
+    finally:
+        con.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("database")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    optimize(args.database)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,45 @@
+import asyncio
 import collections
+import concurrent.futures
+import itertools
+import json
+import os
+import time
 
+import requests.adapters
 from legistar.people import LegistarAPIPersonScraper, LegistarPersonScraper
+from pupa import settings
 from pupa.scrape import Organization, Person, Scraper
 
+from .aio import AsyncLegistarClient
+from .cache import HTTPCacheMixin
+from .metrics import MetricsMixin, metered
+from .names import name_index
+from .ratelimit import RateLimitMixin, ThrottleLockMixin
+from .segments import SegmentOutputMixin
+from .utils import flag
 
-class CMAPPersonScraper(LegistarAPIPersonScraper, Scraper):
+# number of threads fetching office records and people
+DEFAULT_WORKERS = 4
+
+# the member list scraped from the web site, and how long to trust it
+WEB_INFO_FILE = os.path.join(settings.CMAP_STATE_DIR, "people_web_info.json")
+WEB_INFO_MAX_AGE = 24 * 60 * 60
+
+
+class CMAPWebPersonScraper(RateLimitMixin, LegistarPersonScraper):
+    """Scrapes the member list from the web site, within the shared rate limit."""
+
+
+class CMAPPersonScraper(
+    SegmentOutputMixin,
+    MetricsMixin,
+    HTTPCacheMixin,
+    RateLimitMixin,
+    ThrottleLockMixin,
+    LegistarAPIPersonScraper,
+    Scraper,
+):
     BASE_URL = "http://webapi.legistar.com/v1/cmap"
     WEB_URL = "https://cmap.legistar.com"
     TIMEZONE = "America/Chicago"
@@ -23,36 +58,49 @@ class CMAPPersonScraper(LegistarAPIPersonScraper, Scraper):
         "representing City of Chicago": "Appointee of City of Chicago",
     }
 
-    def scrape(self):
-        body_types = self.body_types()
+    COMMITTEE_TYPES = ("Committees", "Public Bodies", "Policy", "Advisory")
 
-        (city_council,) = [
-            body for body in self.bodies() if body["BodyName"] == "CMAP Board"
-        ]
+    # the AsyncLegistarClient of a scrape, if it uses one
+    aio = None
 
-        terms = collections.defaultdict(list)
-        for office in self.body_offices(city_council):
-            if "vacan" not in office["OfficeRecordFullName"].lower():
-                terms[office["OfficeRecordFullName"].strip()].append(office)
+    @metered
+    def scrape(self, web_info=False, workers=DEFAULT_WORKERS):
+        """
+        The bodies are listed once, and the office records of the board and
+        every committee, then the people holding them, are fetched by a
+        pool of `workers` threads, or, with `CMAP_ASYNC_CONCURRENCY` set,
+        gathered on the event loop of an AsyncLegistarClient.
 
-        web_scraper = LegistarPersonScraper(
-            requests_per_minute=self.requests_per_minute
-        )
-        web_scraper.MEMBERLIST = "https://cmap.legistar.com/DepartmentDetail.aspx?ID=45975&GUID=88D24C6E-E96C-47BB-94D4-1179B6C45212&Search="
-        web_scraper.ALL_MEMBERS = "3:3"
+        Nothing here uses the member list on the web site, so it is only
+        scraped with `web_info=true`, and then kept in `WEB_INFO_FILE` for
+        a day.
+        """
+        workers = int(workers)
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=workers)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
 
-        if self.cache_storage:
-            web_scraper.cache_storage = self.cache_storage
+        body_types = self.body_types()
+        committee_types = {body_types[name] for name in self.COMMITTEE_TYPES}
 
-        if self.requests_per_minute == 0:
-            web_scraper.cache_write_only = False
+        bodies = list(self.bodies())
+        (city_council,) = [body for body in bodies if body["BodyName"] == "CMAP Board"]
+        committees = [body for body in bodies if body["BodyTypeId"] in committee_types]
 
-        web_info = {}
-        for member, _ in web_scraper.councilMembers(
-            {"ctl00$ContentPlaceHolder$lstName": "CMAP Board"}
-        ):
-            web_info[member["Person Name"]["label"]] = member
+        if settings.CMAP_ASYNC_CONCURRENCY:
+            self.aio = AsyncLegistarClient(self, settings.CMAP_ASYNC_CONCURRENCY)
+        try:
+            terms, records, sources = self.fetch(workers, city_council, committees)
+        finally:
+            if self.aio is not None:
+                self.aio.close()
+                self.aio = None
 
+        if flag(web_info):
+            self.web_info = self.member_list()
+
+        # so the bill scraper can refer to these people and committees by id
+        names = name_index(self.jurisdiction)
         members = {}
         for member, offices in terms.items():
             p = Person(member)
@@ -71,7 +119,9 @@ class CMAPPersonScraper(LegistarAPIPersonScraper, Scraper):
                     if p.name == "Maurice Cox":
                         post_name = "Appointee of City of Chicago"
                     else:
-                        print(term)
+                        self.warning(
+                            "No post for {0!r}, in {1}".format(post_description, term)
+                        )
                         raise
 
                 p.add_term(
@@ -85,68 +135,162 @@ class CMAPPersonScraper(LegistarAPIPersonScraper, Scraper):
             if not ever_voting_member:
                 continue
 
-            source_urls = self.person_sources_from_office(term)
-            person_api_url, person_web_url = source_urls
+            person_api_url, person_web_url = sources[term["OfficeRecordPersonId"]]
             p.add_source(person_api_url, note="api")
             p.add_source(person_web_url, note="web")
 
             members[member] = p
 
-        for body in self.bodies():
-            if body["BodyTypeId"] in {
-                body_types["Committees"],
-                body_types["Public Bodies"],
-                body_types["Policy"],
-                body_types["Advisory"],
-            }:
-                o = Organization(
+        for body in committees:
+            o = Organization(
+                body["BodyName"],
+                classification="committee",
+                parent_id={"name": "CMAP Board of Directors"},
+            )
+
+            o.add_source(self.BASE_URL + "/bodies/{BodyId}".format(**body), note="api")
+            o.add_source(
+                self.WEB_URL
+                + "/DepartmentDetail.aspx?ID={BodyId}&GUID={BodyGuid}".format(**body),
+                note="web",
+            )
+
+            for office in records[body["BodyId"]]:
+
+                role = office["OfficeRecordTitle"]
+                if role not in ("Vice Chair", "Chairman"):
+                    role = "Member"
+
+                person = office["OfficeRecordFullName"].strip()
+                if person in members:
+                    p = members[person]
+                else:
+                    p = Person(person)
+
+                    source_urls = sources[office["OfficeRecordPersonId"]]
+                    person_api_url, person_web_url = source_urls
+                    p.add_source(person_api_url, note="api")
+                    p.add_source(person_web_url, note="web")
+
+                    members[person] = p
+
+                try:
+                    end_date = self.toDate(office["OfficeRecordEndDate"])
+                except TypeError:
+                    end_date = ""
+                p.add_membership(
                     body["BodyName"],
-                    classification="committee",
-                    parent_id={"name": "CMAP Board of Directors"},
+                    role=role,
+                    start_date=self.toDate(office["OfficeRecordStartDate"]),
+                    end_date=end_date,
                 )
 
-                o.add_source(
-                    self.BASE_URL + "/bodies/{BodyId}".format(**body), note="api"
+            names.add(o)
+            yield o
+
+        for p in members.values():
+            names.add(p)
+            yield p
+
+    def fetch(self, workers, city_council, committees):
+        """
+        The board's terms by member, the office records of each body and
+        the sources of everyone who holds an office.
+        """
+        bodies = [city_council] + committees
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            records = dict(
+                zip(
+                    [body["BodyId"] for body in bodies],
+                    self.map(
+                        executor,
+                        lambda body: list(self.body_offices(body)),
+                        self.body_offices_async,
+                        bodies,
+                    ),
                 )
-                o.add_source(
-                    self.WEB_URL
-                    + "/DepartmentDetail.aspx?ID={BodyId}&GUID={BodyGuid}".format(
-                        **body
+            )
+
+            terms = collections.defaultdict(list)
+            for office in records[city_council["BodyId"]]:
+                if "vacan" not in office["OfficeRecordFullName"].lower():
+                    terms[office["OfficeRecordFullName"].strip()].append(office)
+
+            # everyone who might need a Person, looked up once each
+            people = {}
+            for office in itertools.chain(
+                *terms.values(), *(records[body["BodyId"]] for body in committees)
+            ):
+                people.setdefault(office["OfficeRecordPersonId"], office)
+            sources = dict(
+                zip(
+                    people,
+                    self.map(
+                        executor,
+                        self.person_sources_from_office,
+                        self.person_sources_async,
+                        people.values(),
                     ),
-                    note="web",
                 )
+            )
+        return terms, records, sources
 
-                for office in self.body_offices(body):
+    def map(self, executor, function, coroutine_function, items):
+        """
+        `function` of each item, from the executor's threads, or
+        `coroutine_function` of each, gathered on the async client's loop.
+        """
+        if self.aio is None:
+            return list(executor.map(function, items))
 
-                    role = office["OfficeRecordTitle"]
-                    if role not in ("Vice Chair", "Chairman"):
-                        role = "Member"
+        async def gather():
+            return await asyncio.gather(*(coroutine_function(item) for item in items))
 
-                    person = office["OfficeRecordFullName"].strip()
-                    if person in members:
-                        p = members[person]
-                    else:
-                        p = Person(person)
+        return self.aio.submit(gather()).result()
 
-                        source_urls = self.person_sources_from_office(office)
-                        person_api_url, person_web_url = source_urls
-                        p.add_source(person_api_url, note="api")
-                        p.add_source(person_web_url, note="web")
+    async def body_offices_async(self, body):
+        return await self.aio.pages(
+            self.BASE_URL + "/bodies/{0}/OfficeRecords".format(body["BodyId"]),
+            item_key="OfficeRecordId",
+        )
 
-                        members[person] = p
+    async def person_sources_async(self, office):
+        person_api_url = self.BASE_URL + "/persons/{OfficeRecordPersonId}".format(
+            **office
+        )
+        person = await self.aio.json(person_api_url)
+        route = "/PersonDetail.aspx?ID={PersonId}&GUID={PersonGuid}"
+        return person_api_url, self.WEB_URL + route.format(**person)
 
-                    try:
-                        end_date = self.toDate(office["OfficeRecordEndDate"])
-                    except TypeError:
-                        end_date = ""
-                    p.add_membership(
-                        body["BodyName"],
-                        role=role,
-                        start_date=self.toDate(office["OfficeRecordStartDate"]),
-                        end_date=end_date,
-                    )
+    def member_list(self, path=WEB_INFO_FILE, max_age=WEB_INFO_MAX_AGE):
+        """The board's member list from the web site, by member name."""
+        try:
+            if time.time() - os.path.getmtime(path) < max_age:
+                with open(path) as f:
+                    return json.load(f)
+        except FileNotFoundError:
+            pass
 
-                yield o
+        web_scraper = CMAPWebPersonScraper(requests_per_minute=self.requests_per_minute)
+        web_scraper.MEMBERLIST = "https://cmap.legistar.com/DepartmentDetail.aspx?ID=45975&GUID=88D24C6E-E96C-47BB-94D4-1179B6C45212&Search="
+        web_scraper.ALL_MEMBERS = "3:3"
 
-        for p in members.values():
-            yield p
+        if self.cache_storage:
+            web_scraper.cache_storage = self.cache_storage
+
+        # read from the cache, as --fastmode has this scraper do. The rate
+        # limit can't tell us: it sets requests_per_minute to 0 too
+        web_scraper.cache_write_only = self.cache_write_only
+
+        web_info = {}
+        for member, _ in web_scraper.councilMembers(
+            {"ctl00$ContentPlaceHolder$lstName": "CMAP Board"}
+        ):
+            web_info[member["Person Name"]["label"]] = member
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(web_info, f)
+        os.replace(tmp_path, path)
+        return web_info
@@ -0,0 +1,122 @@
+"""
+Post-process the database `pupa update` leaves behind.
+
+    python -m cmap.postprocess cmap.db
+
+In one connection and one transaction, this tallies vote counts, drops
+pupa's and Django's bookkeeping tables, unused divisions and empty
+tables, and strips the `opencivicdata_` prefix from the rest. The file
+is only vacuumed when enough of it has been freed to be worth it.
+"""
+
+import argparse
+import sqlite3
+import uuid
+
+TABLE_PREFIX = "opencivicdata_"
+
+# vacuum when at least this fraction of the file's pages are free
+VACUUM_THRESHOLD = 0.1
+
+PRAGMAS = (
+    "PRAGMA journal_mode = MEMORY",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+def tables(con, pattern):
+    return [
+        name
+        for (name,) in con.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ?",
+            (pattern,),
+        )
+    ]
+
+
+def count_votes(con):
+    con.execute("DELETE FROM opencivicdata_votecount")
+    con.execute("""
+        INSERT INTO opencivicdata_votecount (id, option, value, vote_event_id)
+        SELECT uuid4(), option, count(*), vote_event_id
+        FROM opencivicdata_personvote
+        GROUP BY vote_event_id, option
+        """)
+
+
+def drop_bookkeeping(con):
+    for name in tables(con, "pupa_%") + tables(con, "django_%"):
+        con.execute('DROP TABLE "{0}"'.format(name))
+
+
+def remove_unused_divisions(con):
+    con.execute("""
+        DELETE FROM opencivicdata_division
+        WHERE id NOT IN (SELECT division_id FROM opencivicdata_post)
+        """)
+
+
+def drop_empty(con):
+    for name in tables(con, TABLE_PREFIX + "%"):
+        if con.execute('SELECT 1 FROM "{0}" LIMIT 1'.format(name)).fetchone() is None:
+            con.execute('DROP TABLE "{0}"'.format(name))
+
+
+def rename(con):
+    for name in tables(con, TABLE_PREFIX + "%"):
+        con.execute(
+            'ALTER TABLE "{0}" RENAME TO "{1}"'.format(name, name[len(TABLE_PREFIX) :])
+        )
+
+
+def vacuum_if_fragmented(con, threshold=VACUUM_THRESHOLD):
+    (page_count,) = con.execute("PRAGMA page_count").fetchone()
+    (freelist_count,) = con.execute("PRAGMA freelist_count").fetchone()
+    if page_count and freelist_count / page_count >= threshold:
+        con.execute("VACUUM")
+        return True
+    return False
+
+
+def postprocess(path, vacuum_threshold=VACUUM_THRESHOLD):
+    con = sqlite3.connect(path, isolation_level=None)
+    con.create_function("uuid4", 0, lambda: str(uuid.uuid4()))
+    for pragma in PRAGMAS:
+        con.execute(pragma)
+
+    try:
+        con.execute("BEGIN")
+        count_votes(con)
+        drop_bookkeeping(con)
+        remove_unused_divisions(con)
+        drop_empty(con)
+        rename(con)
+        con.execute("COMMIT")
+
+        vacuum_if_fragmented(con, vacuum_threshold)
+    except BaseException:
+        if con.in_transaction:
+            con.execute("ROLLBACK")
+        raise
+    finally:
+        con.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("database")
+    parser.add_argument(
+        "--vacuum-threshold",
+        type=float,
+        default=VACUUM_THRESHOLD,
+        help="vacuum when at least this fraction of pages are free",
+    )
+    args = parser.parse_args()
+
+    postprocess(args.database, args.vacuum_threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+One adaptive rate limit for every scraper in the process.
+
+scrapelib throttles each scraper on its own, at a fixed
+`requests_per_minute`. `AdaptiveLimiter` is a token bucket shared by
+all of them instead, including the web scraper the person scraper
+borrows for the member list. Its rate creeps up while Legistar answers
+quickly, eases off by a tenth each time it answers slowly, and is cut in
+half after a 429, a 5xx or a failed connection. Requests wait their turn
+by priority: listings and bulk collections go ahead of per-matter
+lookups, which go ahead of text downloads.
+
+`ThrottleLockMixin` makes scrapelib's own throttle safe to share between
+threads, for when it is left to throttle.
+
+`RateLimitMixin` sends a scraper's requests through the shared limiter
+and takes over scrapelib's retries, retrying 429s, 5xx and connection
+errors after a jittered, exponentially growing wait, or after what
+Retry-After asks for. Its `Retries` are the one retry policy, with or
+without the limiter, and the async client in cmap/aio.py follows them
+too.
+
+Set `CMAP_RATE_LIMIT` in pupa_settings.py to the starting rate in
+requests a second, or to None to leave throttling to scrapelib.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import re
+import threading
+import time
+import urllib.parse
+
+import requests
+import scrapelib
+from pupa import settings
+
+logger = logging.getLogger("cmap.ratelimit")
+
+HIGH, NORMAL, LOW = 0, 1, 2
+
+# the priority of a request by its path, first match wins
+ROUTE_PRIORITIES = (
+    (re.compile(r"/matters/\d+/texts/\d+$"), LOW),
+    (re.compile(r"/\d+(/|$)"), NORMAL),
+    (re.compile(r"/v1/\w+/\w+$"), HIGH),
+)
+DEFAULT_PRIORITY = NORMAL
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# how much faster to go after each quick response, in requests a second,
+# and what to multiply the rate by after a slow one
+INCREASE = 0.1
+SLOWDOWN = 0.9
+
+# cut the rate at most this often, so a burst of failures from requests
+# that were already in flight counts once
+CUT_INTERVAL = 1.0
+
+MAX_BACKOFF = 60.0
+
+# how often a coroutine waiting behind other requests looks again
+ASYNC_POLL_INTERVAL = 0.01
+
+
+def route_priority(url):
+    path = urllib.parse.urlsplit(url).path.rstrip("/")
+    for pattern, priority in ROUTE_PRIORITIES:
+        if pattern.search(path):
+            return priority
+    return DEFAULT_PRIORITY
+
+
+def retry_after(response):
+    """The seconds a response asks us to wait, if it says."""
+    try:
+        return max(float(response.headers["Retry-After"]), 0.0)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def backoff(tries, base):
+    """A wait before retry number `tries`, with full jitter."""
+    return random.uniform(0, min(MAX_BACKOFF, base * 2 ** (tries - 1)))
+
+
+class AdaptiveLimiter(object):
+    """
+    A token bucket whose rate moves between `min_rate` and `max_rate`
+    requests a second: up by INCREASE after each response within
+    `target_latency`, down by SLOWDOWN after each slower one, and by half
+    when `throttled`. Tokens go to the highest priority waiter first.
+    """
+
+    def __init__(self, rate, min_rate, max_rate, target_latency):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.target_latency = target_latency
+
+        self._tokens = 1.0
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._last_cut = 0.0
+
+        self._waiting = []
+        self._tickets = itertools.count()
+        self._condition = threading.Condition()
+
+    def acquire(self, priority=DEFAULT_PRIORITY):
+        with self._condition:
+            ticket = (priority, next(self._tickets))
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiting[0] != ticket:
+                        self._condition.wait()
+                        continue
+                    wait = max((1 - self._tokens) / self.rate, self._paused_until - now)
+                    if wait <= 0:
+                        self._tokens -= 1
+                        return
+                    self._condition.wait(wait)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+
+    async def acquire_async(self, priority=DEFAULT_PRIORITY):
+        """`acquire`, for coroutines, which wait without blocking the loop."""
+        with self._condition:
+            ticket = (priority, next(self._tickets))
+            heapq.heappush(self._waiting, ticket)
+        try:
+            while True:
+                with self._condition:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiting[0] != ticket:
+                        wait = ASYNC_POLL_INTERVAL
+                    else:
+                        wait = max(
+                            (1 - self._tokens) / self.rate, self._paused_until - now
+                        )
+                        if wait <= 0:
+                            self._tokens -= 1
+                            return
+                await asyncio.sleep(min(wait, ASYNC_POLL_INTERVAL))
+        finally:
+            with self._condition:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+
+    def _refill(self, now):
+        # a second's worth of tokens at most
+        capacity = max(1.0, self.rate)
+        self._tokens = min(capacity, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def answered(self, seconds):
+        """Adjust the rate to how long a successful request took."""
+        with self._condition:
+            if seconds <= self.target_latency:
+                self.rate = min(self.max_rate, self.rate + INCREASE)
+            else:
+                self.rate = max(self.min_rate, self.rate * SLOWDOWN)
+
+    def throttled(self, wait=None):
+        """Slow down after a 429, a 5xx or a failed connection."""
+        with self._condition:
+            now = time.monotonic()
+            if now - self._last_cut >= CUT_INTERVAL:
+                self._last_cut = now
+                self.rate = max(self.min_rate, self.rate / 2)
+                logger.info("slowing to %.1f requests a second", self.rate)
+            if wait:
+                self._paused_until = max(self._paused_until, now + wait)
+            self._condition.notify_all()
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def shared_limiter():
+    """The limiter named in the settings, made once per process."""
+    global _limiter
+    if not settings.CMAP_RATE_LIMIT:
+        return None
+    with _limiter_lock:
+        if _limiter is None:
+            min_rate, max_rate = settings.CMAP_RATE_LIMIT_BOUNDS
+            _limiter = AdaptiveLimiter(
+                settings.CMAP_RATE_LIMIT,
+                min_rate,
+                max_rate,
+                settings.CMAP_RATE_LIMIT_TARGET_LATENCY,
+            )
+        return _limiter
+
+
+class Retries(object):
+    """
+    The retries of one request: whether, and after how long, to try
+    again after each failure.
+    """
+
+    def __init__(self, url, attempts, wait_seconds, limiter):
+        self.url = url
+        self.attempts = attempts
+        self.wait_seconds = wait_seconds
+        self.limiter = limiter
+        self.priority = route_priority(url)
+        self.tries = 0
+
+    def answered(self, seconds):
+        if self.limiter is not None:
+            self.limiter.answered(seconds)
+
+    def failed(self, reason, wait=None):
+        """
+        Note a failed try, returning the seconds to wait before the next,
+        or None if there are no tries left.
+        """
+        if self.limiter is not None:
+            self.limiter.throttled(wait)
+        self.tries += 1
+        if self.tries > self.attempts:
+            return None
+
+        if wait is None:
+            wait = backoff(self.tries, self.wait_seconds)
+        logger.warning(
+            "got {0} from {1}, retrying in {2:.1f} seconds".format(
+                reason, self.url, wait
+            )
+        )
+        return wait
+
+
+class ThrottleLockMixin(object):
+    """
+    Have a scraper's threads take turns waiting on scrapelib's throttle,
+    which isn't thread safe.
+    """
+
+    _throttle_lock = threading.Lock()
+
+    def _throttle(self):
+        with self._throttle_lock:
+            super()._throttle()
+
+
+class RateLimitMixin(object):
+    """
+    Send requests through the shared AdaptiveLimiter, if there is one,
+    retrying the ones that fail in ways worth retrying.
+    """
+
+    _retries = None
+
+    def retries(self, url):
+        """The Retries of a request to `url`."""
+        limiter = shared_limiter()
+        if self._retries is None:
+            # we retry instead of scrapelib, and the limiter, if there is
+            # one, stands in for scrapelib's throttle
+            self._retries = self.retry_attempts
+            self.retry_attempts = 0
+            if limiter is not None:
+                self.requests_per_minute = 0
+        return Retries(url, self._retries, self.retry_wait_seconds, limiter)
+
+    def request(self, method, url, params=None, headers=None, **kwargs):
+        retries = self.retries(url)
+        while True:
+            if retries.limiter is not None:
+                retries.limiter.acquire(retries.priority)
+            start = time.monotonic()
+            try:
+                response = super().request(
+                    method, url, params=params, headers=headers, **kwargs
+                )
+            except scrapelib.HTTPError as e:
+                if e.response.status_code not in RETRY_STATUSES:
+                    raise
+                wait = retries.failed(e.response.status_code, retry_after(e.response))
+                if wait is None:
+                    raise
+            except requests.exceptions.SSLError:
+                raise
+            except (requests.ConnectionError, requests.Timeout) as e:
+                wait = retries.failed(e)
+                if wait is None:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    retries.answered(time.monotonic() - start)
+                    return response
+                wait = retries.failed(response.status_code, retry_after(response))
+                if wait is None:
+                    return response
+
+            time.sleep(wait)
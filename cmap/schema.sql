@@ -0,0 +1,451 @@
+-- The opencivicdata tables that pupa dbinit creates and cmap.postprocess
+-- keeps, with the opencivicdata_ prefix already stripped from their names.
+-- cmap.load creates these directly.
+
+CREATE TABLE "division" (
+    "id" varchar(300) NOT NULL PRIMARY KEY,
+    "name" varchar(300) NOT NULL,
+    "redirect_id" varchar(300) NULL REFERENCES "division" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "country" varchar(2) NOT NULL,
+    "subtype1" varchar(50) NOT NULL,
+    "subid1" varchar(100) NOT NULL,
+    "subtype2" varchar(50) NOT NULL,
+    "subid2" varchar(100) NOT NULL,
+    "subtype3" varchar(50) NOT NULL,
+    "subid3" varchar(100) NOT NULL,
+    "subtype4" varchar(50) NOT NULL,
+    "subid4" varchar(100) NOT NULL,
+    "subtype5" varchar(50) NOT NULL,
+    "subid5" varchar(100) NOT NULL,
+    "subtype6" varchar(50) NOT NULL,
+    "subid6" varchar(100) NOT NULL,
+    "subtype7" varchar(50) NOT NULL,
+    "subid7" varchar(100) NOT NULL
+);
+
+CREATE TABLE "jurisdiction" (
+    "created_at" datetime NOT NULL,
+    "updated_at" datetime NOT NULL,
+    "last_seen" datetime NOT NULL,
+    "extras" text NOT NULL CHECK ((JSON_VALID("extras") OR "extras" IS NULL)),
+    "locked_fields" text[] NOT NULL,
+    "id" varchar(300) NOT NULL PRIMARY KEY,
+    "name" varchar(300) NOT NULL,
+    "url" varchar(2000) NOT NULL,
+    "classification" varchar(50) NOT NULL,
+    "feature_flags" text[] NOT NULL,
+    "division_id" varchar(300) NOT NULL REFERENCES "division" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE TABLE "legislativesession" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "jurisdiction_id" varchar(300) NOT NULL REFERENCES "jurisdiction" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "identifier" varchar(100) NOT NULL,
+    "name" varchar(300) NOT NULL,
+    "classification" varchar(100) NOT NULL,
+    "start_date" varchar(10) NOT NULL,
+    "end_date" varchar(10) NOT NULL
+);
+
+CREATE TABLE "organization" (
+    "created_at" datetime NOT NULL,
+    "updated_at" datetime NOT NULL,
+    "last_seen" datetime NOT NULL,
+    "extras" text NOT NULL CHECK ((JSON_VALID("extras") OR "extras" IS NULL)),
+    "locked_fields" text[] NOT NULL,
+    "id" varchar(53) NOT NULL PRIMARY KEY,
+    "name" varchar(300) NOT NULL,
+    "image" varchar(2000) NOT NULL,
+    "parent_id" varchar(53) NULL REFERENCES "organization" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "jurisdiction_id" varchar(300) NULL REFERENCES "jurisdiction" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "classification" varchar(100) NOT NULL,
+    "founding_date" varchar(10) NOT NULL,
+    "dissolution_date" varchar(10) NOT NULL
+);
+
+CREATE TABLE "organizationidentifier" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "identifier" varchar(300) NOT NULL,
+    "scheme" varchar(300) NOT NULL,
+    "organization_id" varchar(53) NOT NULL REFERENCES "organization" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE TABLE "organizationname" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "name" varchar(500) NOT NULL,
+    "note" varchar(500) NOT NULL,
+    "start_date" varchar(10) NOT NULL,
+    "end_date" varchar(10) NOT NULL,
+    "organization_id" varchar(53) NOT NULL REFERENCES "organization" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE TABLE "organizationcontactdetail" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "type" varchar(50) NOT NULL,
+    "value" varchar(300) NOT NULL,
+    "note" varchar(300) NOT NULL,
+    "label" varchar(300) NOT NULL,
+    "organization_id" varchar(53) NOT NULL REFERENCES "organization" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE TABLE "organizationlink" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "note" varchar(300) NOT NULL,
+    "url" varchar(2000) NOT NULL,
+    "organization_id" varchar(53) NOT NULL REFERENCES "organization" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE TABLE "organizationsource" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "note" varchar(300) NOT NULL,
+    "url" varchar(2000) NOT NULL,
+    "organization_id" varchar(53) NOT NULL REFERENCES "organization" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE TABLE "post" (
+    "created_at" datetime NOT NULL,
+    "updated_at" datetime NOT NULL,
+    "last_seen" datetime NOT NULL,
+    "extras" text NOT NULL CHECK ((JSON_VALID("extras") OR "extras" IS NULL)),
+    "locked_fields" text[] NOT NULL,
+    "id" varchar(45) NOT NULL PRIMARY KEY,
+    "label" varchar(300) NOT NULL,
+    "role" varchar(300) NOT NULL,
+    "organization_id" varchar(53) NOT NULL REFERENCES "organization" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "division_id" varchar(300) NULL REFERENCES "division" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "start_date" varchar(10) NOT NULL,
+    "end_date" varchar(10) NOT NULL,
+    "maximum_memberships" integer unsigned NOT NULL CHECK ("maximum_memberships" >= 0)
+);
+
+CREATE TABLE "postcontactdetail" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "type" varchar(50) NOT NULL,
+    "value" varchar(300) NOT NULL,
+    "note" varchar(300) NOT NULL,
+    "label" varchar(300) NOT NULL,
+    "post_id" varchar(45) NOT NULL REFERENCES "post" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE TABLE "postlink" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "note" varchar(300) NOT NULL,
+    "url" varchar(2000) NOT NULL,
+    "post_id" varchar(45) NOT NULL REFERENCES "post" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE TABLE "person" (
+    "created_at" datetime NOT NULL,
+    "updated_at" datetime NOT NULL,
+    "last_seen" datetime NOT NULL,
+    "extras" text NOT NULL CHECK ((JSON_VALID("extras") OR "extras" IS NULL)),
+    "locked_fields" text[] NOT NULL,
+    "id" varchar(47) NOT NULL PRIMARY KEY,
+    "name" varchar(300) NOT NULL,
+    "sort_name" varchar(100) NOT NULL,
+    "family_name" varchar(100) NOT NULL,
+    "given_name" varchar(100) NOT NULL,
+    "image" varchar(2000) NOT NULL,
+    "gender" varchar(100) NOT NULL,
+    "summary" varchar(500) NOT NULL,
+    "national_identity" varchar(300) NOT NULL,
+    "biography" text NOT NULL,
+    "birth_date" varchar(10) NOT NULL,
+    "death_date" varchar(10) NOT NULL
+);
+
+CREATE TABLE "personidentifier" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "identifier" varchar(300) NOT NULL,
+    "scheme" varchar(300) NOT NULL,
+    "person_id" varchar(47) NOT NULL REFERENCES "person" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE TABLE "personname" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "name" varchar(500) NOT NULL,
+    "note" varchar(500) NOT NULL,
+    "start_date" varchar(10) NOT NULL,
+    "end_date" varchar(10) NOT NULL,
+    "person_id" varchar(47) NOT NULL REFERENCES "person" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE TABLE "personcontactdetail" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "type" varchar(50) NOT NULL,
+    "value" varchar(300) NOT NULL,
+    "note" varchar(300) NOT NULL,
+    "label" varchar(300) NOT NULL,
+    "person_id" varchar(47) NOT NULL REFERENCES "person" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE TABLE "personlink" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "note" varchar(300) NOT NULL,
+    "url" varchar(2000) NOT NULL,
+    "person_id" varchar(47) NOT NULL REFERENCES "person" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE TABLE "personsource" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "note" varchar(300) NOT NULL,
+    "url" varchar(2000) NOT NULL,
+    "person_id" varchar(47) NOT NULL REFERENCES "person" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE TABLE "membership" (
+    "created_at" datetime NOT NULL,
+    "updated_at" datetime NOT NULL,
+    "last_seen" datetime NOT NULL,
+    "extras" text NOT NULL CHECK ((JSON_VALID("extras") OR "extras" IS NULL)),
+    "locked_fields" text[] NOT NULL,
+    "id" varchar(51) NOT NULL PRIMARY KEY,
+    "organization_id" varchar(53) NOT NULL REFERENCES "organization" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "person_id" varchar(47) NULL REFERENCES "person" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "person_name" varchar(300) NOT NULL,
+    "post_id" varchar(45) NULL REFERENCES "post" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "on_behalf_of_id" varchar(53) NULL REFERENCES "organization" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "label" varchar(300) NOT NULL,
+    "role" varchar(300) NOT NULL,
+    "start_date" varchar(10) NOT NULL,
+    "end_date" varchar(10) NOT NULL
+);
+
+CREATE TABLE "membershipcontactdetail" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "type" varchar(50) NOT NULL,
+    "value" varchar(300) NOT NULL,
+    "note" varchar(300) NOT NULL,
+    "label" varchar(300) NOT NULL,
+    "membership_id" varchar(51) NOT NULL REFERENCES "membership" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE TABLE "membershiplink" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "note" varchar(300) NOT NULL,
+    "url" varchar(2000) NOT NULL,
+    "membership_id" varchar(51) NOT NULL REFERENCES "membership" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE TABLE "bill" (
+    "created_at" datetime NOT NULL,
+    "updated_at" datetime NOT NULL,
+    "last_seen" datetime NOT NULL,
+    "extras" text NOT NULL CHECK ((JSON_VALID("extras") OR "extras" IS NULL)),
+    "locked_fields" text[] NOT NULL,
+    "id" varchar(45) NOT NULL PRIMARY KEY,
+    "legislative_session_id" char(32) NOT NULL REFERENCES "legislativesession" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "identifier" varchar(100) NOT NULL,
+    "title" text NOT NULL,
+    "from_organization_id" varchar(53) NULL REFERENCES "organization" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "classification" text[] NOT NULL,
+    "subject" text[] NOT NULL
+);
+
+CREATE TABLE "billabstract" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "bill_id" varchar(45) NOT NULL REFERENCES "bill" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "abstract" text NOT NULL,
+    "note" text NOT NULL,
+    "date" text NOT NULL
+);
+
+CREATE TABLE "billtitle" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "bill_id" varchar(45) NOT NULL REFERENCES "bill" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "title" text NOT NULL,
+    "note" text NOT NULL
+);
+
+CREATE TABLE "billidentifier" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "identifier" varchar(300) NOT NULL,
+    "scheme" varchar(300) NOT NULL,
+    "bill_id" varchar(45) NOT NULL REFERENCES "bill" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "note" text NOT NULL
+);
+
+CREATE TABLE "billaction" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "bill_id" varchar(45) NOT NULL REFERENCES "bill" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "organization_id" varchar(53) NOT NULL REFERENCES "organization" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "description" text NOT NULL,
+    "date" varchar(25) NOT NULL,
+    "classification" text[] NOT NULL,
+    "order" integer unsigned NOT NULL CHECK ("order" >= 0),
+    "extras" text NOT NULL CHECK ((JSON_VALID("extras") OR "extras" IS NULL))
+);
+
+CREATE TABLE "billactionrelatedentity" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "name" varchar(2000) NOT NULL,
+    "entity_type" varchar(20) NOT NULL,
+    "organization_id" varchar(53) NULL REFERENCES "organization" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "person_id" varchar(47) NULL REFERENCES "person" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "action_id" char(32) NOT NULL REFERENCES "billaction" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE TABLE "relatedbill" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "bill_id" varchar(45) NOT NULL REFERENCES "bill" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "related_bill_id" varchar(45) NULL REFERENCES "bill" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "identifier" varchar(100) NOT NULL,
+    "legislative_session" varchar(100) NOT NULL,
+    "relation_type" varchar(100) NOT NULL
+);
+
+CREATE TABLE "billsponsorship" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "name" varchar(2000) NOT NULL,
+    "entity_type" varchar(20) NOT NULL,
+    "organization_id" varchar(53) NULL REFERENCES "organization" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "person_id" varchar(47) NULL REFERENCES "person" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "bill_id" varchar(45) NOT NULL REFERENCES "bill" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "primary" bool NOT NULL,
+    "classification" varchar(100) NOT NULL
+);
+
+CREATE TABLE "billsource" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "note" varchar(300) NOT NULL,
+    "url" varchar(2000) NOT NULL,
+    "bill_id" varchar(45) NOT NULL REFERENCES "bill" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE TABLE "billdocument" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "bill_id" varchar(45) NOT NULL REFERENCES "bill" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "note" varchar(300) NOT NULL,
+    "date" varchar(10) NOT NULL,
+    "extras" text NOT NULL CHECK ((JSON_VALID("extras") OR "extras" IS NULL))
+);
+
+CREATE TABLE "billdocumentlink" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "media_type" varchar(100) NOT NULL,
+    "url" varchar(2000) NOT NULL,
+    "text" text NOT NULL,
+    "document_id" char(32) NOT NULL REFERENCES "billdocument" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE TABLE "billversion" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "bill_id" varchar(45) NOT NULL REFERENCES "bill" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "note" varchar(300) NOT NULL,
+    "date" varchar(10) NOT NULL,
+    "extras" text NOT NULL CHECK ((JSON_VALID("extras") OR "extras" IS NULL))
+);
+
+CREATE TABLE "billversionlink" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "media_type" varchar(100) NOT NULL,
+    "url" varchar(2000) NOT NULL,
+    "text" text NOT NULL,
+    "version_id" char(32) NOT NULL REFERENCES "billversion" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE TABLE "voteevent" (
+    "created_at" datetime NOT NULL,
+    "updated_at" datetime NOT NULL,
+    "last_seen" datetime NOT NULL,
+    "locked_fields" text[] NOT NULL,
+    "id" varchar(45) NOT NULL PRIMARY KEY,
+    "identifier" varchar(300) NOT NULL,
+    "motion_text" text NOT NULL,
+    "motion_classification" text[] NOT NULL,
+    "start_date" varchar(25) NOT NULL,
+    "end_date" varchar(25) NOT NULL,
+    "result" varchar(50) NOT NULL,
+    "organization_id" varchar(53) NOT NULL REFERENCES "organization" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "legislative_session_id" char(32) NOT NULL REFERENCES "legislativesession" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "bill_id" varchar(45) NULL REFERENCES "bill" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "bill_action_id" char(32) NULL UNIQUE REFERENCES "billaction" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "extras" text NOT NULL CHECK ((JSON_VALID("extras") OR "extras" IS NULL))
+);
+
+CREATE TABLE "votecount" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "vote_event_id" varchar(45) NOT NULL REFERENCES "voteevent" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "option" varchar(50) NOT NULL,
+    "value" integer unsigned NOT NULL CHECK ("value" >= 0)
+);
+
+CREATE TABLE "personvote" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "vote_event_id" varchar(45) NOT NULL REFERENCES "voteevent" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "option" varchar(50) NOT NULL,
+    "voter_name" varchar(300) NOT NULL,
+    "voter_id" varchar(47) NULL REFERENCES "person" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "note" text NOT NULL
+);
+
+CREATE TABLE "votesource" (
+    "id" char(32) NOT NULL PRIMARY KEY,
+    "note" varchar(300) NOT NULL,
+    "url" varchar(2000) NOT NULL,
+    "vote_event_id" varchar(45) NOT NULL REFERENCES "voteevent" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE INDEX "opencivicdata_division_redirect_id_6ef2b608" ON "division" ("redirect_id");
+CREATE INDEX "opencivicdata_jurisdiction_classification_5e7edfaf" ON "jurisdiction" ("classification");
+CREATE INDEX "opencivicdata_jurisdiction_division_id_70d82947" ON "jurisdiction" ("division_id");
+CREATE INDEX "opencivicdata_legislativesession_jurisdiction_id_54141e1e" ON "legislativesession" ("jurisdiction_id");
+CREATE INDEX "opencivicdata_organization_classification_name_8008bbd6_idx" ON "organization" ("classification", "name");
+CREATE INDEX "opencivicdata_organization_jurisdiction_id_3d545d77" ON "organization" ("jurisdiction_id");
+CREATE INDEX "opencivicdata_organization_jurisdiction_id_classification_name_3466801f_idx" ON "organization" ("jurisdiction_id", "classification", "name");
+CREATE INDEX "opencivicdata_organization_parent_id_8da063e7" ON "organization" ("parent_id");
+CREATE INDEX "opencivicdata_organizationidentifier_organization_id_e64fb39b" ON "organizationidentifier" ("organization_id");
+CREATE INDEX "opencivicdata_organizationname_name_bd9d922e" ON "organizationname" ("name");
+CREATE INDEX "opencivicdata_organizationname_organization_id_a0ffb024" ON "organizationname" ("organization_id");
+CREATE INDEX "opencivicdata_organizationcontactdetail_organization_id_262ed211" ON "organizationcontactdetail" ("organization_id");
+CREATE INDEX "opencivicdata_organizationlink_organization_id_05713b96" ON "organizationlink" ("organization_id");
+CREATE INDEX "opencivicdata_organizationsource_organization_id_9908af76" ON "organizationsource" ("organization_id");
+CREATE INDEX "opencivicdata_post_division_id_82fef8df" ON "post" ("division_id");
+CREATE INDEX "opencivicdata_post_organization_id_7dab6fa7" ON "post" ("organization_id");
+CREATE INDEX "opencivicdata_post_organization_id_label_8792a17f_idx" ON "post" ("organization_id", "label");
+CREATE INDEX "opencivicdata_postcontactdetail_post_id_45fcfdc6" ON "postcontactdetail" ("post_id");
+CREATE INDEX "opencivicdata_postlink_post_id_39d6da19" ON "postlink" ("post_id");
+CREATE INDEX "opencivicdata_person_name_663c152b" ON "person" ("name");
+CREATE INDEX "opencivicdata_personidentifier_person_id_4a59ae8e" ON "personidentifier" ("person_id");
+CREATE INDEX "opencivicdata_personname_name_35448948" ON "personname" ("name");
+CREATE INDEX "opencivicdata_personname_person_id_89e987d1" ON "personname" ("person_id");
+CREATE INDEX "opencivicdata_personcontactdetail_person_id_27d17a5c" ON "personcontactdetail" ("person_id");
+CREATE INDEX "opencivicdata_personlink_person_id_b3a41b21" ON "personlink" ("person_id");
+CREATE INDEX "opencivicdata_personsource_person_id_d33c1559" ON "personsource" ("person_id");
+CREATE INDEX "opencivicdata_membership_on_behalf_of_id_12b68c78" ON "membership" ("on_behalf_of_id");
+CREATE INDEX "opencivicdata_membership_organization_id_bf51a2be" ON "membership" ("organization_id");
+CREATE INDEX "opencivicdata_membership_organization_id_person_id_label_post_id_dcb78271_idx" ON "membership" ("organization_id", "person_id", "label", "post_id");
+CREATE INDEX "opencivicdata_membership_person_id_b8541e5b" ON "membership" ("person_id");
+CREATE INDEX "opencivicdata_membership_post_id_c7e554f4" ON "membership" ("post_id");
+CREATE INDEX "opencivicdata_membershipcontactdetail_membership_id_eb326140" ON "membershipcontactdetail" ("membership_id");
+CREATE INDEX "opencivicdata_membershiplink_membership_id_74b7f1e0" ON "membershiplink" ("membership_id");
+CREATE INDEX "opencivicdata_bill_from_organization_id_e96ed21d" ON "bill" ("from_organization_id");
+CREATE INDEX "opencivicdata_bill_from_organization_id_legislative_session_id_identifier_19e983a6_idx" ON "bill" ("from_organization_id", "legislative_session_id", "identifier");
+CREATE INDEX "opencivicdata_bill_legislative_session_id_ef50ac55" ON "bill" ("legislative_session_id");
+CREATE INDEX "opencivicdata_billabstract_bill_id_ae9ce636" ON "billabstract" ("bill_id");
+CREATE INDEX "opencivicdata_billtitle_bill_id_1534b245" ON "billtitle" ("bill_id");
+CREATE INDEX "opencivicdata_billidentifier_bill_id_7eb921fc" ON "billidentifier" ("bill_id");
+CREATE INDEX "opencivicdata_billaction_bill_id_32c574af" ON "billaction" ("bill_id");
+CREATE INDEX "opencivicdata_billaction_organization_id_16619b7f" ON "billaction" ("organization_id");
+CREATE INDEX "opencivicdata_billactionrelatedentity_action_id_4f9a39ec" ON "billactionrelatedentity" ("action_id");
+CREATE INDEX "opencivicdata_billactionrelatedentity_organization_id_0f2653d0" ON "billactionrelatedentity" ("organization_id");
+CREATE INDEX "opencivicdata_billactionrelatedentity_person_id_b1c818ff" ON "billactionrelatedentity" ("person_id");
+CREATE INDEX "opencivicdata_relatedbill_bill_id_1a0b62e4" ON "relatedbill" ("bill_id");
+CREATE INDEX "opencivicdata_relatedbill_related_bill_id_22d5e5eb" ON "relatedbill" ("related_bill_id");
+CREATE INDEX "opencivicdata_billsponsorship_bill_id_c0161ea6" ON "billsponsorship" ("bill_id");
+CREATE INDEX "opencivicdata_billsponsorship_organization_id_e2f034bd" ON "billsponsorship" ("organization_id");
+CREATE INDEX "opencivicdata_billsponsorship_person_id_c2295c47" ON "billsponsorship" ("person_id");
+CREATE INDEX "opencivicdata_billsource_bill_id_832557ca" ON "billsource" ("bill_id");
+CREATE INDEX "opencivicdata_billdocument_bill_id_6620b91a" ON "billdocument" ("bill_id");
+CREATE INDEX "opencivicdata_billdocumentlink_document_id_6a555184" ON "billdocumentlink" ("document_id");
+CREATE INDEX "opencivicdata_billversion_bill_id_33ab8294" ON "billversion" ("bill_id");
+CREATE INDEX "opencivicdata_billversionlink_version_id_51725693" ON "billversionlink" ("version_id");
+CREATE INDEX "opencivicdata_voteevent_bill_id_ae459db1" ON "voteevent" ("bill_id");
+CREATE INDEX "opencivicdata_voteevent_legislative_session_id_63ea1068" ON "voteevent" ("legislative_session_id");
+CREATE INDEX "opencivicdata_voteevent_legislative_session_id_bill_id_e48f547e_idx" ON "voteevent" ("legislative_session_id", "bill_id");
+CREATE INDEX "opencivicdata_voteevent_legislative_session_id_identifier_bill_id_3bb84db4_idx" ON "voteevent" ("legislative_session_id", "identifier", "bill_id");
+CREATE INDEX "opencivicdata_voteevent_organization_id_d7bd0f84" ON "voteevent" ("organization_id");
+CREATE INDEX "opencivicdata_votecount_vote_event_id_f1f263f8" ON "votecount" ("vote_event_id");
+CREATE INDEX "opencivicdata_personvote_vote_event_id_7d507bb5" ON "personvote" ("vote_event_id");
+CREATE INDEX "opencivicdata_personvote_voter_id_6740775f" ON "personvote" ("voter_id");
+CREATE INDEX "opencivicdata_votesource_vote_event_id_a670ce14" ON "votesource" ("vote_event_id");
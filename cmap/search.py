@@ -0,0 +1,297 @@
+"""
+Full-text search over cmap.db.
+
+    python -m cmap.search cmap.db [--workers N]
+
+Fetches the PDFs bills link to as documents, extracts their text, and
+rebuilds `search`, an FTS5 table of bill titles, the text of each bill
+version's RTF and the text of each attachment:
+
+    SELECT bill_id, source, snippet(search, 3, '[', ']', '...', 12)
+    FROM search WHERE search MATCH 'transit' ORDER BY rank
+
+Attachments are fetched by a pool of `workers` threads, within the
+scrapers' shared rate limit. The `attachment` table keeps each URL's
+ETag and Last-Modified headers, so once a file is a month old it is only
+downloaded again if it has changed. Texts are kept in `attachmenttext`
+by the SHA-256 of the file, so a file linked from many bills, or from
+many URLs, is only extracted once.
+"""
+
+import argparse
+import concurrent.futures
+import datetime
+import hashlib
+import json
+import logging
+import logging.config
+import sqlite3
+import tempfile
+import threading
+
+import pypdf
+import scrapelib
+from pupa import settings
+
+from .bills import TEXT_STORE
+from .postprocess import PRAGMAS, tables
+from .ratelimit import RateLimitMixin, ThrottleLockMixin
+from .texts import CHUNK_SIZE, TextStore, rtf_to_text
+
+logger = logging.getLogger("cmap.search")
+
+DEFAULT_WORKERS = 4
+
+# how long before an attachment we have is checked for changes
+REVALIDATE_AFTER = datetime.timedelta(days=30)
+
+# how many fetched attachments to write at a time
+COMMIT_EVERY = 100
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS attachment (
+        url TEXT PRIMARY KEY,
+        etag TEXT,
+        last_modified TEXT,
+        sha256 TEXT,
+        fetched_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS attachmenttext (
+        sha256 TEXT PRIMARY KEY,
+        text TEXT NOT NULL
+    )
+    """,
+)
+
+SEARCH_TABLE = """
+    CREATE VIRTUAL TABLE search USING fts5(
+        bill_id UNINDEXED,
+        source UNINDEXED,
+        url UNINDEXED,
+        text,
+        tokenize = 'porter unicode61'
+    )
+"""
+
+
+class AttachmentScraper(RateLimitMixin, ThrottleLockMixin, scrapelib.Scraper):
+    """
+    Fetches attachments within the scrapers' shared rate limit, from
+    every worker thread at once.
+    """
+
+
+def pdf_text(path):
+    try:
+        reader = pypdf.PdfReader(path)
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+    except Exception as e:
+        # pypdf has no one exception for files it can't make sense of
+        logger.warning("could not extract text from %s: %s", path, e)
+        return ""
+
+
+class AttachmentFetcher(object):
+    def __init__(self, scraper, known):
+        self.scraper = scraper
+        # digests whose text we have, or are extracting
+        self.known = known
+        self._lock = threading.Lock()
+
+    def fetch(self, url, previous):
+        """
+        Fetch an attachment, unless it hasn't changed since `previous`,
+        returning its attachment row, and its text if we didn't have it.
+        """
+        headers = {}
+        if previous and previous["etag"]:
+            headers["If-None-Match"] = previous["etag"]
+        if previous and previous["last_modified"]:
+            headers["If-Modified-Since"] = previous["last_modified"]
+
+        row = {
+            "url": url,
+            "fetched_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        }
+        try:
+            response = self.scraper.get(url, headers=headers, stream=True)
+        except (scrapelib.HTTPError, scrapelib.requests.RequestException) as e:
+            logger.warning("could not fetch %s: %s", url, e)
+            return None, None
+
+        with response:
+            row["etag"] = response.headers.get("ETag")
+            row["last_modified"] = response.headers.get("Last-Modified")
+            if response.status_code == 304:
+                row["sha256"] = previous["sha256"]
+                return row, None
+
+            digest = hashlib.sha256()
+            with tempfile.NamedTemporaryFile(suffix=".pdf") as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    digest.update(chunk)
+                    f.write(chunk)
+                f.flush()
+
+                row["sha256"] = digest.hexdigest()
+                with self._lock:
+                    if row["sha256"] in self.known:
+                        return row, None
+                    self.known.add(row["sha256"])
+                return row, pdf_text(f.name)
+
+
+def stale(previous, now):
+    fetched_at = datetime.datetime.fromisoformat(previous["fetched_at"])
+    return now - fetched_at > REVALIDATE_AFTER
+
+
+def fetch_attachments(con, workers=DEFAULT_WORKERS):
+    """Bring the attachments and their texts up to date with the bills."""
+    previous = {
+        row["url"]: row
+        for row in con.execute(
+            "SELECT url, etag, last_modified, sha256, fetched_at FROM attachment"
+        )
+    }
+    now = datetime.datetime.now(datetime.timezone.utc)
+    urls = [
+        url
+        for (url,) in con.execute(
+            "SELECT DISTINCT url FROM billdocumentlink "
+            "WHERE media_type = 'application/pdf' ORDER BY url"
+        )
+        if url not in previous or stale(previous[url], now)
+    ]
+    logger.info("fetching %d attachments", len(urls))
+
+    scraper = AttachmentScraper(
+        requests_per_minute=settings.SCRAPELIB_RPM,
+        retry_attempts=settings.SCRAPELIB_RETRY_ATTEMPTS,
+        retry_wait_seconds=settings.SCRAPELIB_RETRY_WAIT_SECONDS,
+    )
+    known = {digest for (digest,) in con.execute("SELECT sha256 FROM attachmenttext")}
+    fetcher = AttachmentFetcher(scraper, known)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(fetcher.fetch, url, previous.get(url)) for url in urls
+        ]
+        for i, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            row, text = future.result()
+            if row is None:
+                continue
+            if text is not None:
+                con.execute(
+                    "INSERT OR REPLACE INTO attachmenttext (sha256, text) VALUES (?, ?)",
+                    (row["sha256"], text),
+                )
+            con.execute(
+                "INSERT OR REPLACE INTO attachment "
+                "(url, etag, last_modified, sha256, fetched_at) "
+                "VALUES (:url, :etag, :last_modified, :sha256, :fetched_at)",
+                row,
+            )
+            if i % COMMIT_EVERY == 0:
+                con.commit()
+
+    # forget the attachments no bill links to any more
+    con.execute(
+        "DELETE FROM attachment WHERE url NOT IN (SELECT url FROM billdocumentlink)"
+    )
+    con.execute(
+        "DELETE FROM attachmenttext WHERE sha256 NOT IN "
+        "(SELECT sha256 FROM attachment WHERE sha256 IS NOT NULL)"
+    )
+    con.commit()
+
+
+def version_texts(con):
+    """The text of each bill version, as (bill_id, url, text)."""
+    spilled = {}
+    for bill_id, extras in con.execute(
+        "SELECT id, extras FROM bill WHERE extras LIKE '%rtf_sha256%'"
+    ):
+        spilled[bill_id] = json.loads(extras).get("rtf_sha256", {})
+    store = TextStore(TEXT_STORE)
+
+    for bill_id, note, url, rtf in con.execute("""
+        SELECT billversion.bill_id, billversion.note, billversionlink.url,
+               billversionlink.text
+        FROM billversion JOIN billversionlink
+        ON billversionlink.version_id = billversion.id
+        """):
+        if not rtf:
+            # RTF too long to keep on the bill is in the scrapers' store
+            digest = spilled.get(bill_id, {}).get(note)
+            if digest is None or digest not in store:
+                continue
+            with store.open(digest) as f:
+                rtf = f.read()
+        yield bill_id, url, rtf_to_text(rtf)
+
+
+def build_index(con):
+    existing = set(tables(con, "%"))
+    con.execute("DROP TABLE IF EXISTS search")
+    con.execute(SEARCH_TABLE)
+    con.execute(
+        "INSERT INTO search (bill_id, source, url, text) "
+        "SELECT id, 'title', NULL, identifier || ' ' || title FROM bill"
+    )
+    if {"billversion", "billversionlink"} <= existing:
+        con.executemany(
+            "INSERT INTO search (bill_id, source, url, text) "
+            "VALUES (?, 'version', ?, ?)",
+            version_texts(con),
+        )
+    con.execute("""
+        INSERT INTO search (bill_id, source, url, text)
+        SELECT billdocument.bill_id, 'attachment', billdocumentlink.url,
+               attachmenttext.text
+        FROM billdocumentlink
+        JOIN billdocument ON billdocumentlink.document_id = billdocument.id
+        JOIN attachment ON attachment.url = billdocumentlink.url
+        JOIN attachmenttext ON attachmenttext.sha256 = attachment.sha256
+        WHERE attachmenttext.text != ''
+        """)
+    con.execute("INSERT INTO search (search) VALUES ('optimize')")
+    con.commit()
+
+
+def index(path, workers=DEFAULT_WORKERS):
+    con = sqlite3.connect(path)
+    con.row_factory = sqlite3.Row
+    try:
+        for pragma in PRAGMAS:
+            con.execute(pragma)
+        for statement in SCHEMA:
+            con.execute(statement)
+        existing = set(tables(con, "%"))
+        if {"billdocument", "billdocumentlink"} <= existing:
+            fetch_attachments(con, workers)
+        build_index(con)
+    finally:
+        con.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("database")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="number of attachments to fetch at once",
+    )
+    args = parser.parse_args()
+
+    logging.config.dictConfig(settings.LOGGING)
+    index(args.database, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Scraped objects as compressed NDJSON segments.
+
+pupa writes every object a scraper yields to a JSON file of its own, and
+its importers open the files one at a time to read them back. With
+`CMAP_SEGMENT_OBJECTS` set in pupa_settings.py, `SegmentOutputMixin` has
+the scrapers append their objects, a JSON line each, to a few
+gzip-compressed segment files per type instead:
+
+    _data/cmap/bill-CMAPBillScraper-0000.jsonl.gz
+    _data/cmap/bill-CMAPBillScraper-0001.jsonl.gz
+    _data/cmap/vote_event-CMAPBillScraper-0000.jsonl.gz
+
+A segment is started every `CMAP_SEGMENT_OBJECTS` objects, and only
+appears under its final name once it is complete, or once the scrape
+finishes; the one a failed scrape was writing is thrown away. pupa's importers
+don't read segments; load them with cmap.load:
+
+    pupa update cmap --scrape --fastmode
+    python -m cmap.load cmap.db --from _data/cmap people bills
+"""
+
+import glob
+import gzip
+import json
+import os
+
+from pupa import settings
+from pupa.utils import JSONEncoderPlus
+
+EXTENSION = ".jsonl.gz"
+
+# segments are written once and read once, so favor speed over size
+COMPRESS_LEVEL = 1
+
+
+class Scraped(object):
+    """An object read back from disk, in the shape the loader reads."""
+
+    def __init__(self, _type, data):
+        self._type = _type
+        self._data = data
+        self._related = []
+
+    def as_dict(self):
+        return self._data
+
+
+def segment_paths(directory, _type, label="*"):
+    pattern = os.path.join(directory, "{0}-{1}-*{2}".format(_type, label, EXTENSION))
+    return sorted(glob.glob(pattern))
+
+
+class SegmentWriter(object):
+    """
+    Appends objects to `directory` as segments of `size` objects each,
+    named for their type and `label`, which keeps the segments of
+    different scrapers apart.
+    """
+
+    def __init__(self, directory, label, size):
+        self.directory = directory
+        self.label = label
+        self.size = size
+        # type: [file, tmp path, path, objects written to it]
+        self._open = {}
+        self._serial = {}
+
+        # a scraper's segments from the last run would be read with its
+        # new ones
+        for path in segment_paths(directory, "*", label):
+            os.remove(path)
+
+    def write(self, _type, data):
+        if _type not in self._open:
+            serial = self._serial.get(_type, 0)
+            self._serial[_type] = serial + 1
+            path = os.path.join(
+                self.directory,
+                "{0}-{1}-{2:04d}{3}".format(_type, self.label, serial, EXTENSION),
+            )
+            tmp_path = path + ".tmp"
+            f = gzip.open(tmp_path, "wt", compresslevel=COMPRESS_LEVEL)
+            self._open[_type] = [f, tmp_path, path, 0]
+
+        segment = self._open[_type]
+        segment[0].write(json.dumps(data, cls=JSONEncoderPlus) + "\n")
+        segment[3] += 1
+        if segment[3] >= self.size:
+            self._finish(_type)
+
+    def _finish(self, _type):
+        f, tmp_path, path, _ = self._open.pop(_type)
+        f.close()
+        os.replace(tmp_path, path)
+
+    def close(self):
+        for _type in list(self._open):
+            self._finish(_type)
+
+    def discard(self):
+        """Throw away the segments still being written."""
+        for f, tmp_path, _, _ in self._open.values():
+            f.close()
+            os.remove(tmp_path)
+        self._open = {}
+
+
+def read_segments(directory, _type):
+    """Read back the objects of a type, in the order they were written."""
+    for path in segment_paths(directory, _type):
+        with gzip.open(path, "rt") as f:
+            for line in f:
+                yield Scraped(_type, json.loads(line))
+
+
+class SegmentOutputMixin(object):
+    """
+    Saves scraped objects to NDJSON segments, when `CMAP_SEGMENT_OBJECTS`
+    is set, rather than a JSON file each.
+    """
+
+    def do_scrape(self, **kwargs):
+        if not settings.CMAP_SEGMENT_OBJECTS:
+            return super().do_scrape(**kwargs)
+
+        self.segments = SegmentWriter(
+            self.datadir, type(self).__name__, settings.CMAP_SEGMENT_OBJECTS
+        )
+        try:
+            report = super().do_scrape(**kwargs)
+        except BaseException:
+            self.segments.discard()
+            raise
+        self.segments.close()
+        return report
+
+    def save_object(self, obj):
+        if not settings.CMAP_SEGMENT_OBJECTS:
+            return super().save_object(obj)
+
+        obj.pre_save(self.jurisdiction.jurisdiction_id)
+        self.segments.write(obj._type, obj.as_dict())
+        # pupa counts the objects of each type by their output names
+        self.output_names[obj._type].add(obj._id)
+
+        try:
+            obj.validate()
+        except ValueError as ve:
+            if self.strict_validation:
+                raise ve
+            else:
+                self.warning(ve)
+
+        for related in obj._related:
+            self.save_object(related)
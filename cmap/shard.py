@@ -0,0 +1,185 @@
+"""
+Scrape bills in several processes at once.
+
+The matter listing is split into shards by introduction date, one or
+more to each legislative session, and every shard is scraped by its own
+worker process, which writes what it scrapes to a file as JSON lines.
+The shards are then read back in order, whatever order they finished
+in, dropping any bill, person or organization an earlier shard already
+produced -- a matter edited while the scrape runs can move from one
+shard to another -- so the same data is always loaded the same way.
+
+    python -m cmap.load cmap.db --fastmode --processes 8
+
+Each worker has a rate limit of its own, as set in pupa_settings.py, so
+N processes together start at N times `CMAP_RATE_LIMIT` requests a
+second and stay within N times `CMAP_RATE_LIMIT_BOUNDS`: with the
+defaults, 8 processes start at 40 and go no faster than 160. Lower the
+settings, or use fewer processes, to go easier on Legistar.
+"""
+
+import collections
+import concurrent.futures
+import datetime
+import json
+import logging
+import logging.config
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from pupa import settings
+
+from . import CMAP
+from .bills import CHECKPOINT_FILE, WATERMARK_FILE, read_watermark, write_watermark
+from .load import as_json, scrape
+from .segments import Scraped
+
+logger = logging.getLogger("cmap.shard")
+
+# what makes two scraped objects the same
+NATURAL_KEYS = {
+    "organization": ("name", "classification", "parent_id"),
+    "person": ("name",),
+    "bill": ("legislative_session", "identifier"),
+}
+
+
+def shards(jurisdiction, count):
+    """
+    Split the legislative sessions into at least `count` ranges of
+    introduction dates, as (start, end) pairs of YYYY-MM-DD strings. The
+    first range has no start and the last no end, so every matter falls
+    in exactly one.
+    """
+    sessions = sorted(
+        jurisdiction.legislative_sessions, key=lambda session: session["start_date"]
+    )
+    starts = [datetime.date.fromisoformat(s["start_date"]) for s in sessions]
+    ends = starts[1:] + [datetime.date.fromisoformat(sessions[-1]["end_date"])]
+
+    parts = -(-count // len(sessions))
+    boundaries = set()
+    for start, end in zip(starts, ends):
+        step = (end - start) / parts
+        boundaries.update(start + step * i for i in range(parts))
+
+    edges = [None] + [day.isoformat() for day in sorted(boundaries)[1:]] + [None]
+    return list(zip(edges, edges[1:]))
+
+
+def start_worker():
+    logging.config.dictConfig(settings.LOGGING)
+
+
+def scrape_shard(scraper_name, kwargs, fastmode, path):
+    jurisdiction = CMAP()
+    scraper_class = jurisdiction.scrapers[scraper_name]
+    with tempfile.TemporaryDirectory() as datadir, open(path, "w") as f:
+        for obj in scrape(scraper_class, jurisdiction, datadir, fastmode, kwargs):
+            f.write(json.dumps([obj._type, as_json(obj)]) + "\n")
+    return path
+
+
+def scrape_sharded(jurisdiction, kwargs, fastmode, processes, workdir):
+    """
+    Scrape bills with `processes` worker processes, yielding what they
+    scraped, shard by shard, as each shard and those before it finish.
+    """
+    watermark = kwargs.get("watermark", WATERMARK_FILE)
+    checkpoint, extension = os.path.splitext(kwargs.get("checkpoint", CHECKPOINT_FILE))
+
+    jobs = []
+    for i, (start, end) in enumerate(shards(jurisdiction, processes)):
+        # each shard starts from the watermark, and keeps its own
+        shard_watermark = os.path.join(workdir, "watermark-{0}.json".format(i))
+        if os.path.exists(watermark):
+            shutil.copyfile(watermark, shard_watermark)
+        shard_kwargs = dict(
+            kwargs,
+            introduced_from=start,
+            introduced_before=end,
+            watermark=shard_watermark,
+            shard=True,
+            # shards resume on their own, so the same number of processes
+            # picks up where a sharded scrape left off
+            checkpoint="{0}-{1}{2}".format(checkpoint, i, extension),
+        )
+        path = os.path.join(workdir, "shard-{0}.jsonl".format(i))
+        jobs.append((shard_kwargs, path))
+
+    logger.info("scraping bills in %d shards with %d processes", len(jobs), processes)
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=start_worker,
+    )
+    try:
+        futures = [
+            executor.submit(scrape_shard, "bills", shard_kwargs, fastmode, path)
+            for shard_kwargs, path in jobs
+        ]
+        merger = Merger()
+        for future in futures:
+            yield from merger.merge(future.result())
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+    high_waters = [
+        read_watermark(shard_kwargs["watermark"]) for shard_kwargs, _ in jobs
+    ]
+    high_waters = [high_water for high_water in high_waters if high_water]
+    if high_waters:
+        write_watermark(watermark, max(high_waters))
+
+
+class Merger(object):
+    """
+    Reads shards in turn, dropping the objects an earlier one already
+    had, along with the vote events of dropped bills.
+    """
+
+    def __init__(self):
+        self.seen = {}
+        # the _ids of dropped objects, and the _ids of the ones kept
+        # in their place
+        self.same = {}
+
+    def merge(self, path):
+        votes = collections.defaultdict(list)
+        with open(path) as f:
+            for line in f:
+                _type, data = json.loads(line)
+                for field, value in data.items():
+                    if isinstance(value, str) and value in self.same:
+                        data[field] = self.same[value]
+
+                bill = data.get("bill") if _type == "vote_event" else None
+                if bill and not bill.startswith("~"):
+                    # bill scrapers yield a bill's vote events before it
+                    votes[bill].append(data)
+                    continue
+
+                if _type in NATURAL_KEYS:
+                    key = (_type,) + tuple(data[k] for k in NATURAL_KEYS[_type])
+                    if key in self.seen:
+                        self.same[data["_id"]] = self.seen[key]
+                        dropped = votes.pop(data["_id"], [])
+                        logger.info(
+                            "dropping %s %s, scraped by an earlier shard, "
+                            "and its %d vote events",
+                            _type,
+                            key[1:],
+                            len(dropped),
+                        )
+                        continue
+                    self.seen[key] = data["_id"]
+
+                yield Scraped(_type, data)
+                for vote_event in votes.pop(data["_id"], []):
+                    yield Scraped("vote_event", vote_event)
+
+        for vote_events in votes.values():
+            for vote_event in vote_events:
+                yield Scraped("vote_event", vote_event)
@@ -0,0 +1,418 @@
+"""
+Streaming handling of matter texts.
+
+A matter text is a JSON object whose MatterTextRtf and MatterTextPlain
+strings can run to tens of megabytes. `read_text` walks the response body
+a chunk at a time, keeping only the small fields it is asked for, handing
+the long strings it is asked for to sinks and skipping everything else, so
+memory use does not grow with the size of the text.
+
+A `TextSink` writes a string to a content-addressed `TextStore` as it
+arrives, so identical texts are stored only once, under their digest.
+`TextStore.prune` drops the texts nothing refers to any more.
+
+`rtf_to_text` turns a matter's RTF into the plain text it shows.
+"""
+
+import codecs
+import glob
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+CHUNK_SIZE = 64 * 1024
+
+# runs of string content, up to a quote or an escape split between chunks
+STRING_RUN = re.compile(r'(?:[^"\\]|\\["\\/bfnrt]|\\u[0-9a-fA-F]{4})*')
+LOOSE_STRING_RUN = re.compile(r'(?:[^"\\]|\\.)*', re.DOTALL)
+HIGH_SURROGATE = re.compile(r"(?<!\\)(?:\\\\)*(\\u[dD][89abAB][0-9a-fA-F]{2})$")
+VALUE_SPECIAL = re.compile(r'["{}\[\],]')
+WHITESPACE = re.compile(r"\s*")
+KEY = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+
+class TextStore(object):
+    """Files named by the SHA-256 digest of their UTF-8 contents."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def __contains__(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def open(self, digest):
+        return open(self.path(digest), encoding="utf-8", errors="surrogatepass")
+
+    def tempfile(self):
+        os.makedirs(self.root, exist_ok=True)
+        return tempfile.NamedTemporaryFile(
+            "w",
+            encoding="utf-8",
+            errors="surrogatepass",
+            dir=self.root,
+            suffix=".tmp",
+            delete=False,
+        )
+
+    def add(self, digest, tmp_path):
+        path = self.path(digest)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+
+    def prune(self, keep):
+        """Remove the texts whose digests aren't in `keep`, returning how many."""
+        removed = 0
+        for path in glob.glob(os.path.join(self.root, "??", "*")):
+            if os.path.basename(path) not in keep:
+                os.remove(path)
+                removed += 1
+        return removed
+
+
+class TextSink(object):
+    """
+    Streams a string into `store`. Once closed, `digest` holds its
+    SHA-256, which the store keeps it under if it isn't empty, and
+    `length` its length in characters.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+        self.digest = None
+        self.length = 0
+
+        self._file = None
+        self._hash = hashlib.sha256()
+
+    def write(self, text):
+        if self._file is None:
+            self._file = self.store.tempfile()
+        self._hash.update(text.encode("utf-8", "surrogatepass"))
+        self._file.write(text)
+        self.length += len(text)
+
+    def close(self):
+        self.digest = self._hash.hexdigest()
+        if self._file is not None:
+            self._file.close()
+            self.store.add(self.digest, self._file.name)
+
+    def discard(self):
+        """Throw away what was written, if the string never ended."""
+        if self._file is not None and self.digest is None:
+            self._file.close()
+            os.remove(self._file.name)
+
+
+def read_text(chunks, fields, sinks):
+    """
+    Parse the JSON object in `chunks`, an iterable of bytes, returning a
+    dictionary of its top-level `fields`. String values of the keys in
+    `sinks` are written to those sinks as they arrive, rather than
+    returned. All other values are skipped.
+    """
+    reader = TextReader(fields, sinks)
+    for chunk in chunks:
+        reader.feed(chunk)
+    return reader.close()
+
+
+class TextReader(object):
+    """`read_text`, for bodies that arrive a chunk at a time by other means."""
+
+    def __init__(self, fields, sinks):
+        self._parser = ObjectParser(fields, sinks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def feed(self, chunk):
+        self._parser.feed(self._decoder.decode(chunk))
+
+    def close(self):
+        self._parser.feed(self._decoder.decode(b"", final=True))
+        return self._parser.close()
+
+
+class ObjectParser(object):
+    """
+    An incremental parser for one flat JSON object. Each state method
+    consumes what it can from the buffer, and returns False when it needs
+    more input to make progress.
+    """
+
+    def __init__(self, fields, sinks):
+        self.fields = fields
+        self.sinks = sinks
+        self.result = {}
+
+        self._buffer = ""
+        self._state = self._start
+        self._key = None
+
+        self._keep = False
+        self._raw = []
+        self._depth = 0
+        self._in_string = False
+
+    def feed(self, text):
+        self._buffer += text
+        while self._buffer and self._state():
+            pass
+
+    def close(self):
+        if self._state != self._done:
+            raise ValueError("incomplete JSON object")
+        return self.result
+
+    def _skip_whitespace(self):
+        end = WHITESPACE.match(self._buffer).end()
+        self._buffer = self._buffer[end:]
+        return bool(self._buffer)
+
+    def _expect(self, expected):
+        char = self._buffer[0]
+        if char not in expected:
+            raise ValueError("unexpected {0!r} in JSON object".format(char))
+        self._buffer = self._buffer[1:]
+        return char
+
+    def _start(self):
+        if not self._skip_whitespace():
+            return False
+        self._expect("{")
+        self._state = self._key_or_end
+        return True
+
+    def _key_or_end(self):
+        if not self._skip_whitespace():
+            return False
+        if self._buffer[0] == "}":
+            self._buffer = self._buffer[1:]
+            self._state = self._done
+            return True
+
+        match = KEY.match(self._buffer)
+        if match is None:
+            if self._buffer[0] != '"':
+                raise ValueError("expected a key in JSON object")
+            return False
+        self._key = json.loads(match.group(0))
+        self._buffer = self._buffer[match.end() :]
+        self._state = self._colon
+        return True
+
+    def _colon(self):
+        if not self._skip_whitespace():
+            return False
+        self._expect(":")
+        self._state = self._value
+        return True
+
+    def _value(self):
+        if not self._skip_whitespace():
+            return False
+        if self._key in self.sinks and self._buffer[0] == '"':
+            self._buffer = self._buffer[1:]
+            self._state = self._stream_string
+        else:
+            self._keep = self._key in self.fields or self._key in self.sinks
+            self._raw = []
+            self._depth = 0
+            self._in_string = False
+            self._state = self._scan_value
+        return True
+
+    def _scan_value(self):
+        buffer = self._buffer
+        i = 0
+        complete = False
+        while i < len(buffer):
+            if self._in_string:
+                j = LOOSE_STRING_RUN.match(buffer, i).end()
+                if j == len(buffer) or buffer[j] != '"':
+                    i = j
+                    break
+                self._in_string = False
+                i = j + 1
+                if self._depth == 0:
+                    complete = True
+                    break
+            else:
+                match = VALUE_SPECIAL.search(buffer, i)
+                if match is None:
+                    i = len(buffer)
+                    break
+                j = match.start()
+                char = buffer[j]
+                if char == '"':
+                    self._in_string = True
+                    i = j + 1
+                elif char in "{[":
+                    self._depth += 1
+                    i = j + 1
+                elif char in "}]" and self._depth > 0:
+                    self._depth -= 1
+                    i = j + 1
+                elif self._depth == 0:
+                    i = j
+                    complete = True
+                    break
+                else:
+                    i = j + 1
+
+        if self._keep:
+            self._raw.append(buffer[:i])
+        self._buffer = buffer[i:]
+
+        if complete:
+            if self._keep:
+                self.result[self._key] = json.loads("".join(self._raw))
+            self._raw = []
+            self._state = self._after_value
+            return True
+
+        # stuck on an escape split between chunks
+        return i > 0
+
+    def _stream_string(self):
+        buffer = self._buffer
+        sink = self.sinks[self._key]
+
+        end = STRING_RUN.match(buffer).end()
+        closed = end < len(buffer) and buffer[end] == '"'
+        if not closed:
+            if len(buffer) - end >= 6:
+                raise ValueError("invalid escape in JSON string")
+            # keep a high surrogate together with the low one after it
+            surrogate = HIGH_SURROGATE.search(buffer, 0, end)
+            if surrogate is not None:
+                end = surrogate.start(1)
+
+        if end:
+            sink.write(json.loads('"' + buffer[:end] + '"'))
+
+        if closed:
+            sink.close()
+            self._buffer = buffer[end + 1 :]
+            self._state = self._after_value
+            return True
+
+        self._buffer = buffer[end:]
+        return False
+
+    def _after_value(self):
+        if not self._skip_whitespace():
+            return False
+        if self._expect(",}") == "}":
+            self._state = self._done
+        else:
+            self._state = self._key_or_end
+        return True
+
+    def _done(self):
+        if self._skip_whitespace():
+            raise ValueError("unexpected data after JSON object")
+        return False
+
+
+RTF_TOKEN = re.compile(
+    r"\\([a-z]{1,32})(-?\d{1,10})? ?|\\'([0-9a-f]{2})|\\([^a-z])|([{}])|[\r\n]+"
+    r"|([^\\{}\r\n]+)",
+    re.IGNORECASE,
+)
+
+# groups whose contents aren't part of the text
+RTF_DESTINATIONS = {
+    "colortbl",
+    "datastore",
+    "fonttbl",
+    "footer",
+    "header",
+    "info",
+    "latentstyles",
+    "listoverridetable",
+    "listtable",
+    "pict",
+    "rsidtbl",
+    "stylesheet",
+    "themedata",
+    "xmlnstbl",
+}
+
+RTF_SYMBOLS = {
+    "par": "\n",
+    "line": "\n",
+    "row": "\n",
+    "sect": "\n\n",
+    "page": "\n\n",
+    "tab": "\t",
+    "cell": " ",
+    "bullet": "\u2022",
+    "emdash": "\u2014",
+    "endash": "\u2013",
+    "lquote": "\u2018",
+    "rquote": "\u2019",
+    "ldblquote": "\u201c",
+    "rdblquote": "\u201d",
+}
+
+
+def rtf_to_text(rtf):
+    """The text of an RTF document, without its formatting."""
+    text = []
+    stack = []
+    ignorable = False
+    # characters standing in for the last \u character, and how many of
+    # them are still to be skipped
+    fallback = 1
+    skipping = 0
+    for match in RTF_TOKEN.finditer(rtf):
+        word, argument, hex_code, symbol, brace, run = match.groups()
+        if run is not None:
+            run = run[skipping:]
+            skipping = 0
+            if not ignorable:
+                text.append(run)
+        elif hex_code is not None:
+            if skipping:
+                skipping -= 1
+            elif not ignorable:
+                text.append(bytes([int(hex_code, 16)]).decode("cp1252", "replace"))
+        elif brace == "{":
+            skipping = 0
+            stack.append((fallback, ignorable))
+        elif brace == "}":
+            skipping = 0
+            if stack:
+                fallback, ignorable = stack.pop()
+        elif symbol is not None:
+            skipping = 0
+            if symbol == "*":
+                ignorable = True
+            elif not ignorable and symbol in "\\{}":
+                text.append(symbol)
+            elif not ignorable and symbol == "~":
+                text.append("\xa0")
+        elif word is not None:
+            skipping = 0
+            if word in RTF_DESTINATIONS:
+                ignorable = True
+            elif ignorable:
+                continue
+            elif word == "uc":
+                fallback = int(argument or 1)
+            elif word == "u":
+                code = int(argument or 0)
+                text.append(chr(code + 0x10000 if code < 0 else code))
+                skipping = fallback
+            elif word in RTF_SYMBOLS:
+                text.append(RTF_SYMBOLS[word])
+    return "".join(text)
@@ -0,0 +1,8 @@
+"""Helpers shared by the scrapers and the tools around them."""
+
+
+def flag(value):
+    # scrape arguments arrive from the pupa command line as strings
+    if isinstance(value, str):
+        return value.lower() in {"1", "true", "yes", "on"}
+    return bool(value)
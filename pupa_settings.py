@@ -1 +1,34 @@
+import os
+
 USE_TZ = True
+
+# persistent state for incremental runs
+CMAP_STATE_DIR = os.path.join(os.getcwd(), "_state")
+
+# persistent cache of Legistar API responses, shared by all the scrapers
+# (see cmap/cache.py); set to None to turn it off
+CMAP_HTTP_CACHE = os.path.join(CMAP_STATE_DIR, "http_cache.sqlite")
+CMAP_HTTP_CACHE_MAX_BYTES = 2 * 1024**3
+
+# one adaptive rate limit shared by every scraper (see cmap/ratelimit.py),
+# starting at this many requests a second and staying within the bounds,
+# even in --fastmode; set to None to leave throttling to scrapelib (failed
+# requests are retried the same way either way)
+CMAP_RATE_LIMIT = 5
+CMAP_RATE_LIMIT_BOUNDS = (1, 20)
+CMAP_RATE_LIMIT_TARGET_LATENCY = 1.0
+
+# fetch what each matter needs on one event loop, with at most this many
+# requests in flight (see cmap/aio.py), rather than with a thread per
+# request; None keeps the threads
+CMAP_ASYNC_CONCURRENCY = None
+
+# per-route request metrics and stage timings, one JSON report per scrape
+# appended to this file (see cmap/metrics.py); set to None to turn it off
+CMAP_METRICS_REPORT = os.path.join(CMAP_STATE_DIR, "metrics.jsonl")
+
+# write scraped objects to gzipped NDJSON segments of this many objects
+# each, for `python -m cmap.load --from`, instead of a JSON file apiece
+# (see cmap/segments.py); None keeps pupa's files, which `pupa update`
+# imports
+CMAP_SEGMENT_OBJECTS = None
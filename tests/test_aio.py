@@ -0,0 +1,191 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import scrapelib
+from pupa import settings
+
+from benchmarks.fake_legistar import Dataset, FakeLegistar
+from cmap import CMAP
+from cmap.aio import AsyncLegistarClient
+from cmap.bills import CMAPBillScraper
+from cmap.people import CMAPPersonScraper
+from cmap.ratelimit import RateLimitMixin
+from cmap.texts import TextReader, TextSink, TextStore
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, status, body=b"", **headers):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name.replace("_", "-"), value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            hits = server.hits[self.path]
+            server.in_flight += 1
+            server.most_in_flight = max(server.most_in_flight, server.in_flight)
+        try:
+            if self.path.startswith("/v1/cmap/slow/"):
+                time.sleep(0.05)
+                self.send(200, b"[]")
+            elif self.path == "/v1/cmap/flaky" and hits == 1:
+                self.send(503, Retry_After="0")
+            elif self.path == "/v1/cmap/flaky":
+                self.send(200, b'[{"Id": 1}]')
+            elif self.path == "/v1/cmap/text":
+                body = json.dumps({"MatterTextId": 3, "MatterTextRtf": "x" * 100000})
+                self.send(200, body.encode())
+            else:
+                self.send(404, b"{}")
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.lock = threading.Lock()
+        self.hits = {}
+        self.in_flight = 0
+        self.most_in_flight = 0
+
+
+class Scraper(RateLimitMixin, scrapelib.Scraper):
+    metrics = None
+
+
+def serve(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return "http://{0}:{1}".format(*server.server_address)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "CMAP_RATE_LIMIT", None)
+    monkeypatch.setattr(settings, "CMAP_HTTP_CACHE", None)
+
+    server = Server()
+    url = serve(server)
+    scraper = Scraper(requests_per_minute=0, retry_attempts=2, retry_wait_seconds=0)
+    scraper.BASE_URL = url + "/v1/cmap"
+    client = AsyncLegistarClient(scraper, 3)
+    client.server = server
+    yield client
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+
+def run(client, coroutine):
+    return client.submit(coroutine).result()
+
+
+def test_requests_in_flight_are_capped(client):
+    async def many():
+        return await asyncio.gather(
+            *(
+                client.json(client.scraper.BASE_URL + "/slow/" + str(i))
+                for i in range(12)
+            )
+        )
+
+    start = time.monotonic()
+    assert run(client, many()) == [[]] * 12
+    # three at a time, not one, and not all twelve
+    assert time.monotonic() - start < 12 * 0.05
+    assert client.server.most_in_flight == 3
+
+
+def test_retries(client):
+    items = run(client, client.json(client.scraper.BASE_URL + "/flaky"))
+    assert items == [{"Id": 1}]
+    assert client.server.hits["/v1/cmap/flaky"] == 2
+
+
+def test_errors_are_raised_as_scrapelib_does(client):
+    with pytest.raises(scrapelib.HTTPError) as error:
+        run(client, client.get(client.scraper.BASE_URL + "/missing"))
+    assert error.value.response.status_code == 404
+
+
+def test_bodies_are_read_a_chunk_at_a_time(client, tmp_path):
+    rtf = TextSink(TextStore(str(tmp_path)))
+    reader = TextReader({"MatterTextId"}, {"MatterTextRtf": rtf})
+    response = run(
+        client, client.get(client.scraper.BASE_URL + "/text", read=reader.feed)
+    )
+    assert reader.close() == {"MatterTextId": 3}
+    assert rtf.length == 100000
+    # nothing was kept on the response
+    assert response.content == b""
+
+
+def scrape(scraper_class, tmp_path, url, concurrency):
+    state = tmp_path / str(concurrency)
+    scraper = scraper_class(CMAP(), str(state))
+    scraper.BASE_URL = url + "/v1/cmap"
+    scraper.BASE_WEB_URL = scraper.WEB_URL = url
+    scraper.requests_per_minute = 0
+
+    kwargs = {}
+    if scraper_class is CMAPBillScraper:
+        scraper.text_store = TextStore(str(state / "texts"))
+        kwargs = {
+            "watermark": str(state / "watermark.json"),
+            "checkpoint": str(state / "checkpoint.jsonl"),
+        }
+
+    settings.CMAP_ASYNC_CONCURRENCY = concurrency
+    objects = []
+    for obj in scraper.scrape(**kwargs):
+        obj = obj.as_dict()
+        obj.pop("_id", None)
+        obj.pop("bill", None)
+        objects.append(obj)
+    return objects
+
+
+@pytest.mark.parametrize(
+    "scraper_class, bulk",
+    [(CMAPBillScraper, False), (CMAPBillScraper, True), (CMAPPersonScraper, False)],
+)
+def test_async_scrape_matches_threads(tmp_path, monkeypatch, scraper_class, bulk):
+    monkeypatch.setattr(settings, "CMAP_RATE_LIMIT", None)
+    monkeypatch.setattr(settings, "CMAP_HTTP_CACHE", None)
+    monkeypatch.setattr(settings, "CMAP_METRICS_REPORT", None)
+    monkeypatch.setattr(settings, "CMAP_SEGMENT_OBJECTS", None)
+    monkeypatch.setattr(settings, "CMAP_ASYNC_CONCURRENCY", None)
+    monkeypatch.setattr(settings, "CACHE_DIR", None)
+
+    server = FakeLegistar(("127.0.0.1", 0), Dataset(30, 500), bulk=bulk)
+    url = serve(server)
+    try:
+        threaded = scrape(scraper_class, tmp_path, url, None)
+        threaded_requests = server.stats()["requests"]
+        gathered = scrape(scraper_class, tmp_path, url, 8)
+        gathered_requests = server.stats()["requests"] - threaded_requests
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert len(gathered) == len(threaded) > 5
+    assert gathered == threaded
+    assert gathered_requests == threaded_requests
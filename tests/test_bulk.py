@@ -0,0 +1,176 @@
+import re
+
+import pytest
+import requests
+
+from cmap.bulk import BulkPrefetcher, EventVotes, probe
+
+SPONSORS = "/matters/{0}/sponsors"
+HISTORIES = "/matters/{0}/histories"
+
+
+class Response(object):
+    def __init__(self, items, status_code=200):
+        self.items = items
+        self.status_code = status_code
+
+    def json(self):
+        return self.items
+
+
+class Scraper(object):
+    """Serves flat collections, and records what was asked of them."""
+
+    BASE_URL = "http://legistar/v1/cmap"
+
+    def __init__(self, collections):
+        self.collections = collections
+        self.requests = []
+
+    def info(self, message):
+        pass
+
+    def get(self, url, params=None):
+        collection = url[len(self.BASE_URL) :]
+        if collection not in self.collections:
+            response = requests.Response()
+            response.status_code = 404
+            raise requests.HTTPError(response=response)
+        return Response(self.collections[collection][: params["$top"]])
+
+    def pages(self, url, params=None, item_key=None):
+        collection = url[len(self.BASE_URL) :]
+        self.requests.append((collection, params))
+        wanted = {int(value) for value in re.findall(r"eq (\d+)", params["$filter"])}
+        key = params["$filter"].split()[0]
+        items = [item for item in self.collections[collection] if item[key] in wanted]
+        return sorted(items, key=lambda item: item[item_key])
+
+
+def sponsor(sponsor_id, matter_id, sequence):
+    return {
+        "MatterSponsorId": sponsor_id,
+        "MatterSponsorMatterId": matter_id,
+        "MatterSponsorSequence": sequence,
+    }
+
+
+def ids(sponsors):
+    return [item["MatterSponsorId"] for item in sponsors]
+
+
+@pytest.mark.parametrize(
+    "items, available",
+    [
+        ([sponsor(1, 1, 0)], True),
+        ([{"MatterSponsorId": 1}], False),
+        # nothing to show the items say which matter they belong to
+        ([], False),
+    ],
+)
+def test_probe(items, available):
+    scraper = Scraper({"/mattersponsors": items})
+    assert probe(scraper, "/mattersponsors", "MatterSponsorMatterId") is available
+
+
+def test_missing_collections_are_fetched_per_matter():
+    scraper = Scraper({"/mattersponsors": [sponsor(1, 1, 0)]})
+    assert BulkPrefetcher(scraper, 10).available == [SPONSORS]
+
+
+def test_items_are_grouped_by_matter_in_their_route_order():
+    scraper = Scraper(
+        {
+            "/mattersponsors": [
+                sponsor(1, 10, 1),
+                sponsor(2, 20, 0),
+                sponsor(3, 10, 0),
+                sponsor(4, 30, 0),
+            ]
+        }
+    )
+    prefetcher = BulkPrefetcher(scraper, 10)
+    prefetcher.prefetch([10, 20, 40])
+
+    assert ids(prefetcher.get(SPONSORS, 10)) == [3, 1]
+    assert ids(prefetcher.get(SPONSORS, 20)) == [2]
+    # a matter with nothing in the collection has nothing, rather than
+    # being fetched again
+    assert prefetcher.get(SPONSORS, 40) == []
+
+    # handed over once, and only for the matters prefetched
+    assert prefetcher.get(SPONSORS, 10) is None
+    assert prefetcher.get(SPONSORS, 30) is None
+    assert prefetcher.get(HISTORIES, 20) is None
+
+
+def test_matters_are_prefetched_in_batches_unless_skipped():
+    scraper = Scraper({"/mattersponsors": [sponsor(i, i, 0) for i in range(1, 6)]})
+    prefetcher = BulkPrefetcher(scraper, 2)
+    matters = [{"MatterId": i} for i in range(1, 6)]
+
+    filled = prefetcher.fill(iter(matters), skip=lambda matter: matter["MatterId"] == 2)
+    assert list(filled) == matters
+    assert [params["$filter"] for _, params in scraper.requests] == [
+        "MatterSponsorMatterId eq 1",
+        "MatterSponsorMatterId eq 3 or MatterSponsorMatterId eq 4",
+        "MatterSponsorMatterId eq 5",
+    ]
+    assert prefetcher.get(SPONSORS, 2) is None
+
+
+class EventScraper(Scraper):
+    """Serves the /votes collection, an event's items and per-item votes."""
+
+    def __init__(self, votes, eventitems):
+        super().__init__({"/votes": votes})
+        self.eventitems = eventitems
+        self.item_votes = []
+
+    def endpoint(self, route, event_id):
+        self.requests.append((route.format(event_id), None))
+        return self.eventitems[event_id]
+
+    def votes(self, history_id):
+        self.item_votes.append(history_id)
+        return [{"VoteId": 0}]
+
+
+def vote(vote_id, item_id):
+    return {"VoteId": vote_id, "VoteEventItemId": item_id}
+
+
+def test_votes_are_fetched_a_whole_event_at_a_time():
+    scraper = EventScraper(
+        [vote(1, 11), vote(2, 11), vote(3, 12), vote(4, 21)],
+        {
+            1: [
+                {"EventItemId": 11, "EventItemRollCallFlag": 1},
+                {"EventItemId": 12, "EventItemRollCallFlag": 1},
+                {"EventItemId": 13, "EventItemRollCallFlag": 0},
+            ]
+        },
+    )
+    event_votes = EventVotes(scraper, 50, 10)
+
+    assert event_votes.get(1, 11) == [vote(1, 11), vote(2, 11)]
+    assert event_votes.get(1, 12) == [vote(3, 12)]
+    # the event's items and votes were asked for once
+    assert [route for route, _ in scraper.requests] == [
+        "/events/1/eventitems",
+        "/votes",
+    ]
+
+    # an item that isn't a roll call, and an unknown event, are asked for
+    # on their own
+    assert event_votes.get(1, 13) == [{"VoteId": 0}]
+    assert event_votes.get(None, 14) == [{"VoteId": 0}]
+    assert scraper.item_votes == [13, 14]
+
+
+def test_votes_are_fetched_per_item_without_the_collection():
+    scraper = EventScraper([], {1: [{"EventItemId": 11, "EventItemRollCallFlag": 1}]})
+    event_votes = EventVotes(scraper, 50, 10)
+
+    assert event_votes.get(1, 11) == [{"VoteId": 0}]
+    assert scraper.item_votes == [11]
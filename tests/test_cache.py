@@ -0,0 +1,109 @@
+import pytest
+import requests
+from pupa import settings
+
+from cmap import cache
+from cmap.cache import DAY, HOUR, HTTPCacheMixin, ResponseCache, route_ttl
+
+API = "https://webapi.legistar.com/v1/cmap"
+
+
+@pytest.mark.parametrize(
+    "url, ttl",
+    [
+        (API + "/matters/1/texts/2", 30 * DAY),
+        ("https://cmap.legistar.com/gateway.aspx?M=F&ID=1", 30 * DAY),
+        (API + "/eventitems/3/votes", HOUR),
+        (API + "/bodies", DAY),
+        (API + "/persons/4", DAY),
+        (API + "/matters/1/histories", HOUR),
+        (API + "/matters/1/versions", HOUR),
+        # the listing is how a run finds what changed
+        (API + "/matters?$top=1000", 0),
+        (API + "/matters/1", 0),
+        (API + "/events", 0),
+    ],
+)
+def test_route_ttl(url, ttl):
+    assert route_ttl(url) == ttl
+
+
+def response(url, status=200, body=b"[]", **headers):
+    r = requests.Response()
+    r.url = url
+    r.status_code = status
+    r.headers = requests.structures.CaseInsensitiveDict(headers)
+    r._content = body
+    r._content_consumed = True
+    return r
+
+
+class Upstream(object):
+    """Stands in for scrapelib, answering from `responses` by URL."""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    def request(self, method, url, params=None, headers=None, **kwargs):
+        self.requests.append((url, dict(headers or {})))
+        status, body, response_headers = self.responses[url]
+        if headers and headers.get("If-None-Match") == response_headers.get("ETag"):
+            return response(url, 304, b"")
+        return response(url, status, body, **response_headers)
+
+
+class Scraper(HTTPCacheMixin, Upstream):
+    pass
+
+
+@pytest.fixture
+def scraper(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CMAP_HTTP_CACHE", str(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(cache, "_caches", {})
+    return Scraper(
+        {
+            API + "/matters/1/texts/2": (200, b'{"MatterTextId": 2}', {}),
+            API + "/matters": (200, b"[1]", {"ETag": '"v1"'}),
+            API + "/events": (200, b"[2]", {}),
+        }
+    )
+
+
+def test_fresh_routes_are_answered_from_the_cache(scraper):
+    first = scraper.request("GET", API + "/matters/1/texts/2")
+    second = scraper.request("GET", API + "/matters/1/texts/2")
+
+    assert len(scraper.requests) == 1
+    assert second.fromcache
+    assert second.content == first.content
+
+
+def test_routes_without_a_ttl_are_revalidated(scraper):
+    scraper.request("GET", API + "/matters")
+    again = scraper.request("GET", API + "/matters")
+
+    assert scraper.requests[1] == (API + "/matters", {"If-None-Match": '"v1"'})
+    assert again.fromcache
+    assert again.content == b"[1]"
+
+
+def test_routes_without_a_ttl_or_validators_are_not_kept(scraper):
+    scraper.request("GET", API + "/events")
+    again = scraper.request("GET", API + "/events")
+
+    assert len(scraper.requests) == 2
+    assert not getattr(again, "fromcache", False)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    store = ResponseCache(str(tmp_path / "cache.sqlite"), 25)
+    for i in range(3):
+        url = API + "/matters/{0}/texts/1".format(i)
+        store.store(store.writer("GET " + url, url, response(url)), b"x" * 10)
+        # the first is read again, so the second is the one to go
+        store.response(store.lookup("GET " + API + "/matters/0/texts/1"))
+
+    assert store.lookup("GET " + API + "/matters/0/texts/1") is not None
+    assert store.lookup("GET " + API + "/matters/1/texts/1") is None
+    assert store.lookup("GET " + API + "/matters/2/texts/1") is not None
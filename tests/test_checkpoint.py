@@ -0,0 +1,151 @@
+import json
+import os
+
+from pupa import settings
+
+from cmap import CMAP
+from cmap.bills import CMAPBillScraper, Checkpoint
+from cmap.texts import TextSink, TextStore
+
+
+def matter(matter_id, modified="2024-01-01T00:00:00"):
+    return {"MatterId": matter_id, "MatterLastModifiedUtc": modified}
+
+
+def stored_text(store, rtf):
+    sink = TextSink(store)
+    sink.write(rtf)
+    sink.close()
+    return {
+        "MatterTextId": 7,
+        "MatterTextVersion": "1",
+        "MatterTextRtfSha256": sink.digest,
+        "MatterTextRtfLength": sink.length,
+        "url": "http://example.com/matters/1/texts/7",
+    }
+
+
+def details(text):
+    return {
+        "actions": [
+            (
+                {"description": "approved", "date": "2024-01-02"},
+                (
+                    "pass",
+                    [{"VoteId": 3, "VoteValueName": "Aye", "VotePersonName": "Pat"}],
+                ),
+            )
+        ],
+        "sponsorships": [{"name": "Pat", "primary": True}],
+        "topics": [{"MatterIndexId": 4, "MatterIndexName": "Transit"}],
+        "attachments": [
+            {
+                "MatterAttachmentId": 5,
+                "MatterAttachmentName": "Memo",
+                "MatterAttachmentHyperlink": "http://example.com/memo.pdf",
+            }
+        ],
+        "related_matters": [
+            {
+                "MatterFile": "23-001",
+                "MatterIntroDate": "2023-01-01",
+                "MatterTitle": "A",
+            }
+        ],
+        "texts": [text],
+    }
+
+
+def save(checkpoint, matter, details):
+    checkpoint.save(matter, checkpoint.entry(matter, details))
+
+
+def test_keeps_only_what_bills_need(tmp_path):
+    store = TextStore(str(tmp_path / "texts"))
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.jsonl"), 60)
+    save(checkpoint, matter(1), details(stored_text(store, "{\\rtf1 Text}")))
+    checkpoint.close()
+
+    kept = Checkpoint(str(tmp_path / "checkpoint.jsonl"), 60).get(matter(1))
+    assert kept["actions"] == [
+        [
+            {"description": "approved", "date": "2024-01-02"},
+            ["pass", [{"VoteValueName": "Aye", "VotePersonName": "Pat"}]],
+        ]
+    ]
+    assert kept["topics"] == [{"MatterIndexName": "Transit"}]
+    assert kept["related_matters"] == [
+        {"MatterFile": "23-001", "MatterIntroDate": "2023-01-01"}
+    ]
+    assert "rtf" not in json.dumps(kept["texts"])
+
+
+def test_resumes_from_truncated_checkpoint(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    store = TextStore(str(tmp_path / "texts"))
+    text = stored_text(store, "{\\rtf1 Text}")
+
+    checkpoint = Checkpoint(path, 60)
+    save(checkpoint, matter(1), details(text))
+    save(checkpoint, matter(2), details(text))
+    checkpoint.close()
+    with open(path, "ab") as f:
+        entry = checkpoint.entry(matter(3), details(text)).encode()
+        f.write(entry[: len(entry) // 2])
+
+    resumed = Checkpoint(path, 60)
+    assert len(resumed) == 2
+    assert matter(1) in resumed and matter(2) in resumed
+    assert matter(3) not in resumed
+
+    save(resumed, matter(3), details(text))
+    resumed.close()
+
+    again = Checkpoint(path, 60)
+    assert len(again) == 3
+    assert again.get(matter(3))["topics"] == [{"MatterIndexName": "Transit"}]
+
+
+def test_changed_matters_are_not_resumed(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    store = TextStore(str(tmp_path / "texts"))
+    checkpoint = Checkpoint(path, 60)
+    save(checkpoint, matter(1), details(stored_text(store, "{\\rtf1 Text}")))
+    checkpoint.close()
+
+    resumed = Checkpoint(path, 60)
+    assert resumed.get(matter(1, "2024-02-01T00:00:00")) is None
+
+
+def test_old_checkpoints_are_ignored(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    store = TextStore(str(tmp_path / "texts"))
+    checkpoint = Checkpoint(path, 60)
+    save(checkpoint, matter(1), details(stored_text(store, "{\\rtf1 Text}")))
+    checkpoint.close()
+
+    assert len(Checkpoint(path, 0)) == 0
+
+
+def test_restore_needs_the_texts_in_the_store(tmp_path, monkeypatch):
+    # scrapelib would make its cache directory in the working directory
+    monkeypatch.setattr(settings, "CACHE_DIR", None)
+
+    path = str(tmp_path / "checkpoint.jsonl")
+    store = TextStore(str(tmp_path / "texts"))
+    text = stored_text(store, "{\\rtf1 Text}")
+    checkpoint = Checkpoint(path, 60)
+    save(checkpoint, matter(1), details(text))
+    checkpoint.close()
+
+    scraper = CMAPBillScraper(CMAP(), str(tmp_path))
+    scraper.checkpoint = Checkpoint(path, 60)
+    scraper.text_store = store
+
+    restored = scraper.restore(matter(1))
+    assert restored["texts"].result()[0]["MatterTextRtfSha256"] == (
+        text["MatterTextRtfSha256"]
+    )
+
+    os.remove(store.path(text["MatterTextRtfSha256"]))
+    assert scraper.restore(matter(1)) is None
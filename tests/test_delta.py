@@ -0,0 +1,105 @@
+import gzip
+import sqlite3
+
+import pytest
+
+from cmap import delta
+
+
+def build(path, statements):
+    con = sqlite3.connect(path)
+    con.executescript(statements)
+    con.commit()
+    con.close()
+
+
+OLD = """
+CREATE TABLE bill (id TEXT PRIMARY KEY, title TEXT);
+INSERT INTO bill VALUES ('a', 'A plan'), ('b', 'A budget'), ('c', 'A study');
+
+CREATE TABLE meeting (
+    organization_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    bills INTEGER NOT NULL,
+    PRIMARY KEY (organization_id, date)
+) WITHOUT ROWID;
+INSERT INTO meeting VALUES ('board', '2023-01-01', 2), ('board', '2023-02-01', 1);
+
+CREATE VIRTUAL TABLE search USING fts5(bill_id UNINDEXED, text);
+INSERT INTO search VALUES ('a', 'transit plan'), ('b', 'budget'), ('b', 'budget');
+
+CREATE INDEX bill_title ON bill (title);
+"""
+
+NEW = """
+CREATE TABLE bill (id TEXT PRIMARY KEY, title TEXT);
+INSERT INTO bill VALUES ('a', 'A transit plan'), ('b', 'A budget'), ('d', 'A map');
+
+CREATE TABLE meeting (
+    organization_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    bills INTEGER NOT NULL,
+    PRIMARY KEY (organization_id, date)
+) WITHOUT ROWID;
+INSERT INTO meeting VALUES ('board', '2023-01-01', 3), ('board', '2023-03-01', 1);
+
+CREATE VIRTUAL TABLE search USING fts5(bill_id UNINDEXED, text);
+INSERT INTO search VALUES ('a', 'transit plan'), ('b', 'budget'), ('d', 'map');
+
+CREATE TABLE summary (id TEXT PRIMARY KEY);
+INSERT INTO summary VALUES ('x');
+"""
+
+
+@pytest.fixture
+def databases(tmp_path):
+    old, new = str(tmp_path / "old.db"), str(tmp_path / "new.db")
+    build(old, OLD)
+    build(new, NEW)
+    return old, new, str(tmp_path / "delta.sql.gz")
+
+
+def test_apply_gives_the_new_database(databases):
+    old, new, delta_path = databases
+    delta.diff(old, new, delta_path)
+    delta.apply(old, delta_path)
+
+    assert delta.digest_of(old) == delta.digest_of(new)
+    con = sqlite3.connect(old)
+    assert con.execute(
+        "SELECT bill_id FROM search WHERE search MATCH 'map'"
+    ).fetchall() == [("d",)]
+    assert con.execute(
+        "SELECT count(*) FROM search WHERE bill_id = 'b'"
+    ).fetchone() == (1,)
+    con.close()
+
+
+def test_no_changes_make_an_empty_delta(databases):
+    old, _, delta_path = databases
+    delta.diff(old, old, delta_path)
+    with gzip.open(delta_path, "rt") as f:
+        assert len(f.readlines()) == 1
+
+
+def test_refuses_another_base(databases):
+    old, new, delta_path = databases
+    delta.diff(old, new, delta_path)
+    delta.apply(old, delta_path)
+
+    with pytest.raises(delta.DeltaError):
+        delta.apply(old, delta_path)
+
+
+def test_rolls_back_when_the_result_is_wrong(databases):
+    old, new, delta_path = databases
+    delta.diff(old, new, delta_path)
+    with gzip.open(delta_path, "rt") as f:
+        lines = f.readlines()
+    with gzip.open(delta_path, "wt") as f:
+        f.writelines(line for line in lines if "'d'" not in line)
+
+    before = delta.digest_of(old)
+    with pytest.raises(delta.DeltaError):
+        delta.apply(old, delta_path)
+    assert delta.digest_of(old) == before
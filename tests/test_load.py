@@ -0,0 +1,217 @@
+import json
+import os
+import sqlite3
+
+import pytest
+from pupa import settings
+from pupa.scrape import Bill, Organization, Person, Scraper, VoteEvent
+
+from cmap import CMAP, load
+from cmap.bills import write_watermark
+
+BOARD = "CMAP Board of Directors"
+
+
+def person(name, legistar_id, committee):
+    p = Person(name)
+    p.add_source("http://example.com/persons/{0}".format(legistar_id))
+    p.add_membership(committee)
+    return p
+
+
+def vote_event(bill, motion_text):
+    vote = VoteEvent(
+        legislative_session="2023",
+        motion_text=motion_text,
+        organization={"name": BOARD},
+        classification="passage",
+        start_date="2023-03-01",
+        result="pass",
+        bill=bill,
+        bill_action="approved",
+    )
+    vote.add_source("http://example.com/matters/1/histories")
+    vote.yes("Pat Smith")
+    vote.no("Lee Jones")
+    return vote
+
+
+class PeopleScraper(Scraper):
+    names = (("Pat Smith", 1), ("Lee Jones", 2))
+
+    def scrape(self):
+        committee = Organization(
+            "Transportation Committee",
+            classification="committee",
+            parent_id={"name": BOARD},
+        )
+        committee.add_source("http://example.com/bodies/2")
+        yield committee
+        for name, legistar_id in self.names:
+            yield person(name, legistar_id, committee)
+
+
+class BillScraper(Scraper):
+    motions = ("approve",)
+    last_modified = "2023-03-01T00:00:00"
+
+    def scrape(self, watermark=None, incremental=False):
+        bill = Bill(
+            "23-001",
+            legislative_session="2023",
+            title="A plan",
+            from_organization={"name": BOARD},
+        )
+        bill.add_source("http://example.com/matters/1")
+        bill.add_action(
+            "approved",
+            "2023-03-01",
+            organization={"name": BOARD},
+            classification="passage",
+        )
+        bill.add_sponsorship("Pat Smith", "Primary", "person", True)
+        for motion_text in self.motions:
+            yield vote_event(bill, motion_text)
+        yield bill
+        if watermark:
+            write_watermark(watermark, self.last_modified)
+
+
+@pytest.fixture(autouse=True)
+def scrapers(monkeypatch):
+    # scrapelib would make its cache directory in the working directory
+    monkeypatch.setattr(settings, "CACHE_DIR", None)
+    monkeypatch.setitem(CMAP.scrapers, "people", PeopleScraper)
+    monkeypatch.setitem(CMAP.scrapers, "bills", BillScraper)
+
+
+SCRAPERS = [("people", {}), ("bills", {})]
+
+
+def rows(path, query):
+    con = sqlite3.connect(path)
+    try:
+        return con.execute(query).fetchall()
+    finally:
+        con.close()
+
+
+def test_loads_a_scrape(tmp_path):
+    path = str(tmp_path / "cmap.db")
+    load.load(path, SCRAPERS)
+
+    assert rows(path, "SELECT identifier, title FROM bill") == [("23-001", "A plan")]
+    assert rows(path, "SELECT name FROM person ORDER BY name") == [
+        ("Lee Jones",),
+        ("Pat Smith",),
+    ]
+    assert (
+        rows(
+            path,
+            """
+        SELECT person.name FROM billsponsorship
+        JOIN person ON person.id = billsponsorship.person_id
+        """,
+        )
+        == [("Pat Smith",)]
+    )
+    assert (
+        rows(
+            path,
+            """
+        SELECT personvote.option, person.name FROM personvote
+        JOIN person ON person.id = personvote.voter_id
+        ORDER BY personvote.option
+        """,
+        )
+        == [("no", "Lee Jones"), ("yes", "Pat Smith")]
+    )
+    assert (
+        rows(
+            path,
+            """
+        SELECT billaction.description FROM voteevent
+        JOIN billaction ON billaction.id = voteevent.bill_action_id
+        """,
+        )
+        == [("approved",)]
+    )
+
+
+def test_loading_the_same_scrape_again_changes_nothing(tmp_path):
+    path = str(tmp_path / "cmap.db")
+    feed = tmp_path / "changes.jsonl"
+    load.load(path, SCRAPERS, feed=str(feed))
+    assert feed.read_text()
+
+    load.load(path, SCRAPERS, update=True, feed=str(feed))
+    assert feed.read_text() == ""
+    assert rows(path, "PRAGMA journal_mode") == [("delete",)]
+    assert not os.path.exists(path + "-wal")
+
+
+def test_vote_events_a_bill_no_longer_has_are_deleted(tmp_path, monkeypatch):
+    monkeypatch.setattr(BillScraper, "motions", ("approve", "reconsider"))
+    path = str(tmp_path / "cmap.db")
+    feed = tmp_path / "changes.jsonl"
+    load.load(path, SCRAPERS, feed=str(feed))
+    assert rows(path, "SELECT count(*) FROM voteevent") == [(2,)]
+    (kept,), (dropped,) = rows(path, "SELECT id FROM voteevent ORDER BY motion_text")
+
+    # an incremental scrape, which doesn't find every bill
+    monkeypatch.setattr(BillScraper, "motions", ("approve",))
+    load.load(
+        path,
+        [("people", {}), ("bills", {"incremental": "true"})],
+        update=True,
+        feed=str(feed),
+    )
+
+    assert rows(path, "SELECT id FROM voteevent") == [(kept,)]
+    assert [json.loads(line) for line in feed.read_text().splitlines()] == [
+        {"change": "deleted", "type": "vote_event", "id": dropped}
+    ]
+    assert rows(path, "SELECT id FROM contenthash WHERE type = 'vote_event'") == [
+        (kept,)
+    ]
+
+
+def test_people_sharing_a_name_are_kept_apart(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        PeopleScraper, "names", (("Pat Smith", 1), ("Pat Smith", 3), ("Lee Jones", 2))
+    )
+    path = str(tmp_path / "cmap.db")
+    load.load(path, SCRAPERS)
+
+    assert rows(path, "SELECT count(*) FROM person WHERE name = 'Pat Smith'") == [(2,)]
+    assert rows(path, "SELECT count(*) FROM membership") == [(3,)]
+    # as with pupa's importers, the name alone doesn't say which one voted
+    assert rows(
+        path, "SELECT voter_id FROM personvote WHERE voter_name = 'Pat Smith'"
+    ) == [(None,)]
+
+
+def test_each_action_is_matched_to_one_vote_event(tmp_path, monkeypatch):
+    monkeypatch.setattr(BillScraper, "motions", ("approve", "approve"))
+    path = str(tmp_path / "cmap.db")
+    load.load(path, SCRAPERS)
+
+    assert rows(
+        path, "SELECT count(DISTINCT id), count(bill_action_id) FROM voteevent"
+    ) == [(2, 1)]
+
+
+def test_watermark_moves_with_what_was_loaded(tmp_path, monkeypatch):
+    path = str(tmp_path / "cmap.db")
+    load.load(path, SCRAPERS)
+    assert rows(path, "SELECT * FROM watermark") == [("bills", "2023-03-01T00:00:00")]
+
+    def fail(self, objects):
+        list(objects)
+        raise RuntimeError("the load failed")
+
+    monkeypatch.setattr(BillScraper, "last_modified", "2023-04-01T00:00:00")
+    monkeypatch.setattr(load.Loader, "load_bills_and_vote_events", fail)
+    with pytest.raises(RuntimeError):
+        load.load(path, SCRAPERS, update=True)
+    assert rows(path, "SELECT * FROM watermark") == [("bills", "2023-03-01T00:00:00")]
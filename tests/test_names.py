@@ -0,0 +1,41 @@
+from pupa.scrape import Organization, Person
+
+from cmap.names import NameIndex
+
+
+def test_resolves_unique_names_to_ids():
+    names = NameIndex()
+    person = Person("Jane Q. Public")
+    person.family_name = "Public"
+    person.add_name("Jane Public")
+    names.add(person)
+
+    assert names.resolve("person", "Jane Q. Public") == person._id
+    assert names.resolve("person", "Jane Public") == person._id
+    assert names.resolve("person", "Public") == person._id
+
+
+def test_matches_names_exactly():
+    names = NameIndex()
+    person = Person("Jane Q. Public")
+    names.add(person)
+
+    for name in ("jane q. public", "Jane  Q. Public", " Jane Q. Public"):
+        assert names.resolve("person", name).startswith("~")
+
+
+def test_shared_names_get_pseudo_ids():
+    names = NameIndex()
+    names.add(Person("Pat Smith"))
+    names.add(Person("Pat Smith"))
+
+    assert names.resolve("person", "Pat Smith") == '~{"name": "Pat Smith"}'
+
+
+def test_types_are_kept_apart():
+    names = NameIndex()
+    board = Organization("Board", classification="committee")
+    names.add(board)
+
+    assert names.resolve("organization", "Board") == board._id
+    assert names.resolve("person", "Board").startswith("~")
@@ -0,0 +1,52 @@
+import sqlite3
+
+from cmap.optimize import optimize
+
+TABLES = """
+CREATE TABLE organization (id, name);
+CREATE TABLE bill (id, identifier);
+CREATE TABLE billaction (
+    id, bill_id, organization_id, description, date, classification, "order"
+);
+CREATE TABLE voteevent (
+    id, motion_text, start_date, result, organization_id, bill_id, bill_action_id
+);
+CREATE TABLE votecount (vote_event_id, option, value);
+CREATE TABLE personvote (vote_event_id, option, voter_name, voter_id);
+CREATE TABLE membership (person_id, start_date, end_date, organization_id, role);
+
+INSERT INTO organization VALUES ('o', 'Board');
+INSERT INTO bill VALUES ('b', '23-001');
+INSERT INTO billaction VALUES ('a1', 'b', 'o', 'introduced', '2023-01-01', '[]', 0);
+INSERT INTO billaction VALUES ('a2', 'b', 'o', 'approved', '2023-02-01', '[]', 1);
+-- two votes on one action
+INSERT INTO voteevent VALUES ('v1', 'approve', '2023-02-01', 'fail', 'o', 'b', 'a2');
+INSERT INTO voteevent VALUES ('v2', 'approve', '2023-02-01', 'pass', 'o', 'b', 'a2');
+INSERT INTO votecount VALUES ('v1', 'yes', 1);
+INSERT INTO votecount VALUES ('v1', 'no', 2);
+INSERT INTO votecount VALUES ('v2', 'yes', 3);
+-- a person listed twice on a vote
+INSERT INTO personvote VALUES ('v2', 'yes', 'Pat Smith', 'p');
+INSERT INTO personvote VALUES ('v2', 'yes', 'P. Smith', 'p');
+INSERT INTO personvote VALUES ('v1', 'no', 'Pat Smith', 'p');
+"""
+
+
+def test_summaries_have_a_row_per_key(tmp_path):
+    path = str(tmp_path / "cmap.db")
+    con = sqlite3.connect(path)
+    con.executescript(TABLES)
+    con.close()
+
+    optimize(path)
+
+    con = sqlite3.connect(path)
+    assert con.execute("""
+        SELECT "order", vote_event_id, result, yes_count, no_count
+        FROM billtimeline ORDER BY "order"
+        """).fetchall() == [(0, None, None, None, None), (1, "v2", "pass", 3, 0)]
+    assert con.execute("""
+        SELECT vote_event_id, option FROM personvoterecord
+        WHERE person_id = 'p' ORDER BY vote_event_id
+        """).fetchall() == [("v1", "no"), ("v2", "yes")]
+    con.close()
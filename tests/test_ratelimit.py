@@ -0,0 +1,156 @@
+import threading
+import time
+
+import requests
+import scrapelib
+from pupa import settings
+
+from cmap import ratelimit
+from cmap.ratelimit import (
+    HIGH,
+    LOW,
+    NORMAL,
+    AdaptiveLimiter,
+    RateLimitMixin,
+    backoff,
+    route_priority,
+)
+
+
+def response(status, **headers):
+    r = requests.Response()
+    r.status_code = status
+    r.headers.update(headers)
+    return r
+
+
+def test_route_priorities():
+    base = "http://webapi.legistar.com/v1/cmap"
+    assert route_priority(base + "/matters") == HIGH
+    assert route_priority(base + "/mattersponsors?$top=1") == HIGH
+    assert route_priority(base + "/matters/5/histories") == NORMAL
+    assert route_priority(base + "/matters/5/texts/7") == LOW
+
+
+def test_backoff_grows_and_is_capped():
+    for tries in range(1, 10):
+        wait = backoff(tries, 2)
+        assert 0 <= wait <= min(ratelimit.MAX_BACKOFF, 2 * 2 ** (tries - 1))
+
+
+def test_rate_follows_latency():
+    limiter = AdaptiveLimiter(5, 1, 6, target_latency=1.0)
+    for _ in range(20):
+        limiter.answered(0.1)
+    assert limiter.rate == 6
+
+    limiter.answered(2.0)
+    assert limiter.rate == 6 * ratelimit.SLOWDOWN
+
+
+def test_throttling_halves_the_rate_once_per_interval():
+    limiter = AdaptiveLimiter(8, 3, 20, target_latency=1.0)
+    limiter.throttled()
+    limiter.throttled()
+    assert limiter.rate == 4
+
+    limiter._last_cut -= ratelimit.CUT_INTERVAL
+    limiter.throttled()
+    assert limiter.rate == 3
+
+
+def test_retry_after_pauses_everyone():
+    limiter = AdaptiveLimiter(100, 1, 100, target_latency=1.0)
+    limiter.throttled(wait=0.2)
+    start = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - start >= 0.15
+
+
+def test_higher_priorities_go_first():
+    limiter = AdaptiveLimiter(40, 1, 40, target_latency=1.0)
+    # halves the rate, to one request every 50ms, and holds everyone back
+    # until all the waiters are queued
+    limiter.throttled(wait=0.3)
+    limiter._tokens = 0
+
+    order = []
+
+    def request(priority):
+        limiter.acquire(priority)
+        order.append(priority)
+
+    threads = []
+    for priority in (LOW, NORMAL, LOW, HIGH, NORMAL):
+        thread = threading.Thread(target=request, args=(priority,))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join()
+
+    assert order == [HIGH, NORMAL, NORMAL, LOW, LOW]
+
+
+class Canned(object):
+    """Answers requests from a list of responses, instead of the network."""
+
+    responses = ()
+
+    def request(self, method, url, params=None, headers=None, **kwargs):
+        self.calls += 1
+        answer = self.responses[self.calls - 1]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+class Scraper(RateLimitMixin, Canned, scrapelib.Scraper):
+    calls = 0
+
+
+def scraper(responses, retries):
+    s = Scraper(retry_attempts=retries, retry_wait_seconds=1)
+    s.responses = responses
+    return s
+
+
+def test_retries_without_a_limiter(monkeypatch):
+    monkeypatch.setattr(settings, "CMAP_RATE_LIMIT", None)
+    sleeps = []
+    monkeypatch.setattr(ratelimit.time, "sleep", sleeps.append)
+
+    s = scraper(
+        [
+            response(503, **{"Retry-After": "7"}),
+            requests.ConnectionError(),
+            response(200),
+        ],
+        retries=2,
+    )
+    assert s.get("http://example.com/v1/cmap/matters").status_code == 200
+    assert s.calls == 3
+    assert sleeps[0] == 7
+    # scrapelib doesn't retry on its own as well
+    assert s.retry_attempts == 0
+
+
+def test_gives_up_after_the_retries(monkeypatch):
+    monkeypatch.setattr(settings, "CMAP_RATE_LIMIT", None)
+    monkeypatch.setattr(ratelimit.time, "sleep", lambda seconds: None)
+
+    s = scraper([response(503), response(503), response(503)], retries=1)
+    assert s.get("http://example.com/v1/cmap/matters").status_code == 503
+    assert s.calls == 2
+
+
+def test_failures_slow_the_shared_limiter(monkeypatch):
+    limiter = AdaptiveLimiter(10, 1, 20, target_latency=1.0)
+    monkeypatch.setattr(settings, "CMAP_RATE_LIMIT", 10)
+    monkeypatch.setattr(ratelimit, "_limiter", limiter)
+    monkeypatch.setattr(ratelimit.time, "sleep", lambda seconds: None)
+
+    s = scraper([response(429), response(200)], retries=3)
+    assert s.get("http://example.com/v1/cmap/matters").status_code == 200
+    assert limiter.rate == 5 + ratelimit.INCREASE
+    assert s.requests_per_minute == 0
@@ -0,0 +1,76 @@
+import hashlib
+
+import pytest
+
+from cmap import search
+from cmap.search import AttachmentFetcher
+
+FILES = {
+    "http://example.com/a.pdf": b"minutes",
+    # the same file, linked from somewhere else
+    "http://example.com/b.pdf": b"minutes",
+    "http://example.com/c.pdf": b"budget",
+}
+
+
+class Response(object):
+    def __init__(self, status_code, body=b"", etag=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = {"ETag": etag} if etag else {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def iter_content(self, size):
+        yield self.body
+
+
+class Scraper(object):
+    def __init__(self):
+        self.requests = []
+
+    def get(self, url, headers=None, stream=False):
+        self.requests.append((url, headers))
+        etag = '"{0}"'.format(hashlib.md5(FILES[url]).hexdigest())
+        if headers.get("If-None-Match") == etag:
+            return Response(304, etag=etag)
+        return Response(200, FILES[url], etag)
+
+
+@pytest.fixture(autouse=True)
+def pdf_text(monkeypatch):
+    def read(path):
+        with open(path, "rb") as f:
+            return f.read().decode()
+
+    monkeypatch.setattr(search, "pdf_text", read)
+
+
+def test_each_file_is_extracted_once():
+    fetcher = AttachmentFetcher(Scraper(), set())
+    fetched = [fetcher.fetch(url, None) for url in FILES]
+
+    (a, a_text), (b, b_text), (c, c_text) = fetched
+    assert a["sha256"] == b["sha256"] == hashlib.sha256(b"minutes").hexdigest()
+    assert (a_text, b_text, c_text) == ("minutes", None, "budget")
+
+
+def test_texts_already_extracted_are_not_extracted_again():
+    known = {hashlib.sha256(b"budget").hexdigest()}
+    fetcher = AttachmentFetcher(Scraper(), known)
+    assert fetcher.fetch("http://example.com/c.pdf", None)[1] is None
+
+
+def test_unchanged_files_are_not_downloaded_again():
+    scraper = Scraper()
+    fetcher = AttachmentFetcher(scraper, set())
+    previous, _ = fetcher.fetch("http://example.com/c.pdf", None)
+
+    row, text = fetcher.fetch("http://example.com/c.pdf", previous)
+    assert scraper.requests[1][1] == {"If-None-Match": previous["etag"]}
+    assert row["sha256"] == previous["sha256"]
+    assert text is None
@@ -0,0 +1,29 @@
+import os
+
+from cmap.segments import SegmentWriter, read_segments
+
+
+def test_segments_are_split_and_read_back_in_order(tmp_path):
+    writer = SegmentWriter(str(tmp_path), "Scraper", 2)
+    for i in range(5):
+        writer.write("bill", {"id": i})
+    writer.close()
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "bill-Scraper-0000.jsonl.gz",
+        "bill-Scraper-0001.jsonl.gz",
+        "bill-Scraper-0002.jsonl.gz",
+    ]
+    objects = read_segments(str(tmp_path), "bill")
+    assert [obj.as_dict()["id"] for obj in objects] == [0, 1, 2, 3, 4]
+
+
+def test_discarded_segments_leave_nothing_half_written(tmp_path):
+    writer = SegmentWriter(str(tmp_path), "Scraper", 2)
+    for i in range(3):
+        writer.write("bill", {"id": i})
+    writer.write("vote_event", {"id": 0})
+    writer.discard()
+
+    # only the segment that was finished before
+    assert os.listdir(tmp_path) == ["bill-Scraper-0000.jsonl.gz"]
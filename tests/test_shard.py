@@ -0,0 +1,123 @@
+import json
+import threading
+
+import pytest
+from pupa import settings
+
+from benchmarks.fake_legistar import Dataset, FakeLegistar
+from cmap import CMAP
+from cmap.bills import CMAPBillScraper, read_watermark
+from cmap.shard import Merger, shards
+from cmap.texts import TextStore
+
+
+@pytest.fixture
+def legistar(monkeypatch):
+    monkeypatch.setattr(settings, "CMAP_RATE_LIMIT", None)
+    monkeypatch.setattr(settings, "CMAP_HTTP_CACHE", None)
+    monkeypatch.setattr(settings, "CMAP_METRICS_REPORT", None)
+    monkeypatch.setattr(settings, "CMAP_SEGMENT_OBJECTS", None)
+    monkeypatch.setattr(settings, "CMAP_ASYNC_CONCURRENCY", None)
+    monkeypatch.setattr(settings, "CACHE_DIR", None)
+
+    server = FakeLegistar(("127.0.0.1", 0), Dataset(10, 100))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield "http://{0}:{1}".format(*server.server_address)
+    server.shutdown()
+    server.server_close()
+
+
+def scrape_bills(url, state, **kwargs):
+    scraper = CMAPBillScraper(CMAP(), str(state))
+    scraper.BASE_URL = url + "/v1/cmap"
+    scraper.BASE_WEB_URL = scraper.WEB_URL = url
+    scraper.requests_per_minute = 0
+    scraper.text_store = TextStore(str(state / "texts"))
+    return list(scraper.scrape(checkpoint=str(state / "checkpoint.jsonl"), **kwargs))
+
+
+@pytest.mark.parametrize("shard, kept", [("false", False), ("true", True)])
+def test_bounded_scrapes_keep_a_watermark_only_as_shards(
+    legistar, tmp_path, shard, kept
+):
+    watermark = str(tmp_path / "watermark.json")
+    scraped = scrape_bills(
+        legistar,
+        tmp_path,
+        watermark=watermark,
+        introduced_from="2023-01-01",
+        shard=shard,
+    )
+    assert scraped
+    assert (read_watermark(watermark) is not None) == kept
+
+
+def test_unbounded_scrapes_keep_a_watermark(legistar, tmp_path):
+    watermark = str(tmp_path / "watermark.json")
+    scrape_bills(legistar, tmp_path, watermark=watermark)
+    assert read_watermark(watermark) == "2023-11-11T00:00:10.10"
+
+
+def test_shards_cover_every_introduction_date():
+    ranges = shards(CMAP(), 5)
+    assert len(ranges) >= 5
+    assert ranges[0][0] is None and ranges[-1][1] is None
+    # each range starts where the last one ended
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+
+
+def write_shard(path, objects):
+    with open(path, "w") as f:
+        for _type, data in objects:
+            f.write(json.dumps([_type, data]) + "\n")
+    return str(path)
+
+
+def bill(_id, identifier, **data):
+    return dict(data, _id=_id, legislative_session="2023", identifier=identifier)
+
+
+def test_merge_drops_what_an_earlier_shard_had(tmp_path):
+    board = {
+        "_id": "o1",
+        "name": "Board",
+        "classification": "legislature",
+        "parent_id": None,
+    }
+    first = write_shard(
+        tmp_path / "shard-0.jsonl",
+        [
+            ("organization", board),
+            ("vote_event", {"_id": "v1", "bill": "b1"}),
+            ("bill", bill("b1", "23-001")),
+        ],
+    )
+    second = write_shard(
+        tmp_path / "shard-1.jsonl",
+        [
+            ("organization", dict(board, _id="o2")),
+            # a matter edited during the scrape, found again by this shard
+            ("vote_event", {"_id": "v2", "bill": "b2"}),
+            ("bill", bill("b2", "23-001")),
+            ("vote_event", {"_id": "v3", "bill": "b3"}),
+            ("bill", bill("b3", "23-002", from_organization="o2")),
+        ],
+    )
+
+    merger = Merger()
+    merged = [
+        (obj._type, obj.as_dict())
+        for path in (first, second)
+        for obj in merger.merge(path)
+    ]
+
+    assert [(_type, data["_id"]) for _type, data in merged] == [
+        ("organization", "o1"),
+        ("bill", "b1"),
+        ("vote_event", "v1"),
+        ("bill", "b3"),
+        ("vote_event", "v3"),
+    ]
+    # what referred to a dropped object refers to the one kept instead
+    assert merged[3][1]["from_organization"] == "o1"
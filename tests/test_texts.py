@@ -0,0 +1,100 @@
+import json
+import random
+
+import pytest
+
+from cmap.texts import TextSink, TextStore, read_text, rtf_to_text
+
+FIELDS = {"MatterTextId", "MatterTextVersion"}
+
+# non-ASCII text, including a character outside the BMP, which JSON
+# escapes as a surrogate pair
+RTF = "{\\rtf1 Caf" + chr(0xE9) + " " + chr(0x1F68C) + ' "transit" \\par}' * 50
+
+
+def body(**extra):
+    text = {
+        "MatterTextId": 7,
+        "MatterTextPlain": "skipped " * 100,
+        "MatterTextRtf": RTF,
+        "MatterTextVersion": "1",
+        "MatterTextAttachments": [{"Name": "a}b", "Nested": {"x": [1, 2]}}],
+    }
+    text.update(extra)
+    return json.dumps(text).encode()
+
+
+def split(data, sizes):
+    chunks, i = [], 0
+    for size in sizes:
+        chunks.append(data[i : i + size])
+        i += size
+    chunks.append(data[i:])
+    return chunks
+
+
+def parse(chunks, tmp_path):
+    sink = TextSink(TextStore(str(tmp_path)))
+    fields = read_text(chunks, FIELDS, {"MatterTextRtf": sink})
+    return fields, sink
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 64, 4096])
+def test_fixed_chunk_sizes(tmp_path, size):
+    data = body()
+    chunks = [data[i : i + size] for i in range(0, len(data), size)]
+    fields, sink = parse(chunks, tmp_path)
+
+    assert fields == {"MatterTextId": 7, "MatterTextVersion": "1"}
+    assert sink.length == len(RTF)
+    with sink.store.open(sink.digest) as f:
+        assert f.read() == RTF
+
+
+def test_random_chunk_boundaries(tmp_path):
+    data = body()
+    rng = random.Random(0)
+    for _ in range(50):
+        sizes = [rng.randint(0, 40) for _ in range(len(data) // 10)]
+        fields, sink = parse(split(data, sizes), tmp_path)
+        assert fields == {"MatterTextId": 7, "MatterTextVersion": "1"}
+        with sink.store.open(sink.digest) as f:
+            assert f.read() == RTF
+
+
+def test_identical_texts_are_stored_once(tmp_path):
+    _, first = parse([body()], tmp_path)
+    _, second = parse([body(MatterTextVersion="2")], tmp_path)
+
+    assert first.digest == second.digest
+    stored = [path for path in tmp_path.rglob("*") if path.is_file()]
+    assert len(stored) == 1
+
+
+def test_prune_keeps_only_what_is_referred_to(tmp_path):
+    _, kept = parse([body()], tmp_path)
+    _, dropped = parse([body(MatterTextRtf="{\\rtf1 Old}")], tmp_path)
+
+    assert kept.store.prune({kept.digest}) == 1
+    assert kept.digest in kept.store
+    assert dropped.digest not in kept.store
+
+
+def test_null_text(tmp_path):
+    fields, sink = parse([body(MatterTextRtf=None)], tmp_path)
+    assert fields["MatterTextRtf"] is None
+    assert sink.digest is None
+    sink.discard()
+    assert not [path for path in tmp_path.rglob("*") if path.is_file()]
+
+
+def test_truncated_body(tmp_path):
+    data = body()
+    with pytest.raises(ValueError):
+        parse([data[: len(data) // 2]], tmp_path)
+
+
+def test_rtf_to_text():
+    assert rtf_to_text("{\\rtf1{\\fonttbl{\\f0 Arial;}}\\f0 Hello\\par World}") == (
+        "Hello\nWorld"
+    )